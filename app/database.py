@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from .models import Base
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Database URL
 DATABASE_URL = "sqlite:///./hr_assistant.db"
 
@@ -15,6 +18,21 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def create_tables():
     """Create all tables"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+def add_missing_columns():
+    """Add columns introduced after a table was created (create_all never alters existing tables)"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    logger.info(f"Added column {table.name}.{column.name}")
 
 def get_db():
     """Get database session"""
@@ -32,7 +50,7 @@ def init_sample_data():
         from .models import Employee, Document, UserRole, DocumentVisibility
         from passlib.context import CryptContext
     except ImportError as e:
-        print(f"Import error in init_sample_data: {e}")
+        logger.error(f"Import error in init_sample_data: {e}")
         return
     
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -389,9 +407,7 @@ def init_sample_data():
         print("\n✅ System ready for testing!")
         
     except Exception as e:
-        print(f"Error initializing sample data: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error initializing sample data: {e}")
         db.rollback()
     finally:
         db.close()
\ No newline at end of file
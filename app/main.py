@@ -1,15 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Header, Query
+from fastapi import FastAPI, Depends, HTTPException, Form, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from datetime import datetime, timedelta
+import asyncio
 import json
+import logging
 import os
 
-from .database import get_db, create_tables, init_sample_data
-from .models import Employee, Document, ChatSession, ChatMessage, QueryAnalytics, UserRole, DocumentVisibility, LeaveApplication, LeaveBalance
+from .database import get_db, create_tables, init_sample_data, SessionLocal, engine
+from .models import Employee, Document, DocumentChunk, ChatSession, ChatMessage, QueryAnalytics, UserRole, DocumentVisibility, LeaveApplication, LeaveBalance, IngestionJob, IngestionStatus
 try:
     from .services.auth import AuthService, Permission, require_permission, require_role
 except ImportError:
@@ -26,7 +28,24 @@ except ImportError:
         return decorator
 from .services.ai_service import AIService
 from .services.leave_service import LeaveService
+from .services.llm_gateway import get_llm_gateway
+from .services.intent_context import SERVED_BY_LEAVE_SERVICE
+from .services.notification_service import NotificationService
+from .services.ingestion_service import IngestionService
 from .utils.document_processor import DocumentProcessor
+from .utils.upload_spool import spool_upload_form, UploadFormError, UploadTooLargeError, MAX_UPLOAD_BYTES, UPLOAD_FORM_OVERHEAD_BYTES
+
+# Level of the application log; DEBUG adds per-turn classification, retrieval and leave lookup details
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+package_logger = logging.getLogger(__package__)
+if not package_logger.handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    package_logger.addHandler(log_handler)
+package_logger.setLevel(LOG_LEVEL)
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(title="HR AI Assistant with Leave Management", description="Intelligent HR Assistant with Role-Based Access Control and Advanced Leave Management", version="2.0.0")
@@ -40,6 +59,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    """Refuse document uploads whose declared size is over the limit before their body is read;
+    bodies without a Content-Length (chunked) are checked by spool_upload_form as they arrive"""
+    if request.url.path == "/api/documents/upload":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"}
+            )
+    return await call_next(request)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -47,7 +79,12 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 auth_service = AuthService()
 ai_service = AIService()
 leave_service = LeaveService()
+notification_service = NotificationService()
 doc_processor = DocumentProcessor()
+ingestion_service = IngestionService(ai_service, doc_processor)
+
+# Seconds a new WebSocket has to send its auth message
+WEBSOCKET_AUTH_TIMEOUT_SECONDS = float(os.getenv("WEBSOCKET_AUTH_TIMEOUT_SECONDS", "10"))
 
 # Pydantic models for requests
 from pydantic import BaseModel
@@ -220,13 +257,67 @@ async def debug_all_applications(
             for app in applications
         ]
     }
+def rechunk_documents(db: Session) -> int:
+    """Rebuild the chunks of documents chunked before chunks recorded their offsets in the content"""
+    document_ids = [doc_id for (doc_id,) in db.query(DocumentChunk.document_id).filter(
+        DocumentChunk.start_offset == None
+    ).distinct()]
+    for document in db.query(Document).filter(Document.id.in_(document_ids)):
+        ai_service.index_manager.remove_document(db, document.id)
+        db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
+        ingestion_service.create_document_chunks(db, document, document.content or "")
+        if document.is_active:
+            ai_service.index_manager.add_document(db, document)
+    db.commit()
+    return len(document_ids)
+
+def prepare_search_index():
+    """Create the full-text index and vector store, chunk documents stored without chunks and index them"""
+    ai_service.search_index.ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        chunked_ids = {doc_id for (doc_id,) in db.query(DocumentChunk.document_id).distinct()}
+        unchunked = db.query(Document).filter(Document.is_active == True, ~Document.id.in_(chunked_ids)).all()
+        for document in unchunked:
+            ingestion_service.create_document_chunks(db, document, document.content or "")
+        db.commit()
+        
+        rechunked = rechunk_documents(db)
+        if rechunked:
+            logger.info(f"Rechunked {rechunked} documents with character offsets")
+        
+        result = ai_service.search_index.sync(db)
+        logger.info(f"Search index ready: chunked {len(unchunked)} documents, indexed {result['indexed']}, removed {result['removed']}")
+        
+        ai_service.embedding_service.vector_store.open()
+        result = ai_service.embedding_service.sync(db)
+        logger.info(f"Vector store ready: {'fitted a new LSA model, ' if result['refitted'] else ''}embedded {result['embedded']}, removed {result['removed']}")
+        
+        # Fold a large startup delta into the snapshot before serving, later merges run in the background
+        if ai_service.index_manager.needs_merge():
+            ai_service.index_manager.merge()
+    finally:
+        db.close()
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and sample data"""
     create_tables()
     init_sample_data()
-    print("HR AI Assistant with Leave Management started successfully!")
+    prepare_search_index()
+    ai_service.index_manager.start()
+    ingestion_service.attach(SessionLocal)
+    notification_service.attach(SessionLocal, asyncio.get_running_loop())
+    logger.info("HR AI Assistant with Leave Management started successfully!")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop ingestion, PDF extraction workers and index merges and release pooled LLM connections"""
+    ingestion_service.stop()
+    doc_processor.close()
+    ai_service.index_manager.stop()
+    await get_llm_gateway().aclose()
 
 # Root endpoint - serve main page
 @app.get("/", response_class=HTMLResponse)
@@ -289,6 +380,137 @@ async def get_profile(current_employee: Employee = Depends(get_current_employee)
     }
 
 # Chat endpoints with leave management integration
+def get_or_create_chat_session(db: Session, session_id: Optional[int], employee: Employee) -> ChatSession:
+    """Return the employee's active chat session, or start a new one"""
+    session = None
+    if session_id:
+        session = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.employee_id == employee.id,
+            ChatSession.is_active == True
+        ).first()
+    
+    if not session:
+        session = ChatSession(employee_id=employee.id)
+        db.add(session)
+        db.flush()
+    return session
+
+def load_conversation_history(db: Session, session: ChatSession) -> List[dict]:
+    """Recent messages of the session in chronological order, used as classifier context"""
+    recent_messages = db.query(ChatMessage).filter(
+        ChatMessage.session_id == session.id
+    ).order_by(ChatMessage.timestamp.desc()).limit(10).all()  # Increased from 5 to 10
+    
+    return [
+        {
+            "type": msg.message_type,
+            "message": msg.message_text,
+            "timestamp": msg.timestamp.isoformat(),
+            "confidence": msg.confidence_score
+        }
+        for msg in reversed(recent_messages)  # Reverse to get chronological order
+    ]
+
+async def start_chat_turn(db: Session, request: ChatRequest, employee: Employee):
+    """Save the user message and classify the turn once; returns (session, intent_context, history)"""
+    session = get_or_create_chat_session(db, request.session_id, employee)
+    
+    # Save user message
+    user_message = ChatMessage(
+        session_id=session.id,
+        message_text=request.message,
+        message_type="user"
+    )
+    db.add(user_message)
+    
+    # Get conversation history for context (more messages for better context)
+    conversation_history = load_conversation_history(db, session)
+    
+    # Classify the turn once: one model call returns the route and the leave entities,
+    # and every later stage reads them from this context. Leave balances are not part of
+    # the classifier's profile; the leave service loads them only for leave routes
+    intent_context = await ai_service.create_intent_context(request.message, employee, conversation_history)
+    logger.debug(f"Classified intent for '{request.message}' as: {intent_context.intent} (classifications this turn: {intent_context.classification_count})")
+    return session, intent_context, conversation_history
+
+def find_relevant_documents(db: Session, employee: Employee, query: str) -> List[dict]:
+    """Passages of documents the employee may access, ranked for the query"""
+    try:
+        return ai_service.search_chunks(db, employee, query)
+    except Exception as e:
+        # No unfiltered fallback: every search path checks the employee's document access
+        logger.error(f"Error in document search, answering without documents: {e}")
+        return []
+
+def save_leave_turn(db: Session, session: ChatSession, employee: Employee, query: str, leave_result: dict,
+                    intent_context, response_time: float, time_to_first_token: float = None) -> ChatMessage:
+    """Persist the assistant message and analytics for a turn answered by the leave service"""
+    intent_classification = leave_result["intent_classification"]
+    intent_details = dict(intent_classification, turn_intent=intent_context.to_dict())
+    
+    # Save AI response with intent classification
+    ai_message = ChatMessage(
+        session_id=session.id,
+        message_text=leave_result["response"],
+        message_type="assistant",
+        confidence_score=leave_result["confidence"],
+        source_documents=json.dumps([]),
+        intent_classification=json.dumps(intent_classification)
+    )
+    db.add(ai_message)
+    
+    # Save analytics with leave intent details
+    analytics = QueryAnalytics(
+        employee_id=employee.id,
+        query_text=query,
+        query_intent=intent_classification.get("primary_intent", intent_context.intent),
+        response_time=response_time,
+        time_to_first_token=time_to_first_token,
+        confidence_score=leave_result["confidence"],
+        documents_used=json.dumps([]),
+        intent_details=json.dumps(intent_details),
+        served_by=intent_context.served_by
+    )
+    db.add(analytics)
+    
+    db.commit()
+    return ai_message
+
+def save_answer_turn(db: Session, session: ChatSession, employee: Employee, query: str, ai_result: dict,
+                     intent_context, response_time: float, time_to_first_token: float = None) -> ChatMessage:
+    """Persist the assistant message and analytics for a document-grounded answer"""
+    ai_message = ChatMessage(
+        session_id=session.id,
+        message_text=ai_result["response"],
+        message_type="assistant",
+        confidence_score=ai_result["confidence"],
+        source_documents=json.dumps(ai_result["source_documents"]),
+        intent_classification=json.dumps(intent_context.to_dict())
+    )
+    db.add(ai_message)
+    
+    # Save analytics
+    analytics = QueryAnalytics(
+        employee_id=employee.id,
+        query_text=query,
+        query_intent=intent_context.intent,
+        response_time=response_time,
+        time_to_first_token=time_to_first_token,
+        confidence_score=ai_result["confidence"],
+        documents_used=json.dumps(ai_result.get("documents_used", [])),
+        intent_details=json.dumps({"turn_intent": intent_context.to_dict()}),
+        served_by=ai_result.get("served_by")
+    )
+    db.add(analytics)
+    
+    db.commit()
+    return ai_message
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/api/chat")
 async def chat_with_ai(
     request: ChatRequest,
@@ -299,138 +521,62 @@ async def chat_with_ai(
     start_time = datetime.utcnow()
     
     try:
-        # Get or create chat session
-        if request.session_id:
-            session = db.query(ChatSession).filter(
-                ChatSession.id == request.session_id,
-                ChatSession.employee_id == current_employee.id,
-                ChatSession.is_active == True
-            ).first()
-        else:
-            session = None
-        
-        if not session:
-            session = ChatSession(employee_id=current_employee.id)
-            db.add(session)
-            db.flush()
-        
-        # Save user message
-        user_message = ChatMessage(
-            session_id=session.id,
-            message_text=request.message,
-            message_type="user"
-        )
-        db.add(user_message)
-        
-        # Check if this is a leave-related query
-        intent = ai_service.classify_query_intent(request.message)
-        print(f"DEBUG: Classified intent for '{request.message}' as: {intent}")
+        session, intent_context, conversation_history = await start_chat_turn(db, request, current_employee)
+        intent = intent_context.intent
         
-        if intent.startswith('leave_'):
+        if intent_context.is_leave_intent:
             # Handle leave-related query with specialized service
-            
-            # Get conversation history for context (more messages for better context)
-            recent_messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).order_by(ChatMessage.timestamp.desc()).limit(10).all()  # Increased from 5 to 10
-            
-            conversation_history = [
-                {
-                    "type": msg.message_type,
-                    "message": msg.message_text,
-                    "timestamp": msg.timestamp.isoformat(),
-                    "confidence": msg.confidence_score
-                }
-                for msg in reversed(recent_messages)  # Reverse to get chronological order
-            ]
-            
-            # Process with leave service
-            leave_result = leave_service.process_leave_chat_message(
-                db, request.message, current_employee, conversation_history
+            leave_result = await leave_service.process_leave_chat_message(
+                db, request.message, current_employee, conversation_history, intent_context
             )
+            intent_context.served_by = SERVED_BY_LEAVE_SERVICE
             
-            ai_response = leave_result["response"]
-            confidence = leave_result["confidence"]
-            intent_classification = leave_result["intent_classification"]
-            
-            # Save AI response with intent classification
-            ai_message = ChatMessage(
-                session_id=session.id,
-                message_text=ai_response,
-                message_type="assistant",
-                confidence_score=confidence,
-                source_documents=json.dumps([]),
-                intent_classification=json.dumps(intent_classification)
-            )
-            db.add(ai_message)
-            
-            # Save analytics with leave intent details
-            analytics = QueryAnalytics(
-                employee_id=current_employee.id,
-                query_text=request.message,
-                query_intent=intent_classification.get("primary_intent", intent),
-                response_time=(datetime.utcnow() - start_time).total_seconds(),
-                confidence_score=confidence,
-                documents_used=json.dumps([]),
-                intent_details=json.dumps(intent_classification)
+            response_time = (datetime.utcnow() - start_time).total_seconds()
+            ai_message = save_leave_turn(
+                db, session, current_employee, request.message, leave_result, intent_context, response_time
             )
-            db.add(analytics)
-            
-            db.commit()
             
             return {
-                "response": ai_response,
+                "response": leave_result["response"],
                 "session_id": session.id,
                 "message_id": ai_message.id,
-                "confidence": confidence,
-                "response_time": (datetime.utcnow() - start_time).total_seconds(),
+                "confidence": leave_result["confidence"],
+                "response_time": response_time,
                 "sources": 0,
-                "intent": intent_classification.get("primary_intent", intent),
+                "intent": leave_result["intent_classification"].get("primary_intent", intent),
+                "classification_count": intent_context.classification_count,
+                "served_by": intent_context.served_by,
                 "actions_performed": leave_result.get("actions_performed", []),
                 "follow_up_needed": leave_result.get("follow_up_needed", False)
             }
         
         else:
-            # Handle non-leave queries with existing logic
-            try:
-                accessible_docs = auth_service.get_accessible_documents(db, current_employee)
-                relevant_docs = ai_service.search_relevant_documents_from_list(accessible_docs, request.message)
-            except Exception as e:
-                print(f"Error in document search: {e}")
-                relevant_docs = ai_service.search_relevant_documents(db, request.message)
+            # Repeated questions within the same ACL scope skip retrieval and generation
+            ai_result = ai_service.get_cached_response(request.message, current_employee, intent_context)
             
-            # Generate AI response
-            ai_result = ai_service.generate_hr_response(
-                request.message, 
-                current_employee, 
-                relevant_docs
-            )
+            if ai_result is None:
+                # Handle non-leave queries with existing logic
+                relevant_docs = find_relevant_documents(db, current_employee, request.message)
+                
+                # Paraphrases of an earlier question answered from the same sentence skip generation
+                ai_result = ai_service.get_similar_cached_response(
+                    request.message, current_employee, intent_context, relevant_docs
+                )
             
-            # Save AI response
-            ai_message = ChatMessage(
-                session_id=session.id,
-                message_text=ai_result["response"],
-                message_type="assistant",
-                confidence_score=ai_result["confidence"],
-                source_documents=json.dumps(ai_result["source_documents"])
-            )
-            db.add(ai_message)
+            if ai_result is None:
+                # Generate AI response
+                ai_result = await ai_service.generate_hr_response(
+                    request.message, 
+                    current_employee, 
+                    relevant_docs,
+                    intent_context=intent_context
+                )
             
             # Calculate response time
             response_time = (datetime.utcnow() - start_time).total_seconds()
-            
-            # Save analytics
-            analytics = QueryAnalytics(
-                employee_id=current_employee.id,
-                query_text=request.message,
-                query_intent=ai_result["intent"],
-                response_time=response_time,
-                confidence_score=ai_result["confidence"],
-                documents_used=json.dumps(ai_result["source_documents"])
+            ai_message = save_answer_turn(
+                db, session, current_employee, request.message, ai_result, intent_context, response_time
             )
-            db.add(analytics)
-            
-            db.commit()
             
             return {
                 "response": ai_result["response"],
@@ -438,8 +584,10 @@ async def chat_with_ai(
                 "message_id": ai_message.id,
                 "confidence": ai_result["confidence"],
                 "response_time": response_time,
-                "sources": len(ai_result["source_documents"]),
-                "intent": ai_result["intent"]
+                "sources": len(ai_result.get("documents_used", [])),
+                "intent": intent_context.intent,
+                "classification_count": intent_context.classification_count,
+                "served_by": ai_result.get("served_by")
             }
         
     except HTTPException:
@@ -447,9 +595,204 @@ async def chat_with_ai(
         raise
     except Exception as e:
         db.rollback()
-        print(f"Chat error: {e}")
+        logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+async def prepare_streamed_turn(db: Session, request: ChatRequest, employee: Employee):
+    """Classify the turn and retrieve its documents (or a cached answer) before anything is streamed"""
+    session, intent_context, conversation_history = await start_chat_turn(db, request, employee)
+    relevant_docs = []
+    cached_result = None
+    if not intent_context.is_leave_intent:
+        cached_result = ai_service.get_cached_response(request.message, employee, intent_context)
+        if cached_result is None:
+            relevant_docs = find_relevant_documents(db, employee, request.message)
+            cached_result = ai_service.get_similar_cached_response(
+                request.message, employee, intent_context, relevant_docs
+            )
+    return session, intent_context, conversation_history, relevant_docs, cached_result
+
+async def stream_chat_turn(db: Session, request: ChatRequest, employee: Employee, start_time: datetime,
+                           session: ChatSession, intent_context, conversation_history: List[dict],
+                           relevant_docs: List[dict], cached_result: Optional[dict] = None):
+    """Yield (event, data) pairs for a prepared turn: meta, tokens, then done once the turn is saved"""
+    time_to_first_token = None
+    if cached_result is not None:
+        source_list = cached_result["sources"]
+    else:
+        source_list = ai_service.describe_sources(relevant_docs)
+    yield "meta", {
+        "session_id": session.id,
+        "intent": intent_context.intent,
+        "classification_count": intent_context.classification_count,
+        "sources": source_list
+    }
+    
+    if intent_context.is_leave_intent:
+        # Leave answers come from the database, so they are sent as a single chunk
+        leave_result = await leave_service.process_leave_chat_message(
+            db, request.message, employee, conversation_history, intent_context
+        )
+        intent_context.served_by = SERVED_BY_LEAVE_SERVICE
+        time_to_first_token = (datetime.utcnow() - start_time).total_seconds()
+        yield "token", {"text": leave_result["response"]}
+        
+        response_time = (datetime.utcnow() - start_time).total_seconds()
+        ai_message = save_leave_turn(
+            db, session, employee, request.message, leave_result, intent_context,
+            response_time, time_to_first_token
+        )
+        confidence = leave_result["confidence"]
+        intent = leave_result["intent_classification"].get("primary_intent", intent_context.intent)
+        sources = 0
+    else:
+        ai_result = cached_result
+        if ai_result is not None:
+            time_to_first_token = (datetime.utcnow() - start_time).total_seconds()
+            yield "token", {"text": ai_result["response"]}
+        else:
+            async for kind, payload in ai_service.stream_standard_hr_response(
+                request.message, employee, relevant_docs, intent_context
+            ):
+                if kind == "token":
+                    if time_to_first_token is None:
+                        time_to_first_token = (datetime.utcnow() - start_time).total_seconds()
+                    yield "token", {"text": payload}
+                else:
+                    ai_result = payload
+        
+        response_time = (datetime.utcnow() - start_time).total_seconds()
+        ai_message = save_answer_turn(
+            db, session, employee, request.message, ai_result, intent_context,
+            response_time, time_to_first_token
+        )
+        confidence = ai_result["confidence"]
+        intent = intent_context.intent
+        sources = len(ai_result.get("documents_used", []))
+    
+    yield "done", {
+        "session_id": session.id,
+        "message_id": ai_message.id,
+        "confidence": confidence,
+        "response_time": response_time,
+        "time_to_first_token": time_to_first_token,
+        "sources": sources,
+        "intent": intent,
+        "served_by": intent_context.served_by
+    }
+
+@app.post("/api/chat/stream")
+async def chat_with_ai_stream(
+    request: ChatRequest,
+    current_employee: Employee = Depends(get_current_employee),
+    db: Session = Depends(get_db)
+):
+    """Stream the AI response as server-sent events: a meta event with intent and sources,
+    token events as the answer is generated, then a done event once the turn is saved"""
+    start_time = datetime.utcnow()
+    
+    try:
+        prepared_turn = await prepare_streamed_turn(db, request, current_employee)
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    
+    async def event_stream():
+        try:
+            async for event_type, data in stream_chat_turn(db, request, current_employee, start_time, *prepared_turn):
+                yield format_sse(event_type, data)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Chat stream error: {e}")
+            yield format_sse("error", {"detail": f"Error processing request: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Long-lived channel for chat turns and live approval-queue updates.
+    
+    The first message must be {"type": "auth", "token": ...}. Chat turns are sent as
+    {"type": "chat", "message": ..., "session_id": ...} and answered with the same
+    meta/token/done events as /api/chat/stream; approvers also receive approval_queue events.
+    The token and the employee's role are read again for every turn, and the socket is closed
+    once the token has expired or the employee was deactivated (also between turns).
+    """
+    await websocket.accept()
+    
+    db = SessionLocal()
+    try:
+        auth_message = await asyncio.wait_for(websocket.receive_json(), timeout=WEBSOCKET_AUTH_TIMEOUT_SECONDS)
+        token = auth_message.get("token", "") if auth_message.get("type") == "auth" else ""
+        employee = auth_service.get_current_employee(db, token) if token else None
+    except Exception:
+        employee = None
+    finally:
+        db.close()
+    
+    if not employee or not employee.is_active:
+        await websocket.close(code=4401, reason="Invalid authentication")
+        return
+    
+    employee_id = employee.id
+    notification_service.connect(websocket, employee)
+    try:
+        ready = {"type": "ready", "employee_id": employee_id}
+        if employee.user_role in [UserRole.MANAGER, UserRole.HR_MANAGER, UserRole.HR_ADMIN]:
+            db = SessionLocal()
+            try:
+                ready["pending_approvals"] = leave_service.get_pending_count(db, db.get(Employee, employee_id))
+            finally:
+                db.close()
+        await websocket.send_json(ready)
+        
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError):
+                # Invalid JSON, or a binary frame (which has no text to decode)
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+            if not isinstance(message, dict) or message.get("type") != "chat" or not message.get("message"):
+                await websocket.send_json({"type": "error", "detail": "Expected a chat message"})
+                continue
+            
+            request = ChatRequest(message=message["message"], session_id=message.get("session_id"))
+            start_time = datetime.utcnow()
+            
+            # One database session per turn; the connection itself may stay open for hours
+            db = SessionLocal()
+            try:
+                current_employee = auth_service.get_current_employee(db, token)
+                if not current_employee or current_employee.id != employee_id or not current_employee.is_active:
+                    await websocket.close(code=4401, reason="Authentication expired")
+                    return
+                # Approval events follow the role as it is now, not as it was at connect time
+                notification_service.update_role(employee_id, current_employee.user_role)
+                prepared_turn = await prepare_streamed_turn(db, request, current_employee)
+                async for event_type, data in stream_chat_turn(db, request, current_employee, start_time, *prepared_turn):
+                    await websocket.send_json({"type": event_type, **data})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Chat websocket error: {e}")
+                await websocket.send_json({"type": "error", "detail": f"Error processing request: {str(e)}"})
+            finally:
+                db.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        notification_service.disconnect(websocket, employee_id)
+
 @app.get("/api/chat/history/{session_id}")
 async def get_chat_history(
     session_id: int,
@@ -714,82 +1057,79 @@ async def reject_leave_application(
         raise HTTPException(status_code=500, detail=f"Error rejecting application: {str(e)}")
 
 # Document endpoints (with RBAC)
-@app.post("/api/documents/upload")
+@app.post("/api/documents/upload", openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object",
+    "required": ["file", "title", "document_type"],
+    "properties": {
+        "file": {"type": "string", "format": "binary"},
+        "title": {"type": "string"},
+        "document_type": {"type": "string"},
+        "department": {"type": "string"},
+        "visibility": {"type": "string", "default": "PUBLIC"}
+    }
+}}}}})
 async def upload_document(
-    file: UploadFile = File(...),
-    title: str = Form(...),
-    document_type: str = Form(...),
-    department: str = Form(None),
-    visibility: str = Form("PUBLIC"),
+    request: Request,
     current_employee: Employee = Depends(get_current_employee),
     db: Session = Depends(get_db)
 ):
-    """Upload and process a new document"""
+    """Queue an uploaded document for processing and return its ingestion job"""
     try:
-        # Convert string to enum
+        # The form is parsed from the body stream here instead of by File/Form parameters,
+        # which would store the whole file before any size check. The file goes to disk once,
+        # hashed and checked against the size limit chunk by chunk as it arrives
         try:
-            visibility_enum = DocumentVisibility(visibility)
-        except ValueError:
-            visibility_enum = DocumentVisibility.PUBLIC
+            fields, spooled = await spool_upload_form(request.headers.get("content-type", ""), request.stream())
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadFormError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Check if user can upload this document type
         try:
-            if not auth_service.can_upload_document_type(current_employee, document_type):
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"You don't have permission to upload {document_type} documents"
-                )
-        except:
-            pass  # Skip permission check if method not available
-        
-        # Regular employees can only create public documents
-        if current_employee.user_role == UserRole.EMPLOYEE:
-            visibility_enum = DocumentVisibility.PUBLIC
-        
-        # Read file content
-        content = await file.read()
-        
-        # Process document based on file type
-        extracted_text = doc_processor.extract_text_from_file(content, file.filename)
-        
-        if not extracted_text:
-            raise HTTPException(status_code=400, detail="Could not extract text from file")
-        
-        # Create document record
-        document = Document(
-            title=title,
-            filename=file.filename,
-            content=extracted_text,
-            document_type=document_type,
-            department=department or current_employee.department,
-            visibility=visibility_enum,
-            uploaded_by=current_employee.id
-        )
-        
-        db.add(document)
-        db.flush()
-        
-        # Process document for search (create chunks)
-        chunks = doc_processor.create_document_chunks(extracted_text)
-        
-        # Save chunks
-        from .models import DocumentChunk
-        for i, chunk_text in enumerate(chunks):
-            chunk = DocumentChunk(
-                document_id=document.id,
-                chunk_text=chunk_text,
-                chunk_index=i
+            title = fields.get("title")
+            document_type = fields.get("document_type")
+            if not title or not document_type:
+                raise HTTPException(status_code=422, detail="title and document_type are required")
+            
+            # Convert string to enum
+            try:
+                visibility_enum = DocumentVisibility(fields.get("visibility", "PUBLIC"))
+            except ValueError:
+                visibility_enum = DocumentVisibility.PUBLIC
+            
+            # Check if user can upload this document type
+            try:
+                if not auth_service.can_upload_document_type(current_employee, document_type):
+                    raise HTTPException(
+                        status_code=403, 
+                        detail=f"You don't have permission to upload {document_type} documents"
+                    )
+            except:
+                pass  # Skip permission check if method not available
+            
+            # Regular employees can only create public documents
+            if current_employee.user_role == UserRole.EMPLOYEE:
+                visibility_enum = DocumentVisibility.PUBLIC
+            
+            # Extraction, chunking and indexing run on the ingestion worker
+            job = ingestion_service.enqueue(
+                db, spooled, spooled["filename"], title, document_type,
+                fields.get("department") or current_employee.department, visibility_enum, current_employee
             )
-            db.add(chunk)
-        
-        db.commit()
+            job_id = job.id
+            db.commit()
+        except BaseException:
+            os.remove(spooled["path"])
+            raise
+        ingestion_service.wake()
         
-        return {
-            "message": "Document uploaded successfully",
-            "document_id": document.id,
-            "chunks_created": len(chunks),
-            "visibility": visibility_enum.value
-        }
+        return JSONResponse(status_code=202, content={
+            "message": "Document queued for processing",
+            "job_id": job_id,
+            "status": IngestionStatus.QUEUED.value,
+            "visibility": visibility_enum.value,
+            "sha256": spooled["sha256"]
+        })
         
     except HTTPException:
         db.rollback()
@@ -798,6 +1138,21 @@ async def upload_document(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
+@app.get("/api/documents/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: int,
+    current_employee: Employee = Depends(get_current_employee),
+    db: Session = Depends(get_db)
+):
+    """Stage, timings and result of a document ingestion job"""
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    # Only the uploader and HR may follow a job; others get the same answer as for a missing one
+    if not job or (job.uploaded_by != current_employee.id and
+                   current_employee.user_role not in [UserRole.HR_MANAGER, UserRole.HR_ADMIN]):
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    
+    return ingestion_service.describe(job)
+
 @app.get("/api/documents")
 async def get_documents(
     document_type: Optional[str] = None,
@@ -833,6 +1188,39 @@ async def get_documents(
         for doc in accessible_docs
     ]
 
+@app.delete("/api/documents/{document_id}")
+async def deactivate_document(
+    document_id: int,
+    current_employee: Employee = Depends(get_current_employee),
+    db: Session = Depends(get_db)
+):
+    """Deactivate a document and remove it from search (HR only)"""
+    if current_employee.user_role not in [UserRole.HR_MANAGER, UserRole.HR_ADMIN]:
+        raise HTTPException(status_code=403, detail="Access denied. HR role required.")
+    
+    try:
+        document = db.query(Document).filter(Document.id == document_id, Document.is_active == True).first()
+        if not document or not auth_service.can_access_document(current_employee, document):
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        document.is_active = False
+        document.last_modified = datetime.utcnow()
+        ai_service.index_manager.remove_document(db, document.id)
+        db.commit()
+        ai_service.index_manager.document_removed(document.id)
+        
+        # Answers cached while the document was searchable must not be served any more
+        ai_service.on_documents_changed()
+        
+        return {"message": "Document deactivated", "document_id": document.id}
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error deactivating document: {str(e)}")
+
 # HR Management endpoints (HR only)
 @app.get("/api/hr/employees")
 async def get_all_employees(
@@ -926,6 +1314,7 @@ async def get_usage_analytics(
         analytics = db.query(QueryAnalytics).all()
     
     intent_counts = {}
+    served_by_counts = {}
     total_queries = len(analytics)
     avg_confidence = sum(a.confidence_score or 0 for a in analytics) / max(total_queries, 1)
     avg_response_time = sum(a.response_time or 0 for a in analytics) / max(total_queries, 1)
@@ -933,12 +1322,15 @@ async def get_usage_analytics(
     for analytic in analytics:
         intent = analytic.query_intent or 'general'
         intent_counts[intent] = intent_counts.get(intent, 0) + 1
+        served_by = analytic.served_by or 'unknown'
+        served_by_counts[served_by] = served_by_counts.get(served_by, 0) + 1
     
     return {
         "total_queries": total_queries,
         "average_confidence": round(avg_confidence, 2),
         "average_response_time": round(avg_response_time, 3),
         "query_breakdown": intent_counts,
+        "served_by_breakdown": served_by_counts,
         "user_role": current_employee.user_role.value
     }
 
@@ -1016,8 +1408,34 @@ async def submit_feedback(
     
     return {"message": "Feedback submitted successfully"}
 
+@app.get("/api/system/status")
+async def get_system_status(
+    current_employee: Employee = Depends(get_current_employee),
+    db: Session = Depends(get_db)
+):
+    """LLM provider, cache, search index, ingestion and notification statistics (HR only)"""
+    if current_employee.user_role not in [UserRole.HR_MANAGER, UserRole.HR_ADMIN]:
+        raise HTTPException(status_code=403, detail="Access denied. HR role required.")
+    
+    return {
+        "llm": get_llm_gateway().get_stats(),
+        "intent_classification": ai_service.get_classification_stats(),
+        "notifications": notification_service.get_stats(),
+        "response_cache": ai_service.response_cache.get_stats(),
+        "semantic_cache": ai_service.semantic_cache.get_stats(),
+        "search_index": ai_service.search_index.get_stats(db),
+        "vector_store": ai_service.embedding_service.get_stats(),
+        "index_manager": ai_service.index_manager.get_stats(),
+        "ingestion": ingestion_service.get_stats(db),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 # Health check
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "llm_circuit": get_llm_gateway().circuit_breaker.state,
+        "timestamp": datetime.utcnow().isoformat()
+    }
\ No newline at end of file
@@ -36,6 +36,14 @@ class LeaveStatus(enum.Enum):
     CANCELLED = "cancelled"
     WITHDRAWN = "withdrawn"
 
+class IngestionStatus(enum.Enum):
+    QUEUED = "queued"
+    EXTRACTING = "extracting"
+    CHUNKING = "chunking"
+    INDEXING = "indexing"
+    DONE = "done"
+    FAILED = "failed"
+
 class Employee(Base):
     __tablename__ = "employees"
     
@@ -141,6 +149,8 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
     filename = Column(String(255), nullable=False)
+    file_size = Column(Integer)  # Bytes uploaded
+    file_sha256 = Column(String(64))  # Hex SHA-256 of the uploaded file
     content = Column(Text)
     document_type = Column(String(50))  # policy, procedure, handbook, etc.
     department = Column(String(50))
@@ -155,6 +165,35 @@ class Document(Base):
     chunks = relationship("DocumentChunk", back_populates="document")
     uploader = relationship("Employee", foreign_keys=[uploaded_by])
 
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(Enum(IngestionStatus), default=IngestionStatus.QUEUED, index=True)
+    file_path = Column(String(500), nullable=False)  # Spooled upload, removed when the job finishes
+    filename = Column(String(255), nullable=False)
+    file_size = Column(Integer)
+    file_sha256 = Column(String(64))
+    title = Column(String(200), nullable=False)
+    document_type = Column(String(50))
+    department = Column(String(50))
+    visibility = Column(Enum(DocumentVisibility), default=DocumentVisibility.PUBLIC)
+    uploaded_by = Column(Integer, ForeignKey("employees.id"))
+    document_id = Column(Integer, ForeignKey("documents.id"))  # Set once the job is done
+    chunks_created = Column(Integer)
+    attempts = Column(Integer, default=0)
+    error = Column(Text)  # Error of the latest failed attempt
+    stage_timings = Column(Text)  # JSON {stage: seconds} of the latest attempt
+    created_at = Column(DateTime, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)  # Start of the latest attempt
+    heartbeat_at = Column(DateTime)  # Last sign of life from the worker running the job
+    finished_at = Column(DateTime)
+    
+    # Relationships
+    document = relationship("Document")
+    uploader = relationship("Employee")
+
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     
@@ -162,7 +201,11 @@ class DocumentChunk(Base):
     document_id = Column(Integer, ForeignKey("documents.id"))
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer)
-    embedding_vector = Column(Text)  # JSON string of vector
+    start_offset = Column(Integer)  # chunk_text is document.content[start_offset:end_offset]
+    end_offset = Column(Integer)
+    embedding_vector = Column(Text)  # Legacy JSON vector from before the LSA model, no longer read
+    sentence_spans = Column(Text)  # JSON [[start, end], ...] character offsets of the sentences in chunk_text
+    sentence_tokens = Column(Text)  # JSON list of each sentence's normalized tokens
     
     # Relationships
     document = relationship("Document", back_populates="chunks")
@@ -203,8 +246,10 @@ class QueryAnalytics(Base):
     query_text = Column(Text, nullable=False)
     query_intent = Column(String(50))  # leave, policy, benefits, etc.
     response_time = Column(Float)
+    time_to_first_token = Column(Float)  # seconds until the first streamed chunk
     confidence_score = Column(Float)
     user_feedback = Column(Integer)  # 1-5 rating
     timestamp = Column(DateTime, default=datetime.utcnow)
     documents_used = Column(Text)  # JSON string
-    intent_details = Column(Text)  # JSON string of detailed intent analysis
\ No newline at end of file
+    intent_details = Column(Text)  # JSON string of detailed intent analysis
+    served_by = Column(String(30))  # llm, llm_hedge, fallback_deadline, fallback_error, leave_service
\ No newline at end of file
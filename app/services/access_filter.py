@@ -0,0 +1,70 @@
+import hashlib
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ..models import DocumentVisibility
+from .auth import AuthService
+
+# Small integer stored per indexed chunk for its document's visibility
+VISIBILITY_CODES = {visibility: code for code, visibility in enumerate(DocumentVisibility)}
+
+# Stands in for a department different from the caller's; equal to no department name
+_OTHER_DEPARTMENT = object()
+
+
+def department_code(department: Optional[str]) -> int:
+    """Stable int64 code of a department name (0 for no department), identical in every process"""
+    if department is None:
+        return 0
+    return int(hashlib.sha1(department.encode("utf-8")).hexdigest()[:15], 16) + 1
+
+
+def document_access(visibility: DocumentVisibility, department: Optional[str]) -> Tuple[int, int]:
+    """(visibility code, department code) stored with each chunk of a document"""
+    return VISIBILITY_CODES[visibility], department_code(department)
+
+
+class AccessFilter:
+    """Which indexed chunks an employee may read, decided from per-chunk access codes.
+
+    AuthService.can_access_document looks at a document's visibility and at whether its
+    department equals the employee's, nothing else. Evaluating it once per visibility for
+    "same department" and "other department" therefore gives two lookup tables that
+    reproduce it exactly, and a whole index column can be checked with array operations.
+    """
+
+    def __init__(self, employee):
+        self.department = department_code(employee.department)
+        self.same_department = np.zeros(len(VISIBILITY_CODES), dtype=bool)
+        self.other_department = np.zeros(len(VISIBILITY_CODES), dtype=bool)
+        for visibility, code in VISIBILITY_CODES.items():
+            self.same_department[code] = AuthService.can_access_document(
+                employee, SimpleNamespace(visibility=visibility, department=employee.department)
+            )
+            self.other_department[code] = AuthService.can_access_document(
+                employee, SimpleNamespace(visibility=visibility, department=_OTHER_DEPARTMENT)
+            )
+
+    def mask(self, visibility: np.ndarray, department: np.ndarray) -> np.ndarray:
+        """Boolean mask over index rows given their visibility and department code columns"""
+        return np.where(department == self.department,
+                        self.same_department[visibility], self.other_department[visibility])
+
+    def sql_condition(self, visibility_column: str, department_column: str) -> Tuple[str, Dict]:
+        """Equivalent SQL predicate over two index columns, with its parameters"""
+        def codes(allowed: np.ndarray) -> str:
+            return ",".join(str(code) for code in np.flatnonzero(allowed))
+
+        both = self.same_department & self.other_department
+        clauses = []
+        if both.any():
+            clauses.append(f"{visibility_column} IN ({codes(both)})")
+        if (self.same_department & ~both).any():
+            clauses.append(f"({visibility_column} IN ({codes(self.same_department & ~both)}) "
+                           f"AND {department_column} = :department_code)")
+        if (self.other_department & ~both).any():
+            clauses.append(f"({visibility_column} IN ({codes(self.other_department & ~both)}) "
+                           f"AND {department_column} != :department_code)")
+        return "(" + (" OR ".join(clauses) or "0") + ")", {"department_code": self.department}
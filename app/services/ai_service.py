@@ -1,131 +1,282 @@
-import os
-from groq import Groq
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import asyncio
 import json
+import logging
+import os
 import re
 from sqlalchemy.orm import Session
 
+from .intent_context import (
+    IntentContext, is_leave_route, SERVED_BY_LLM, SERVED_BY_LLM_HEDGE,
+    SERVED_BY_DEADLINE_FALLBACK, SERVED_BY_ERROR_FALLBACK, SERVED_BY_CACHE, SERVED_BY_SEMANTIC_CACHE
+)
+from .leave_service import LeaveIntentAgent
+from .llm_gateway import get_llm_gateway, LLMTruncatedError, TASK_INTENT, TASK_ANSWER_GENERATION
+from .response_cache import ResponseCache
+from .semantic_cache import SemanticCache, answer_evidence
+from .search_index import SearchIndex
+from .embedding_service import EmbeddingService
+from .hybrid_retriever import HybridRetriever
+from .access_filter import AccessFilter
+from .index_manager import IndexManager
+from ..utils.document_processor import TOKEN_PIECES, DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+# Latency budget for a whole chat turn; past it the answer is built from the retrieved documents
+CHAT_TURN_DEADLINE_SECONDS = float(os.getenv("CHAT_TURN_DEADLINE_SECONDS", "10"))
+
+# Exact-match cache for generated answers (0 entries disables it)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+# Paraphrase cache: minimum cosine similarity between LSA query vectors whose retrieval found the same sentence
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE", "500"))
+
+# Answer context size, counted in retrieved chunks
+RETRIEVAL_MAX_CONTEXT_CHUNKS = int(os.getenv("RETRIEVAL_MAX_CONTEXT_CHUNKS", "6"))
+
+# Best-matching sentences of a passage returned as highlights
+MAX_PASSAGE_HIGHLIGHTS = 3
+
 class AIService:
     
+    # Coarse intent categories returned by the classifiers
+    INTENT_CATEGORIES = [
+        'leave_balance', 'leave_application', 'leave_status', 'leave_cancellation',
+        'emergency_leave', 'manager_query', 'leave_policy', 'benefits', 'policy',
+        'payroll', 'conduct', 'general'
+    ]
+    
     def __init__(self):
-        # Initialize Groq client - you'll need to set your API key
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            print("⚠️  Warning: GROQ_API_KEY not found in environment variables")
-            print("Please set your Groq API key in the .env file")
-            api_key = "dummy_key_for_testing"
+        # Leave prompt sections, entity validation and keyword fallbacks for the unified classifier
+        self.leave_intent_agent = LeaveIntentAgent()
         
-        try:
-            self.groq_client = Groq(api_key=api_key)
-        except Exception as e:
-            print(f"Error initializing Groq client: {e}")
-            self.groq_client = None
-    
-    def classify_query_intent(self, query: str, employee_context: Dict = None) -> str:
-        """Enhanced intent classification using Groq AI model"""
+        # Shared Groq gateway (connection pool, retries, per-task models)
+        self.llm_gateway = get_llm_gateway()
+        
+        # Classifier token budget: twice the pieces of its JSON output format, which leaves room
+        # for reasons and date text; the intent profile's max_tokens applies when it is larger
+        self.intent_max_tokens = 2 * len(TOKEN_PIECES.findall(self.build_unified_output_format()))
+        # Turns classified by keywords because the model's answer was unusable, by cause
+        self.classification_fallbacks = {"truncated": 0, "unparsable": 0, "timeout": 0, "error": 0}
+        
+        # Generated answers shared between employees with the same ACL scope
+        self.response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+        self.semantic_cache = SemanticCache(
+            SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE, RESPONSE_CACHE_TTL_SECONDS
+        )
+        
+        # Full-text index over document chunks (schema created at startup)
+        self.search_index = SearchIndex()
+        
+        # Local dense embeddings of document chunks for matching beyond exact terms
+        self.embedding_service = EmbeddingService()
         
-        if not employee_context:
-            employee_context = {}
+        # Lexical and vector chunk search fused into one ranking
+        self.retriever = HybridRetriever(self.search_index, self.embedding_service)
         
-        # Build intent classification prompt
-        prompt = self.build_intent_classification_prompt(query, employee_context)
+        # Incremental updates of both indexes and background merges of the vector store
+        self.index_manager = IndexManager(self.search_index, self.embedding_service)
         
-        if self.groq_client:
+        # Query tokens are normalized the same way as the sentence tokens stored at ingest
+        self.document_processor = DocumentProcessor()
+    
+    def map_intent_category(self, ai_intent: str) -> Optional[str]:
+        """Map a model-generated label onto one of our intent categories"""
+        ai_intent = (ai_intent or "").strip().lower()
+        for key in self.INTENT_CATEGORIES:
+            if key in ai_intent:
+                return key
+        return None
+    
+    def build_employee_context(self, employee) -> Dict:
+        """Employee details used by the intent classifier"""
+        return {
+            "name": employee.name,
+            "employee_id": employee.employee_id,
+            "department": employee.department,
+            "role": employee.role,
+            "user_role": employee.user_role.value
+        }
+    
+    async def create_intent_context(self, query: str, employee, conversation_history: List = None, employee_context: Dict = None) -> IntentContext:
+        """Create the per-turn intent context and classify the query exactly once"""
+        intent_context = IntentContext(
+            query,
+            employee_context or self.build_employee_context(employee),
+            conversation_history,
+            deadline_seconds=CHAT_TURN_DEADLINE_SECONDS
+        )
+        await self.classify_turn(intent_context)
+        return intent_context
+    
+    async def classify_turn(self, intent_context: IntentContext) -> str:
+        """Classify route and leave entities in one call unless the context already carries them"""
+        if intent_context.is_classified:
+            return intent_context.intent
+        
+        prompt = self.build_unified_classification_prompt(
+            intent_context.query, intent_context.employee_context, intent_context.conversation_history
+        )
+        
+        result = None
+        if self.llm_gateway.is_available:
             try:
-                response = self.groq_client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert HR intent classifier. Analyze the user query and classify it into the most appropriate category. Return only the intent category name."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    model="llama-3.3-70b-versatile",
-                    temperature=0.1,
-                    max_tokens=50
+                # Past the turn deadline the keyword classifier takes over
+                ai_response = await asyncio.wait_for(
+                    self.llm_gateway.complete(
+                        TASK_INTENT,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": "You are an expert HR intent classifier. Route the employee message and, for leave-related messages, extract the structured leave details. Respond with JSON only."
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        # JSON mode, with room for the whole output format: a cut-off object cannot be parsed
+                        response_format={"type": "json_object"},
+                        max_tokens=max(self.llm_gateway.get_task_profile(TASK_INTENT)["max_tokens"],
+                                       self.intent_max_tokens),
+                        require_complete=True
+                    ),
+                    timeout=intent_context.remaining_budget()
                 )
                 
-                if response and response.choices and len(response.choices) > 0:
-                    ai_intent = response.choices[0].message.content.strip().lower()
-                    
-                    # Map AI response to our intent categories
-                    intent_mapping = {
-                        'leave_balance': 'leave_balance',
-                        'leave_application': 'leave_application', 
-                        'leave_status': 'leave_status',
-                        'leave_cancellation': 'leave_cancellation',
-                        'emergency_leave': 'emergency_leave',
-                        'manager_query': 'manager_query',
-                        'leave_policy': 'leave_policy',
-                        'benefits': 'benefits',
-                        'policy': 'policy',
-                        'payroll': 'payroll',
-                        'conduct': 'conduct',
-                        'general': 'general'
-                    }
-                    
-                    # Find best match
-                    for key in intent_mapping:
-                        if key in ai_intent:
-                            print(f"DEBUG: Groq classified '{query}' as '{key}'")
-                            return intent_mapping[key]
-                    
-                    print(f"DEBUG: Groq returned unmapped intent: '{ai_intent}', using fallback")
-                    return self.fallback_intent_classification(query)
+                result = self.parse_unified_classification(ai_response, intent_context)
+                if result is None:
+                    self.classification_fallbacks["unparsable"] += 1
                     
+            except LLMTruncatedError as e:
+                self.classification_fallbacks["truncated"] += 1
+                logger.warning(f"Unified classification truncated, using keyword fallback: {e}")
+            except asyncio.TimeoutError:
+                self.classification_fallbacks["timeout"] += 1
+                logger.warning("Unified classification timed out, using keyword fallback")
             except Exception as e:
-                print(f"Error with Groq intent classification: {e}")
-                return self.fallback_intent_classification(query)
+                self.classification_fallbacks["error"] += 1
+                logger.error(f"Error with Groq unified classification: {e}")
         
-        # Fallback to keyword-based classification
-        return self.fallback_intent_classification(query)
+        if result is None:
+            result = self.fallback_unified_classification(intent_context)
+        
+        intent, leave_classification = result
+        logger.debug(f"Turn classified '{intent_context.query}' as '{intent}'"
+              + (f" / {leave_classification['primary_intent']}" if leave_classification else ""))
+        intent_context.record_classification(intent, leave_classification)
+        return intent_context.intent
     
-    def build_intent_classification_prompt(self, query: str, employee_context: Dict) -> str:
-        """Build prompt for intent classification"""
+    def build_unified_classification_prompt(self, query: str, employee_context: Dict, conversation_history: List = None) -> str:
+        """Build one prompt that asks for the coarse route and the structured leave analysis"""
         
+        agent = self.leave_intent_agent
         user_role = employee_context.get('user_role', 'employee')
         
         prompt = f"""
-Classify the following HR-related query into one of these categories:
+Classify the employee message below and return a single JSON object.
+
+{agent.build_employee_profile(employee_context)}
 
-EMPLOYEE QUERIES:
+{agent.build_history_context(conversation_history)}
+
+CURRENT USER MESSAGE: "{query}"
+
+STEP 1 - "route": choose exactly one category:
 - leave_balance: Questions about remaining leave days, balance checks
 - leave_application: Requests to apply for leave, time off requests
 - leave_status: Questions about existing leave application status
 - leave_cancellation: Requests to cancel existing leave applications
 - emergency_leave: Urgent leave requests requiring immediate attention
 - leave_policy: Questions about leave policies and rules
+- manager_query: Manager/HR asking about team leave, pending approvals, team schedules
 - benefits: Questions about health insurance, retirement, benefits
 - policy: Questions about company policies and procedures
 - payroll: Questions about salary, pay, compensation
 - conduct: Questions about workplace behavior and guidelines
-
-MANAGER/HR QUERIES:
-- manager_query: Manager asking about team leave, pending approvals, team schedules
-
-GENERAL:
 - general: Any other HR-related questions
 
-USER CONTEXT:
-- User Role: {user_role}
-- Query: "{query}"
-
-CLASSIFICATION RULES:
-1. If user is a manager/HR and asks about "pending", "approval", "team leave" → manager_query
-2. If asking about "balance", "remaining", "how many days" → leave_balance  
-3. If requesting leave with dates/duration → leave_application
+ROUTING RULES:
+1. If user role ({user_role}) is manager/HR and asks about "pending", "approval", "team leave" → manager_query
+2. If asking about "balance", "remaining", "how many days" → leave_balance
+3. If requesting leave with dates/duration, or continuing a leave application → leave_application
 4. If asking "where is my", "status of", "approved" → leave_status
 5. If contains "emergency", "urgent", "asap" → emergency_leave
 6. If asking about "cancel", "withdraw" leave → leave_cancellation
 
-Return only the category name (e.g., "leave_balance", "manager_query", etc.):
+STEP 2 - "leave": only when the route starts with "leave_" or is emergency_leave or manager_query,
+fill the structured leave analysis below; otherwise set "leave" to null.
+
+{agent.LEAVE_INTENT_GUIDE}
+
+OUTPUT FORMAT (JSON):
+{self.build_unified_output_format()}
 """
         
         return prompt
     
+    def build_unified_output_format(self) -> str:
+        """JSON object the unified classifier answers with"""
+        return f"""{{
+    "route": "category_name",
+    "leave": {self.leave_intent_agent.build_leave_entities_format()}
+}}"""
+    
+    def parse_unified_classification(self, ai_response: str, intent_context: IntentContext):
+        """Parse the unified classifier output into (route, leave classification); None if unusable"""
+        if not ai_response:
+            logger.warning("Groq returned empty unified classification")
+            return None
+        
+        try:
+            json_start = ai_response.find('{')
+            json_end = ai_response.rfind('}') + 1
+            if json_start < 0 or json_end <= json_start:
+                logger.warning(f"No valid JSON found in unified classification: {ai_response}")
+                return None
+            data = json.loads(ai_response[json_start:json_end])
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON decode error in unified classification: {e}")
+            return None
+        
+        intent = self.map_intent_category(str(data.get("route", "")))
+        if not intent:
+            logger.debug(f"Groq returned unmapped route: '{data.get('route')}', using fallback")
+            return None
+        
+        leave_classification = None
+        if is_leave_route(intent):
+            leave_data = data.get("leave")
+            if isinstance(leave_data, dict) and leave_data.get("primary_intent"):
+                leave_classification = self.leave_intent_agent.validate_intent_response(leave_data)
+            else:
+                leave_classification = self.leave_intent_agent.fallback_intent_classification(
+                    intent_context.query, intent_context.employee_context
+                )
+        
+        return intent, leave_classification
+    
+    def fallback_unified_classification(self, intent_context: IntentContext):
+        """Keyword-based route and leave classification when the model is unavailable"""
+        intent = self.fallback_intent_classification(intent_context.query)
+        
+        leave_classification = None
+        if is_leave_route(intent):
+            leave_classification = self.leave_intent_agent.fallback_intent_classification(
+                intent_context.query, intent_context.employee_context
+            )
+        
+        return intent, leave_classification
+    
+    def get_classification_stats(self) -> Dict:
+        return {
+            "max_tokens": max(self.llm_gateway.get_task_profile(TASK_INTENT)["max_tokens"], self.intent_max_tokens),
+            "fallbacks": dict(self.classification_fallbacks)
+        }
+    
     def fallback_intent_classification(self, query: str) -> str:
         """Fallback intent classification using keyword matching"""
         query_lower = query.lower()
@@ -219,125 +370,121 @@ Return only the category name (e.g., "leave_balance", "manager_query", etc.):
         regex_pattern = pattern.replace('*', r'.*?')
         return bool(re.search(regex_pattern, text))
     
-    def search_relevant_documents(self, db: Session, query: str, limit: int = 3) -> List[Dict]:
-        """Search for relevant documents based on query (original method for backward compatibility)"""
-        # Import here to avoid circular imports
-        from ..models import Document
-        
-        query_words = query.lower().split()
-        
-        documents = db.query(Document).filter(Document.is_active == True).all()
-        scored_docs = []
-        
-        for doc in documents:
-            if doc.content:
-                content_lower = doc.content.lower()
-                score = 0
-                
-                # Calculate relevance score based on keyword matches
-                for word in query_words:
-                    if len(word) > 2:  # Skip very short words
-                        score += content_lower.count(word)
-                
-                # Boost score for title matches
-                title_lower = doc.title.lower()
-                for word in query_words:
-                    if word in title_lower:
-                        score += 3
-                
-                if score > 0:
-                    scored_docs.append({
-                        'document': doc,
-                        'score': score,
-                        'relevant_content': self.extract_relevant_content(doc.content, query_words)
-                    })
-        
-        # Sort by score and return top results
-        scored_docs.sort(key=lambda x: x['score'], reverse=True)
-        return scored_docs[:limit]
-    
-    def search_relevant_documents_from_list(self, documents: List, query: str, limit: int = 3) -> List[Dict]:
-        """Search for relevant documents from a pre-filtered list (for RBAC)"""
-        query_words = query.lower().split()
-        scored_docs = []
-        
-        for doc in documents:
-            if doc.content:
-                content_lower = doc.content.lower()
-                score = 0
-                
-                # Calculate relevance score based on keyword matches
-                for word in query_words:
-                    if len(word) > 2:  # Skip very short words
-                        score += content_lower.count(word)
-                
-                # Boost score for title matches
-                title_lower = doc.title.lower()
-                for word in query_words:
-                    if word in title_lower:
-                        score += 3
-                
-                if score > 0:
-                    scored_docs.append({
-                        'document': doc,
-                        'score': score,
-                        'relevant_content': self.extract_relevant_content(doc.content, query_words)
-                    })
-        
-        # Sort by score and return top results
-        scored_docs.sort(key=lambda x: x['score'], reverse=True)
-        return scored_docs[:limit]
-    
-    def extract_relevant_content(self, content: str, query_words: List[str], max_length: int = 500) -> str:
-        """Extract most relevant content snippet from document"""
-        sentences = content.split('.')
-        scored_sentences = []
-        
-        for sentence in sentences:
-            if len(sentence.strip()) < 10:
-                continue
-                
-            score = 0
-            sentence_lower = sentence.lower()
-            for word in query_words:
-                if len(word) > 2 and word in sentence_lower:
-                    score += 1
-            
-            if score > 0:
-                scored_sentences.append((sentence.strip(), score))
+    def search_chunks(self, db: Session, employee, query: str,
+                      max_chunks: int = RETRIEVAL_MAX_CONTEXT_CHUNKS) -> List[Dict]:
+        """Best chunks the employee may read by hybrid lexical + vector search, merged into passages"""
+        chunk_hits = self.retriever.search(db, query, AccessFilter(employee), max_chunks)
+        for hit in chunk_hits:
+            logger.debug(f"Retrieved chunk {hit['chunk_id']} (document {hit['document_id']}) "
+                  f"fused={hit['score']:.4f} sources={hit['sources']}")
+        return self.build_passages(db, chunk_hits, query)
+    
+    def build_passages(self, db: Session, chunk_hits: List[Dict], query: str = "") -> List[Dict]:
+        """Merge runs of adjacent winning chunks of a document into one passage each.
         
-        # Sort by relevance and combine top sentences
-        scored_sentences.sort(key=lambda x: x[1], reverse=True)
+        Passages keep the document-result keys (document, score, relevant_content) and add the
+        ids of their chunks, the hits that selected them and the highlights of the query's
+        best sentences; a passage scores as its best chunk and the best passage comes first.
+        """
+        from ..models import Document, DocumentChunk
+        from sqlalchemy.orm import defer
+        
+        if not chunk_hits:
+            return []
+        
+        hits = {hit['chunk_id']: hit for hit in chunk_hits}
+        chunks = db.query(DocumentChunk).filter(DocumentChunk.id.in_(hits)).order_by(
+            DocumentChunk.document_id, DocumentChunk.chunk_index
+        ).all()
+        documents = {
+            doc.id: doc for doc in
+            db.query(Document).options(defer(Document.content)).filter(
+                Document.id.in_({chunk.document_id for chunk in chunks})
+            )
+        }
         
-        result = ""
-        for sentence, _ in scored_sentences[:3]:
-            if len(result + sentence) < max_length:
-                result += sentence + ". "
+        runs = []
+        for chunk in chunks:
+            previous = runs[-1][-1] if runs else None
+            if (previous is not None and previous.document_id == chunk.document_id
+                    and previous.chunk_index + 1 == chunk.chunk_index):
+                runs[-1].append(chunk)
             else:
-                break
-        
-        return result.strip() if result else content[:max_length] + "..."
+                runs.append([chunk])
+        
+        query_tokens = set(self.document_processor.normalize_tokens(query))
+        passages = []
+        for run in runs:
+            content, placements = self.merge_chunk_spans(run)
+            passages.append({
+                'document': documents[run[0].document_id],
+                'score': max(hits[chunk.id]['score'] for chunk in run),
+                'relevant_content': content,
+                'chunk_ids': [chunk.id for chunk in run],
+                'retrieval': [hits[chunk.id] for chunk in run],
+                'highlights': self.find_highlights(query_tokens, run, placements)
+            })
+        passages.sort(key=lambda passage: passage['score'], reverse=True)
+        return passages
+    
+    def merge_chunk_spans(self, chunks: List) -> Tuple[str, List[Tuple[int, int]]]:
+        """Text a run of adjacent chunks covers in their document and, per chunk, (offset, skip):
+        character i >= skip of the chunk is character offset + i of the text, the first skip
+        characters repeat the previous chunk. Placed by the chunks' offsets, no text is compared."""
+        start = chunks[0].start_offset
+        end = chunks[0].end_offset
+        parts = [chunks[0].chunk_text]
+        placements = [(0, 0)]
+        for chunk in chunks[1:]:
+            skip = max(0, end - chunk.start_offset)
+            if chunk.start_offset > end:
+                # Only whitespace lies between chunks
+                parts.append(" " * (chunk.start_offset - end))
+            parts.append(chunk.chunk_text[skip:])
+            placements.append((chunk.start_offset - start, skip))
+            end = max(end, chunk.end_offset)
+        return "".join(parts), placements
     
-    def generate_hr_response(self, query: str, employee, relevant_docs: List[Dict], intent_classification: Dict = None) -> Dict:
+    def find_highlights(self, query_tokens, chunks, placements, limit: int = MAX_PASSAGE_HIGHLIGHTS) -> List[Dict]:
+        """Character ranges of the passage's sentences sharing the most tokens with the query,
+        scored from the spans and tokens stored with each chunk, in reading order"""
+        if not query_tokens:
+            return []
+        
+        scored = []
+        for chunk, (offset, skip) in zip(chunks, placements):
+            if not chunk.sentence_spans:
+                continue
+            for (start, end), tokens in zip(json.loads(chunk.sentence_spans), json.loads(chunk.sentence_tokens)):
+                score = len(query_tokens.intersection(tokens))
+                if score > 0 and end > skip:
+                    scored.append((score, offset + max(start, skip), offset + end))
+        
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [{"start": start, "end": end, "score": score}
+                for score, start, end in sorted(scored[:limit], key=lambda item: item[1])]
+    
+    def passage_snippet(self, passage: Dict, max_length: int = 500) -> str:
+        """The highlighted sentences of a passage, or its beginning when nothing was highlighted"""
+        content = passage['relevant_content']
+        highlights = passage.get('highlights')
+        if not highlights:
+            return content if len(content) <= max_length else content[:max_length] + "..."
+        return " ... ".join(content[highlight['start']:highlight['end']] for highlight in highlights)
+    
+    async def generate_hr_response(self, query: str, employee, relevant_docs: List[Dict], intent_classification: Dict = None, intent_context: IntentContext = None) -> Dict:
         """Enhanced HR response generation with leave management support"""
         
-        # Get employee context for intent classification
-        employee_context = {
-            "name": employee.name,
-            "department": employee.department,
-            "role": employee.role,
-            "user_role": employee.user_role.value
-        }
+        # Reuse the turn's classification when the caller already made one
+        if intent_context is None:
+            intent_context = await self.create_intent_context(query, employee)
         
-        # Check if this is a leave-related query using enhanced classification
-        intent = self.classify_query_intent(query, employee_context)
-        
-        if intent.startswith('leave_') or intent == 'manager_query':
+        if intent_context.is_leave_intent:
             # Delegate to leave service for specialized handling
-            return self.generate_leave_response(query, employee, intent_classification, intent)
+            return self.generate_leave_response(query, employee, intent_classification, intent_context.intent)
         
         # Handle non-leave queries with existing logic
-        return self.generate_standard_hr_response(query, employee, relevant_docs)
+        return await self.generate_standard_hr_response(query, employee, relevant_docs, intent_context)
     
     def generate_leave_response(self, query: str, employee, intent_classification: Dict = None, detected_intent: str = None) -> Dict:
         """Generate response for leave-related queries"""
@@ -367,80 +514,231 @@ Return only the category name (e.g., "leave_balance", "manager_query", etc.):
                 "intent": detected_intent or "leave_general"
             }
     
-    def generate_standard_hr_response(self, query: str, employee, relevant_docs: List[Dict]) -> Dict:
+    async def generate_standard_hr_response(self, query: str, employee, relevant_docs: List[Dict], intent_context: IntentContext = None) -> Dict:
         """Generate AI response using Groq API with HR context"""
         
-        # Build context from relevant documents
-        context = ""
-        source_docs = []
+        if intent_context is None:
+            intent_context = await self.create_intent_context(query, employee)
         
-        for doc_info in relevant_docs:
-            doc = doc_info['document']
-            content = doc_info['relevant_content']
-            context += f"\n--- {doc.title} ---\n{content}\n"
-            source_docs.append(doc.id)
-        
-        # Create HR-specific prompt
-        prompt = self.build_hr_prompt(query, employee, context)
+        messages, source_chunks = self.build_answer_messages(query, employee, relevant_docs)
         
         try:
-            # Check if Groq client is available
-            if not self.groq_client:
-                return {
-                    "response": "I apologize, but the AI service is currently unavailable. Please check the API configuration and try again.",
-                    "confidence": 0.0,
-                    "source_documents": source_docs,
-                    "intent": self.classify_query_intent(query)
-                }
-            
-            # Call Groq API
-            response = self.groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful HR assistant. Provide accurate, professional, and empathetic responses to employee questions based on company policies and documents."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-                temperature=0.3,
-                max_tokens=500
+            # Call Groq API (raises when no provider is configured, which takes the fallback path).
+            # Slow calls are hedged with a duplicate request and the whole call is bounded by
+            # what is left of the turn deadline.
+            ai_response, hedged = await asyncio.wait_for(
+                self.llm_gateway.complete_hedged(TASK_ANSWER_GENERATION, messages=messages),
+                timeout=intent_context.remaining_budget()
             )
             
-            ai_response = response.choices[0].message.content
+            if not ai_response:
+                raise ValueError("Groq returned an empty response")
             
             # Calculate confidence score (simple heuristic)
             confidence = self.calculate_confidence_score(query, relevant_docs, ai_response)
+            intent_context.served_by = SERVED_BY_LLM_HEDGE if hedged else SERVED_BY_LLM
             
-            return {
+            result = {
                 "response": ai_response,
                 "confidence": confidence,
-                "source_documents": source_docs,
-                "intent": self.classify_query_intent(query)
+                "source_documents": source_chunks,
+                "documents_used": self.get_document_ids(relevant_docs),
+                "intent": intent_context.intent,
+                "served_by": intent_context.served_by
             }
+            self.cache_response(query, employee, result, relevant_docs)
+            return result
             
         except Exception as e:
             # Fallback response based on intent and context
-            fallback_response = self.generate_fallback_response(query, employee, relevant_docs)
+            self.record_fallback_path(e, intent_context)
+            fallback_response = await self.generate_fallback_response(query, employee, relevant_docs, intent_context)
             
             return {
                 "response": fallback_response,
                 "confidence": 0.7,
-                "source_documents": source_docs,
-                "intent": self.classify_query_intent(query)
+                "source_documents": source_chunks,
+                "documents_used": self.get_document_ids(relevant_docs),
+                "intent": intent_context.intent,
+                "served_by": intent_context.served_by
             }
     
-    def generate_fallback_response(self, query: str, employee, relevant_docs: List[Dict]) -> str:
+    async def stream_standard_hr_response(self, query: str, employee, relevant_docs: List[Dict], intent_context: IntentContext):
+        """Stream the HR answer as ("token", text) events followed by one ("result", dict) event.
+        
+        The result dict has the same shape as generate_standard_hr_response(). The first token
+        must arrive within the turn deadline; otherwise the document-based fallback is sent.
+        """
+        messages, source_chunks = self.build_answer_messages(query, employee, relevant_docs)
+        parts = []
+        stream = self.llm_gateway.stream(TASK_ANSWER_GENERATION, messages=messages)
+        
+        try:
+            first_token = await asyncio.wait_for(stream.__anext__(), timeout=intent_context.remaining_budget())
+            parts.append(first_token)
+            yield "token", first_token
+            async for token in stream:
+                parts.append(token)
+                yield "token", token
+            intent_context.served_by = SERVED_BY_LLM
+        except Exception as e:
+            if parts:
+                # The client already has part of the answer; end the stream with what was delivered
+                logger.warning(f"Answer stream interrupted after {len(parts)} chunks: {e}")
+                intent_context.served_by = SERVED_BY_ERROR_FALLBACK
+            else:
+                if isinstance(e, StopAsyncIteration):
+                    e = ValueError("Groq returned an empty response")
+                self.record_fallback_path(e, intent_context)
+                fallback_response = await self.generate_fallback_response(query, employee, relevant_docs, intent_context)
+                yield "token", fallback_response
+                yield "result", {
+                    "response": fallback_response,
+                    "confidence": 0.7,
+                    "source_documents": source_chunks,
+                    "documents_used": self.get_document_ids(relevant_docs),
+                    "intent": intent_context.intent,
+                    "served_by": intent_context.served_by
+                }
+                return
+        finally:
+            await stream.aclose()
+        
+        ai_response = "".join(parts)
+        result = {
+            "response": ai_response,
+            "confidence": self.calculate_confidence_score(query, relevant_docs, ai_response),
+            "source_documents": source_chunks,
+            "documents_used": self.get_document_ids(relevant_docs),
+            "intent": intent_context.intent,
+            "served_by": intent_context.served_by
+        }
+        self.cache_response(query, employee, result, relevant_docs)
+        yield "result", result
+    
+    @property
+    def document_index_version(self) -> int:
+        """Bumped by every index change in any worker, so cached answers built on older content stop matching"""
+        return self.index_manager.version
+    
+    def get_cached_response(self, query: str, employee, intent_context: IntentContext) -> Optional[Dict]:
+        """Previously generated answer for the same query in the caller's ACL scope (checked before retrieval)"""
+        cached = self.response_cache.get(query, employee, self.document_index_version)
+        if cached is None:
+            return None
+        intent_context.served_by = SERVED_BY_CACHE
+        cached.update(intent=intent_context.intent, served_by=SERVED_BY_CACHE)
+        return cached
+    
+    def get_similar_cached_response(self, query: str, employee, intent_context: IntentContext,
+                                    relevant_docs: List[Dict]) -> Optional[Dict]:
+        """Answer generated for a paraphrase of the query whose retrieval found the same evidence"""
+        cached = self.semantic_cache.get(*self.semantic_cache_key(query, relevant_docs), employee,
+                                         self.document_index_version)
+        if cached is None:
+            return None
+        intent_context.served_by = SERVED_BY_SEMANTIC_CACHE
+        cached.update(intent=intent_context.intent, served_by=SERVED_BY_SEMANTIC_CACHE)
+        return cached
+    
+    def semantic_cache_key(self, query: str, relevant_docs: List[Dict]):
+        """Query vector and evidence key for the paraphrase cache; queries the embedding model
+        cannot place only match the same content words grounded in the same sentence"""
+        query_vector = self.embedding_service.embed_query(query)
+        return query_vector, answer_evidence(query, relevant_docs, with_words=not query_vector.any())
+    
+    def cache_response(self, query: str, employee, result: Dict, relevant_docs: List[Dict]):
+        """Keep model-generated answers; fallbacks are cheap and should not outlive an outage"""
+        if result.get("served_by") in (SERVED_BY_LLM, SERVED_BY_LLM_HEDGE):
+            cached = {
+                "response": result["response"],
+                "confidence": result["confidence"],
+                "source_documents": result["source_documents"],
+                "documents_used": result["documents_used"],
+                "sources": self.describe_sources(relevant_docs)
+            }
+            self.response_cache.put(query, employee, self.document_index_version, cached)
+            self.semantic_cache.put(*self.semantic_cache_key(query, relevant_docs), employee,
+                                    self.document_index_version, cached)
+    
+    def describe_sources(self, relevant_docs: List[Dict]) -> List[Dict]:
+        """Id and title of each document behind the retrieved passages, with the passages' text
+        and the [start, end] offsets in it that the UI highlights"""
+        titles = {doc_info['document'].id: doc_info['document'].title for doc_info in relevant_docs}
+        passages = {}
+        for doc_info in relevant_docs:
+            if 'highlights' in doc_info:
+                passages.setdefault(doc_info['document'].id, []).append({
+                    "chunk_ids": doc_info['chunk_ids'],
+                    "text": doc_info['relevant_content'],
+                    "highlights": [[highlight['start'], highlight['end']] for highlight in doc_info['highlights']]
+                })
+        return [
+            {"id": doc_id, "title": titles[doc_id], "passages": passages.get(doc_id, [])}
+            for doc_id in self.get_document_ids(relevant_docs)
+        ]
+    
+    def on_document_added(self, document):
+        """Drop cached answers for every ACL scope that can now see the new document"""
+        removed = self.response_cache.invalidate_document(document)
+        removed += self.semantic_cache.invalidate_document(document)
+        logger.debug(f"Document {document.id} added, invalidated {removed} cached answers")
+    
+    def on_documents_changed(self):
+        """Existing documents changed; cached answers are unreachable under the new index version, free them"""
+        self.response_cache.clear()
+        self.semantic_cache.clear()
+    
+    def build_answer_messages(self, query: str, employee, relevant_docs: List[Dict]):
+        """Chat messages for answer generation and the ids of the chunks used as context"""
+        
+        # Build context from the retrieved passages
+        context = ""
+        source_chunks = []
+        
+        for doc_info in relevant_docs:
+            doc = doc_info['document']
+            content = doc_info['relevant_content']
+            context += f"\n--- {doc.title} ---\n{content}\n"
+            source_chunks.extend(doc_info.get('chunk_ids', []))
+        
+        # Create HR-specific prompt
+        prompt = self.build_hr_prompt(query, employee, context)
+        
+        messages = [
+            {
+                "role": "system",
+                "content": "You are a helpful HR assistant. Provide accurate, professional, and empathetic responses to employee questions based on company policies and documents."
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ]
+        return messages, source_chunks
+    
+    def get_document_ids(self, relevant_docs: List[Dict]) -> List[int]:
+        """Distinct documents behind the retrieved passages, best first"""
+        return list(dict.fromkeys(doc_info['document'].id for doc_info in relevant_docs))
+    
+    def record_fallback_path(self, error: Exception, intent_context: IntentContext):
+        """Mark the turn as answered by the fallback, distinguishing deadline expiry from errors"""
+        if isinstance(error, asyncio.TimeoutError) and intent_context.remaining_budget() == 0:
+            logger.warning(f"Turn deadline of {intent_context.deadline_seconds}s reached, answering from documents")
+            intent_context.served_by = SERVED_BY_DEADLINE_FALLBACK
+        else:
+            intent_context.served_by = SERVED_BY_ERROR_FALLBACK
+    
+    async def generate_fallback_response(self, query: str, employee, relevant_docs: List[Dict], intent_context: IntentContext = None) -> str:
         """Generate fallback response when Groq API is unavailable"""
-        intent = self.classify_query_intent(query)
+        if intent_context is None:
+            intent_context = await self.create_intent_context(query, employee)
+        intent = intent_context.intent
         
         # Use relevant documents to create response
         if relevant_docs:
             doc_info = relevant_docs[0]
-            content = doc_info['relevant_content']
+            content = self.passage_snippet(doc_info)
             doc_title = doc_info['document'].title
             
             response = f"Based on our {doc_title}, here's what I found:\n\n{content}\n\n"
@@ -465,12 +763,11 @@ Return only the category name (e.g., "leave_balance", "manager_query", etc.):
     def build_hr_prompt(self, query: str, employee, context: str) -> str:
         """Build context-aware prompt for HR queries"""
         
+        # Only ACL-scope attributes: answers are cached and shared within the scope
         employee_context = f"""
         Employee Information:
-        - Name: {employee.name}
         - Department: {employee.department}
         - Role: {employee.role}
-        - Employee ID: {employee.employee_id}
         """
         
         prompt = f"""
@@ -497,6 +794,16 @@ Return only the category name (e.g., "leave_balance", "manager_query", etc.):
         
         return prompt
     
+    def passage_relevance(self, passage: Dict, query_tokens) -> float:
+        """How well a retrieved passage matches the query, 0-1: the cosine similarity of its best
+        vector hit or the share of query tokens in its best sentence, whichever is higher.
+        Both searches read the same words, so their agreement is not counted as extra evidence."""
+        similarity = max((hit['sources']['vector']['score'] for hit in passage['retrieval']
+                          if 'vector' in hit['sources']), default=0.0)
+        best_sentence = max((highlight['score'] for highlight in passage.get('highlights', [])), default=0)
+        coverage = best_sentence / len(query_tokens) if query_tokens else 0.0
+        return min(max(similarity, coverage, 0.0), 1.0)
+    
     def calculate_confidence_score(self, query: str, relevant_docs: List[Dict], response: str) -> float:
         """Calculate confidence score for the response"""
         # Simple confidence calculation based on:
@@ -508,8 +815,13 @@ Return only the category name (e.g., "leave_balance", "manager_query", etc.):
             return 0.3
         
         doc_score = min(len(relevant_docs) / 3.0, 1.0)  # Max score if 3+ docs found
-        avg_relevance = sum(doc['score'] for doc in relevant_docs) / len(relevant_docs)
-        relevance_score = min(avg_relevance / 5.0, 1.0)  # Normalize to 0-1
+        if 'retrieval' in relevant_docs[0]:
+            # Fused scores are ranks: the top hit of an unrelated query scores as high as a perfect match
+            query_tokens = set(self.document_processor.normalize_tokens(query))
+            relevance_score = sum(self.passage_relevance(doc, query_tokens) for doc in relevant_docs) / len(relevant_docs)
+        else:
+            avg_relevance = sum(doc['score'] for doc in relevant_docs) / len(relevant_docs)
+            relevance_score = min(avg_relevance / 5.0, 1.0)  # Normalize to 0-1
         
         response_score = min(len(response) / 300.0, 1.0)  # Normalize response length
         
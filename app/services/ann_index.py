@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from .vector_store import CHUNK, DOCUMENT, REMOVED, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Inverted lists scanned per query: higher means better recall and slower queries
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+# Number of k-means lists (0 picks about sqrt(rows) at training time)
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+
+# Below this many rows an exact scan is fast enough and the index is not used
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "5000"))
+
+# Retrain once the store has grown by this fraction since the last training
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "0.5"))
+
+# Rows sampled to fit the centroids
+ANN_TRAIN_SAMPLE = 50000
+
+# Rows assigned to lists per matrix product, bounding temporary memory
+ASSIGN_BLOCK_ROWS = 16384
+
+# Snapshot files of the lists (ivf-<generation>.idx): magic, header length, JSON header, arrays.
+# Files written with another format version are ignored and rebuilt.
+IVF_SNAPSHOT_MAGIC = b"HRIVFIDX"
+IVF_SNAPSHOT_FORMAT = 1
+
+
+class IVFIndex:
+    """Inverted-file index over a VectorStore for approximate nearest-neighbour search.
+
+    Spherical k-means splits the stored vectors into lists around unit centroids; a query
+    scores the centroids and then only the rows of its nprobe closest lists. The lists cover
+    the immutable snapshot rows of the store's current generation, and rows appended to the
+    delta since are always scanned as well. Each generation gets its own list assignment,
+    built into a new state that searches switch to in one reference assignment, so a search
+    never sees a half-built index; the centroids are refitted once the snapshot has grown enough.
+    Built lists are saved next to the store and memory-mapped by workers that start later,
+    which then skip training and assignment unless the file does not match the store.
+    Searches never build or load lists: they use the current state, fall back to an exact scan
+    when it does not cover the store's generation, and call on_stale so that the index
+    manager's background thread refreshes it.
+    """
+
+    def __init__(self, store: VectorStore, nprobe: int = ANN_NPROBE, nlist: int = ANN_NLIST,
+                 min_rows: int = ANN_MIN_ROWS):
+        self.store = store
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.min_rows = min_rows
+        self._build_lock = threading.Lock()
+
+        # Called without blocking when a search finds the lists behind the store's generation
+        self.on_stale: Optional[Callable[[], None]] = None
+
+        # generation, centroids, trained_rows and the snapshot rows ordered by list, with list i
+        # spanning order[offsets[i]:offsets[i + 1]]; replaced as a whole, never modified
+        self._state: Optional[Dict] = None
+
+        self.trainings = 0
+        self.last_training_seconds = None
+        self.snapshot_loads = 0
+        self.last_load_ms = None
+        self.searches = 0
+        self.exact_searches = 0
+
+    def train(self, vectors: np.ndarray, sidecar: np.ndarray) -> np.ndarray:
+        """Fit unit centroids on a sample of the live rows"""
+        started = time.monotonic()
+        live = np.flatnonzero(sidecar[:, CHUNK] != REMOVED)
+        if len(live) > ANN_TRAIN_SAMPLE:
+            live = np.sort(np.random.default_rng(0).choice(live, ANN_TRAIN_SAMPLE, replace=False))
+        sample = np.asarray(vectors[live])
+        nlist = self.nlist or int(np.sqrt(len(sidecar)))
+        nlist = max(1, min(nlist, len(sample)))
+
+        kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=4096, n_init=1, random_state=0).fit(sample)
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        np.divide(centroids, norms, out=centroids, where=norms > 0)
+
+        self.trainings += 1
+        self.last_training_seconds = round(time.monotonic() - started, 3)
+        return centroids
+
+    def assign(self, centroids: np.ndarray, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows ordered by their closest centroid and the offsets of each list in that order"""
+        labels = [np.zeros(0, dtype=np.int32)]
+        for block_start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+            block = vectors[block_start:block_start + ASSIGN_BLOCK_ROWS]
+            labels.append(np.argmax(block @ centroids.T, axis=1).astype(np.int32))
+        labels = np.concatenate(labels)
+        order = np.argsort(labels, kind="stable")
+        return order, np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+
+    def refresh(self, retrain: bool = True) -> bool:
+        """Load or build the lists for the store's current generation; True when they can serve
+        searches. Runs at startup and on the index manager's thread, never on the search path.
+
+        Centroids are only fitted when retrain is set.
+        """
+        generation, base_rows, vectors, sidecar = self.store.snapshot()
+        if self.is_current(self._state, generation, base_rows, retrain):
+            return True
+        if base_rows < self.min_rows:
+            return False
+        with self._build_lock:
+            if self.is_current(self._state, generation, base_rows, retrain):
+                return True
+            loaded = self.load(generation, base_rows, sidecar)
+            if self.is_current(loaded, generation, base_rows, retrain):
+                self._state = loaded
+                return True
+            state = self.build(generation, base_rows, vectors, sidecar, retrain)
+            if state is None:
+                return False
+            self._state = state
+            self.save(state, sidecar)
+            return True
+
+    def build(self, generation: int, base_rows: int, vectors: np.ndarray, sidecar: np.ndarray,
+              retrain: bool) -> Optional[Dict]:
+        """Lists for a generation's snapshot rows, reusing the current centroids unless they need
+        (re)training; None when they would need training and retrain is not set"""
+        state = self._state
+        model = self.store.model_id()
+        # Centroids of another embedding model's vectors lie in an unrelated space
+        reusable = state is not None and state["model"] == model
+        centroids, trained_rows = (state["centroids"], state["trained_rows"]) if reusable else (None, 0)
+        if centroids is None or (retrain and self.has_grown(trained_rows, base_rows)):
+            if not retrain:
+                return None
+            centroids, trained_rows = self.train(vectors[:base_rows], sidecar[:base_rows]), base_rows
+        order, offsets = self.assign(centroids, vectors[:base_rows])
+        return {
+            "generation": generation,
+            "model": model,
+            "centroids": centroids,
+            "trained_rows": trained_rows,
+            "order": order,
+            "offsets": offsets
+        }
+
+    def prepare_generation(self, generation: int, base_rows: int, vectors: np.ndarray, sidecar: np.ndarray):
+        """Build and save the lists of a generation before the store switches to it (see
+        VectorStore.compact), so every worker can load them as soon as it is published"""
+        if base_rows < self.min_rows:
+            return
+        with self._build_lock:
+            self.save(self.build(generation, base_rows, vectors, sidecar, retrain=True), sidecar)
+
+    def snapshot_path(self, generation: int) -> str:
+        return os.path.join(self.store.directory, f"ivf-{generation}.idx")
+
+    def snapshot_header(self, generation: int, base_rows: int, sidecar: np.ndarray) -> Dict:
+        """Header fields a snapshot file must match to be used for the store's current rows"""
+        documents = np.ascontiguousarray(sidecar[:base_rows, DOCUMENT], dtype="<i8")
+        return {
+            "format": IVF_SNAPSHOT_FORMAT,
+            "generation": generation,
+            "base_rows": base_rows,
+            "dimensions": self.store.dimensions,
+            "model": self.store.model_id(),
+            "documents_crc32": zlib.crc32(documents.tobytes())
+        }
+
+    def save(self, state: Dict, sidecar: np.ndarray):
+        """Write the lists to ivf-<generation>.idx, replacing the file atomically, and drop the
+        files of older generations"""
+        generation = state["generation"]
+        arrays = [
+            np.ascontiguousarray(state["centroids"], dtype="<f4"),
+            np.ascontiguousarray(state["order"], dtype="<i8"),
+            np.ascontiguousarray(state["offsets"], dtype="<i8")
+        ]
+        payload = b"".join(array.tobytes() for array in arrays)
+        header = dict(self.snapshot_header(generation, len(state["order"]), sidecar),
+                      nlist=len(state["centroids"]), trained_rows=state["trained_rows"], crc32=zlib.crc32(payload))
+        header = json.dumps(header).encode("utf-8")
+        # Pad so the arrays start 64-byte aligned in the mapped file
+        header += b" " * (-(len(IVF_SNAPSHOT_MAGIC) + 4 + len(header)) % 64)
+
+        path = self.snapshot_path(generation)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(IVF_SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for name in os.listdir(self.store.directory):
+            match = re.fullmatch(r"ivf-(\d+)\.idx", name)
+            if match and int(match.group(1)) < generation:
+                try:
+                    os.remove(os.path.join(self.store.directory, name))
+                except OSError:
+                    pass
+
+    def load(self, generation: int, base_rows: int, sidecar: np.ndarray) -> Optional[Dict]:
+        """Memory-map the saved lists of a generation; None when there is no file or it is
+        stale, corrupt or written by another format version"""
+        started = time.monotonic()
+        path = self.snapshot_path(generation)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+            prefix = len(IVF_SNAPSHOT_MAGIC) + 4
+            if bytes(data[:len(IVF_SNAPSHOT_MAGIC)]) != IVF_SNAPSHOT_MAGIC:
+                raise ValueError("not an IVF snapshot")
+            (header_length,) = struct.unpack("<I", bytes(data[len(IVF_SNAPSHOT_MAGIC):prefix]))
+            header = json.loads(bytes(data[prefix:prefix + header_length]))
+            expected = self.snapshot_header(generation, base_rows, sidecar)
+            stale = [field for field, value in expected.items() if header.get(field) != value]
+            if stale:
+                logger.warning(f"IVF snapshot {path} does not match the store ({', '.join(stale)}), rebuilding")
+                return None
+
+            payload = data[prefix + header_length:]
+            if zlib.crc32(payload) != header["crc32"]:
+                logger.warning(f"IVF snapshot {path} failed its checksum, rebuilding")
+                return None
+            nlist, dimensions = header["nlist"], self.store.dimensions
+            centroid_bytes, order_bytes = 4 * nlist * dimensions, 8 * base_rows
+            if len(payload) != centroid_bytes + order_bytes + 8 * (nlist + 1):
+                raise ValueError("unexpected size")
+            state = {
+                "generation": generation,
+                "model": header["model"],
+                "centroids": payload[:centroid_bytes].view("<f4").reshape(nlist, dimensions),
+                "trained_rows": header["trained_rows"],
+                "order": payload[centroid_bytes:centroid_bytes + order_bytes].view("<i8"),
+                "offsets": payload[centroid_bytes + order_bytes:].view("<i8")
+            }
+        except (ValueError, KeyError, struct.error) as e:
+            logger.warning(f"IVF snapshot {path} is unreadable ({e}), rebuilding")
+            return None
+
+        self.snapshot_loads += 1
+        self.last_load_ms = round((time.monotonic() - started) * 1000, 2)
+        logger.debug(f"Loaded IVF lists of generation {generation} from {path} in {self.last_load_ms} ms")
+        return state
+
+    def has_grown(self, trained_rows: int, base_rows: int) -> bool:
+        return base_rows - trained_rows > ANN_RETRAIN_GROWTH * trained_rows
+
+    def is_current(self, state: Optional[Dict], generation: int, base_rows: int, retrain: bool) -> bool:
+        """Whether state serves this generation and, when retraining, its centroids are not outgrown"""
+        return (state is not None and state["generation"] == generation
+                and not (retrain and self.has_grown(state["trained_rows"], base_rows)))
+
+    def candidate_rows(self, state: Dict, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        centroids, order, offsets = state["centroids"], state["order"], state["offsets"]
+        nprobe = min(nprobe, len(centroids))
+        probed = np.argpartition(-(centroids @ query_vector), nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[offsets[i]:offsets[i + 1]] for i in probed])
+        # Ascending rows read the mapped matrix front to back
+        return np.sort(rows)
+
+    def search(self, query_vector: np.ndarray, access, limit: int,
+               min_score: float = -1.0, nprobe: int = None) -> List[Dict]:
+        """Approximate VectorStore.search; small stores, and stores whose lists for the current
+        generation are not loaded or built yet, are scanned exactly"""
+        nprobe = nprobe or self.nprobe
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        self.searches += 1
+        snapshot = self.store.snapshot()
+        generation, base_rows, vectors, _ = snapshot
+        state = self._state
+        current = state is not None and state["generation"] == generation
+        if not current and base_rows >= self.min_rows and self.on_stale is not None:
+            self.on_stale()
+        if not current or nprobe >= len(state["centroids"]):
+            self.exact_searches += 1
+            return self.store.search(query_vector, access, limit, min_score, snapshot=snapshot)
+        candidates = np.concatenate([
+            self.candidate_rows(state, query_vector, nprobe), np.arange(base_rows, len(vectors))
+        ])
+        return self.store.search(query_vector, access, limit, min_score, candidate_rows=candidates, snapshot=snapshot)
+
+    def get_stats(self) -> Dict:
+        state = self._state
+        sizes = np.diff(state["offsets"]) if state is not None else np.zeros(0)
+        return {
+            "nlist": 0 if state is None else len(state["centroids"]),
+            "nprobe": self.nprobe,
+            "min_rows": self.min_rows,
+            "generation": None if state is None else state["generation"],
+            "indexed_rows": int(sizes.sum()),
+            "trained_rows": 0 if state is None else state["trained_rows"],
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+            "trainings": self.trainings,
+            "last_training_seconds": self.last_training_seconds,
+            "snapshot_loads": self.snapshot_loads,
+            "last_load_ms": self.last_load_ms,
+            "searches": self.searches,
+            "exact_searches": self.exact_searches
+        }
@@ -194,11 +194,16 @@ class AuthService:
     @staticmethod
     def get_accessible_documents(db: Session, employee: Employee) -> List[Document]:
         """Get all documents accessible to the employee"""
+        return AuthService.accessible_documents_query(db, employee).all()
+    
+    @staticmethod
+    def accessible_documents_query(db: Session, employee: Employee):
+        """Query of the active documents accessible to the employee"""
         query = db.query(Document).filter(Document.is_active == True)
         
         if employee.user_role == UserRole.HR_ADMIN:
             # Admin can see everything
-            return query.all()
+            return query
         elif employee.user_role == UserRole.HR_MANAGER:
             # HR Manager can see public, HR only, and department docs
             return query.filter(
@@ -207,14 +212,14 @@ class AuthService:
                     DocumentVisibility.HR_ONLY,
                     DocumentVisibility.DEPARTMENT
                 ])
-            ).all()
+            )
         else:
             # Regular employees see public and their department docs
             return query.filter(
                 (Document.visibility == DocumentVisibility.PUBLIC) |
                 ((Document.visibility == DocumentVisibility.DEPARTMENT) & 
                  (Document.department == employee.department))
-            ).all()
+            )
 
 def require_permission(permission: str):
     """Decorator to require specific permission"""
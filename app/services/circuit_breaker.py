@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker guarding calls to an external provider"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._half_open_in_flight = 0
+        self._opened_at: Optional[float] = None
+
+        # Counters exposed for monitoring
+        self.trip_count = 0
+        self.rejected_calls = 0
+        self.total_successes = 0
+        self.total_failures = 0
+        self.last_failure_time: Optional[float] = None
+        self.last_state_change: float = time.time()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        """Move from open to half-open once the recovery timeout has passed (lock held)"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._set_state(self.HALF_OPEN)
+            self._half_open_in_flight = 0
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logger.warning(f"Circuit breaker '{self.name}': {self._state} → {state}")
+            self._state = state
+            self.last_state_change = time.time()
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to the provider; open circuits reject immediately"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                # Let a limited number of probe calls through
+                self._half_open_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(self._half_open_in_flight - 1, 0)
+                self._set_state(self.CLOSED)
+
+    def record_cancelled(self):
+        """Release a half-open probe slot for a call abandoned before it finished"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(self._half_open_in_flight - 1, 0)
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            self.last_failure_time = time.time()
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        """Open the circuit (lock held)"""
+        if self._state != self.OPEN:
+            self.trip_count += 1
+        self._set_state(self.OPEN)
+        self._opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._refresh_state()
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "trip_count": self.trip_count,
+                "rejected_calls": self.rejected_calls,
+                "total_successes": self.total_successes,
+                "total_failures": self.total_failures,
+                "last_failure_time": self.last_failure_time,
+                "last_state_change": self.last_state_change,
+                "retry_in_seconds": round(retry_in, 2) if retry_in is not None else None
+            }
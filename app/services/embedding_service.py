@@ -0,0 +1,231 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import Document, DocumentChunk
+from .access_filter import AccessFilter, document_access
+from .ann_index import IVFIndex
+from .lsa_model import LSAModel
+from .vector_store import VectorStore
+
+# Size of the dense chunk embeddings; changing it requires a full re-embed (backfill --all)
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+
+# Cosine similarity below which a chunk is not considered a match for the query
+EMBEDDING_MIN_SIMILARITY = float(os.getenv("EMBEDDING_MIN_SIMILARITY", "0.15"))
+
+# Directory of the memory-mapped chunk vector store
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "./vector_store")
+
+# Most chunks the LSA model is fitted on; larger corpora are sampled evenly
+LSA_FIT_MAX_CHUNKS = int(os.getenv("LSA_FIT_MAX_CHUNKS", "50000"))
+
+# Growth of the corpus since the model was fitted that makes startup fit a new one
+LSA_REFIT_GROWTH = float(os.getenv("LSA_REFIT_GROWTH", "1.0"))
+
+
+class EmbeddingService:
+    """Dense chunk embeddings computed locally with an LSA model (see LSAModel).
+
+    The model is fitted on the document chunks at startup when the vector store has none or the
+    corpus has outgrown it, and saved next to the store, which names the model its vectors come
+    from. Every process loads that model, so queries and chunks are embedded in the same space.
+    Vectors are L2-normalised, so similarity is a dot product. They are kept in a memory-mapped
+    VectorStore (opened at startup) and searched through an IVF index once the store is large;
+    IndexManager keeps both up to date.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, store_directory: str = VECTOR_STORE_DIR):
+        self.dimensions = dimensions
+        self.vector_store = VectorStore(store_directory, dimensions)
+        self.ann_index = IVFIndex(self.vector_store)
+        self.model: Optional[LSAModel] = None
+
+    def current_model(self) -> Optional[LSAModel]:
+        """The model of the store's vectors, reloaded when another process fitted a new one"""
+        model_id = self.vector_store.model_id()
+        if model_id is None:
+            return None
+        if self.model is None or self.model.model_id != model_id:
+            self.model = LSAModel.load(self.vector_store.directory, model_id)
+        return self.model
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimensions) float32 matrix of unit rows (all-zero rows for texts
+        without words the model knows, and while no model is fitted)"""
+        model = self.current_model()
+        if model is None or not texts:
+            return np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        return model.transform(texts)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_texts([query])[0]
+
+    def fit_model(self, db: Session, force: bool = False) -> bool:
+        """Fit a model on the active chunks when the store has none, it cannot be loaded, the
+        corpus has grown by LSA_REFIT_GROWTH since the fit, or force is set; switching models
+        empties the store. True when the store was emptied."""
+        chunks = db.query(DocumentChunk.id).join(
+            Document, Document.id == DocumentChunk.document_id
+        ).filter(Document.is_active == True)
+        count = chunks.count()
+        model = self.current_model()
+        if not force and model is not None and count <= (1 + LSA_REFIT_GROWTH) * model.documents:
+            return False
+
+        # Sample evenly by id so a large corpus is fitted in bounded memory
+        step = max(1, -(-count // LSA_FIT_MAX_CHUNKS))
+        sample_ids = [chunk_id for (chunk_id,) in chunks.order_by(DocumentChunk.id)][::step]
+        texts = []
+        for start in range(0, len(sample_ids), 1000):
+            texts += [text or "" for (text,) in db.query(DocumentChunk.chunk_text).filter(
+                DocumentChunk.id.in_(sample_ids[start:start + 1000])
+            )]
+        fitted = LSAModel.fit(texts, self.dimensions)
+        if fitted is None:
+            return False
+        fitted.save(self.vector_store.directory)
+        self.model = fitted
+        return self.vector_store.set_model(fitted.model_id)
+
+    def embed_chunks(self, chunks: List[DocumentChunk]) -> Optional[Tuple[str, np.ndarray]]:
+        """Id of the current model and the vectors it gives saved chunks; None while no model
+        is fitted (the next startup fits one and embeds them)"""
+        model = self.current_model()
+        if not chunks or model is None:
+            return None
+        return model.model_id, model.transform([chunk.chunk_text or "" for chunk in chunks])
+
+    def add_vectors(self, document: Document, chunk_ids: List[int], vectors: np.ndarray, model_id: str) -> int:
+        """Append vectors from embed_chunks for a document's committed chunks; skipped when the
+        store has switched models since (the next startup embeds those chunks again)"""
+        if not chunk_ids or self.vector_store.model_id() != model_id:
+            return 0
+        access = document_access(document.visibility, document.department)
+        # Lands in the store's delta segment, which searches scan until the next merge
+        self.vector_store.append(chunk_ids, [document.id] * len(chunk_ids), [access] * len(chunk_ids), vectors)
+        return len(chunk_ids)
+
+    def remove_document(self, document_id: int) -> int:
+        return self.vector_store.remove_document(document_id)
+
+    def search_chunks(self, query: str, access: AccessFilter, limit: int) -> List[Dict]:
+        """Most similar chunks the caller may read as dicts with chunk_id, document_id and
+        score (cosine similarity); reads only the memory-mapped store"""
+        return self.ann_index.search(self.embed_query(query), access, limit, EMBEDDING_MIN_SIMILARITY)
+
+    def sync(self, db: Session) -> Dict:
+        """Fit the model if needed, store vectors for chunks of active documents that have none
+        and drop all others"""
+        refitted = self.fit_model(db)
+        stored_ids = self.vector_store.chunk_ids()
+        active_ids = {chunk_id for (chunk_id,) in db.query(DocumentChunk.id).join(
+            Document, Document.id == DocumentChunk.document_id
+        ).filter(Document.is_active == True)}
+
+        # A warm store only needs the id comparison; chunk details are read for missing ids only
+        missing = db.query(
+            DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_text,
+            Document.visibility, Document.department
+        ).join(Document, Document.id == DocumentChunk.document_id).filter(
+            DocumentChunk.id.in_(active_ids - stored_ids)
+        ).all() if self.model is not None and active_ids - stored_ids else []
+
+        if missing:
+            vectors = self.embed_texts([text or "" for _, _, text, _, _ in missing])
+            self.vector_store.append(
+                [row[0] for row in missing], [row[1] for row in missing],
+                [document_access(row[3], row[4]) for row in missing], vectors
+            )
+
+        removed = self.vector_store.remove_chunks(stored_ids - active_ids)
+        self.ann_index.refresh()
+        return {"refitted": refitted, "embedded": len(missing), "removed": removed}
+
+    def get_stats(self) -> Dict:
+        model = self.current_model()
+        return dict(self.vector_store.get_stats(), ann_index=self.ann_index.get_stats(), model=None if model is None else {
+            "id": model.model_id, "terms": len(model.terms), "components": model.term_vectors.shape[1],
+            "fitted_chunks": model.documents
+        })
+
+
+# Backfill workers build their own service once; batches then only carry chunk texts
+_worker_service: Optional[EmbeddingService] = None
+
+
+def _init_backfill_worker(dimensions: int, store_directory: str):
+    global _worker_service
+    _worker_service = EmbeddingService(dimensions, store_directory)
+
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    return _worker_service.embed_texts(texts)
+
+
+def backfill_embeddings(session_factory, store: VectorStore, batch_size: int = 256, workers: int = None,
+                        reembed: bool = False, refit: bool = False,
+                        progress: Callable[[int, int, float], None] = None) -> Dict:
+    """Embed chunks of active documents in batches on a process pool.
+
+    The LSA model is fitted first when needed (see EmbeddingService.fit_model), or always with
+    refit; a new model empties the store, so everything is embedded again. Otherwise only
+    chunks missing from the vector store are embedded unless reembed is set. Each batch is
+    appended to the store as soon as it is done, so an interrupted backfill resumes where it
+    stopped. progress(done, total, elapsed_seconds) is called after every batch.
+    """
+    started = time.monotonic()
+    db = session_factory()
+    try:
+        service = EmbeddingService(store.dimensions, store.directory)
+        refitted = service.fit_model(db, force=refit)
+        if service.current_model() is None:
+            # Fewer than three chunks with words: nothing to fit a model on yet
+            return {"embedded": 0, "batches": 0, "refitted": False, "seconds": round(time.monotonic() - started, 2)}
+        stored_ids = set() if reembed else store.chunk_ids()
+        active_chunks = db.query(DocumentChunk.id).join(
+            Document, Document.id == DocumentChunk.document_id
+        ).filter(Document.is_active == True).order_by(DocumentChunk.id)
+        chunk_ids = [chunk_id for (chunk_id,) in active_chunks if chunk_id not in stored_ids]
+        batches = [chunk_ids[i:i + batch_size] for i in range(0, len(chunk_ids), batch_size)]
+
+        def load_batch(batch: List[int]):
+            rows = db.query(
+                DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_text,
+                Document.visibility, Document.department
+            ).join(Document, Document.id == DocumentChunk.document_id).filter(
+                DocumentChunk.id.in_(batch)
+            ).order_by(DocumentChunk.id).all()
+            access = [document_access(row[3], row[4]) for row in rows]
+            return [row[0] for row in rows], [row[1] for row in rows], access, [row[2] or "" for row in rows]
+
+        done = 0
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker,
+                                 initargs=(store.dimensions, store.directory)) as pool:
+            def submit(batch: List[int]):
+                batch_ids, batch_document_ids, access, texts = load_batch(batch)
+                return batch_ids, batch_document_ids, access, pool.submit(_embed_batch, texts)
+
+            # Keep a bounded number of batches in flight so memory does not grow with the corpus
+            pending = iter(batches)
+            in_flight = [submit(batch) for _, batch in zip(range(workers * 2), pending)]
+            while in_flight:
+                batch_ids, batch_document_ids, access, future = in_flight.pop(0)
+                store.append(batch_ids, batch_document_ids, access, future.result())
+                done += len(batch_ids)
+                if progress:
+                    progress(done, len(chunk_ids), time.monotonic() - started)
+
+                next_batch = next(pending, None)
+                if next_batch is not None:
+                    in_flight.append(submit(next_batch))
+
+        return {"embedded": done, "batches": len(batches), "refitted": refitted,
+                "seconds": round(time.monotonic() - started, 2)}
+    finally:
+        db.close()
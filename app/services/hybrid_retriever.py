@@ -0,0 +1,129 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import Document, DocumentChunk
+from .access_filter import AccessFilter, document_access
+from .embedding_service import EmbeddingService
+from .search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Reciprocal rank fusion constant: larger values flatten the gap between top and lower ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Candidates each search contributes per requested chunk before fusion
+CANDIDATES_PER_RESULT = 4
+
+SOURCES = ("lexical", "vector")
+
+
+class HybridRetriever:
+    """Chunk retrieval that fuses a lexical and a vector ranking.
+
+    The lexical side (FTS5 BM25, or keyword counts when FTS5 is unavailable) finds exact
+    policy terms. The vector side compares LSA embeddings (see LSAModel), so it also finds
+    chunks that use other words of the same topic in the corpus, e.g. "sick leave allowance"
+    for a question about sick days; it knows only words seen when the model was fitted.
+    The vector search never touches the ORM, so it runs on a worker thread while the lexical
+    query uses the request's session. Rankings are combined with reciprocal rank fusion:
+    score = sum of 1 / (RRF_K + rank). Fused scores only order the hits; they say nothing
+    about how well the best hit matches.
+    """
+
+    def __init__(self, search_index: SearchIndex, embedding_service: EmbeddingService):
+        self.search_index = search_index
+        self.embedding_service = embedding_service
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+
+    def search(self, db: Session, query: str, access: AccessFilter, limit: int) -> List[Dict]:
+        """Top chunks the caller may read as dicts with chunk_id, document_id, score (fused) and
+        sources, which maps each source that returned the chunk to its rank and raw score"""
+        if limit <= 0:
+            return []
+        candidates = limit * CANDIDATES_PER_RESULT
+
+        vector_future = self.executor.submit(self.embedding_service.search_chunks, query, access, candidates)
+        try:
+            if self.search_index.available:
+                lexical_hits = self.search_index.search_chunks(db, query, access, candidates)
+            else:
+                lexical_hits = self.keyword_search_chunks(db, query, access, candidates)
+        finally:
+            try:
+                vector_hits = vector_future.result()
+            except Exception as e:
+                logger.warning(f"Vector search failed, using lexical results only: {e}")
+                vector_hits = []
+
+        return self.fuse({"lexical": lexical_hits, "vector": vector_hits}, limit)
+
+    def fuse(self, rankings: Dict[str, List[Dict]], limit: int) -> List[Dict]:
+        """Reciprocal rank fusion of best-first hit lists"""
+        chunk_ids = list(dict.fromkeys(hit["chunk_id"] for hits in rankings.values() for hit in hits))
+        if not chunk_ids:
+            return []
+        row_of = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+
+        # ranks[s, i] is the 1-based rank of chunk i in source s, inf when s did not return it
+        ranks = np.full((len(SOURCES), len(chunk_ids)), np.inf)
+        raw_scores = np.full((len(SOURCES), len(chunk_ids)), np.nan)
+        document_of = {}
+        for s, source in enumerate(SOURCES):
+            for rank, hit in enumerate(rankings.get(source, []), start=1):
+                row = row_of[hit["chunk_id"]]
+                ranks[s, row] = rank
+                raw_scores[s, row] = hit["score"]
+                document_of[hit["chunk_id"]] = hit["document_id"]
+
+        fused = (1.0 / (RRF_K + ranks)).sum(axis=0)
+        top = np.argsort(-fused, kind="stable")[:limit]
+        return [
+            {
+                "chunk_id": chunk_ids[row],
+                "document_id": document_of[chunk_ids[row]],
+                "score": float(fused[row]),
+                "sources": {
+                    source: {"rank": int(ranks[s, row]), "score": round(float(raw_scores[s, row]), 4)}
+                    for s, source in enumerate(SOURCES)
+                    if np.isfinite(ranks[s, row])
+                }
+            }
+            for row in top
+        ]
+
+    def keyword_search_chunks(self, db: Session, query: str, access: AccessFilter, limit: int) -> List[Dict]:
+        """Chunks ranked by query word counts plus a title boost (lexical side without FTS5)"""
+        query_words = [word for word in query.lower().split() if len(word) > 2]
+        if not query_words:
+            return []
+
+        documents = db.query(Document.id, Document.title, Document.visibility, Document.department).filter(
+            Document.is_active == True
+        ).all()
+        codes = np.array([document_access(visibility, department) for _, _, visibility, department in documents],
+                         dtype=np.int64).reshape(-1, 2)
+        allowed = access.mask(codes[:, 0], codes[:, 1])
+        titles = {document[0]: document[1] for document, ok in zip(documents, allowed) if ok}
+        if not titles:
+            return []
+        rows = db.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_text).filter(
+            DocumentChunk.document_id.in_(titles)
+        )
+
+        hits = []
+        for chunk_id, document_id, chunk_text in rows:
+            text_lower = (chunk_text or "").lower()
+            title_lower = titles[document_id].lower()
+            score = sum(text_lower.count(word) for word in query_words)
+            if score == 0:
+                continue
+            score += 3 * sum(1 for word in query_words if word in title_lower)
+            hits.append({"chunk_id": chunk_id, "document_id": document_id, "score": score})
+
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:limit]
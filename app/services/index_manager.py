@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from sqlalchemy.orm import Session
+
+from ..models import Document, DocumentChunk
+from .embedding_service import EmbeddingService
+from .search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background checks whether the vector store needs a merge
+INDEX_MERGE_INTERVAL_SECONDS = float(os.getenv("INDEX_MERGE_INTERVAL_SECONDS", "30"))
+
+# Delta rows (scanned exactly by every vector search) that trigger a merge into a new snapshot
+INDEX_MERGE_DELTA_ROWS = int(os.getenv("INDEX_MERGE_DELTA_ROWS", "2000"))
+
+
+class IndexManager:
+    """Applies document uploads and deactivations to the retrieval indexes without a rebuild.
+
+    Full-text rows change inside the caller's transaction. After the commit, vectors of new
+    chunks are appended to the vector store's delta segment and a deactivated document's rows
+    are tombstoned; the next search sees both. A background thread merges the delta and drops
+    tombstoned rows by writing a new immutable snapshot generation and its ANN lists, which
+    readers switch to when meta.json is replaced. Searches, uploads and deactivations keep
+    using the previous generation meanwhile; only the final switch waits for the store's
+    write lock. Every content change bumps the shared index version.
+    """
+
+    def __init__(self, search_index: SearchIndex, embedding_service: EmbeddingService,
+                 merge_interval: float = INDEX_MERGE_INTERVAL_SECONDS, merge_delta_rows: int = INDEX_MERGE_DELTA_ROWS):
+        self.search_index = search_index
+        self.embedding_service = embedding_service
+        self.merge_interval = merge_interval
+        self.merge_delta_rows = merge_delta_rows
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Searches that find the ANN lists outdated wake the thread instead of building them
+        self.embedding_service.ann_index.on_stale = self._wake.set
+
+        self.merges = 0
+        self.last_merge_seconds = None
+        self.last_merge_error = None
+
+    @property
+    def version(self) -> int:
+        """Index version shared by all workers; answer caches key on it"""
+        return self.embedding_service.vector_store.version()
+
+    def add_document(self, db: Session, document: Document):
+        """Index a new document's saved chunks for full-text search in the caller's transaction"""
+        self.search_index.index_document(db, document)
+
+    def embed_chunks(self, chunks: List[DocumentChunk]) -> Optional[Tuple[str, np.ndarray]]:
+        """Vectors of saved chunks for document_added, with the id of their model; None when
+        they cannot be embedded now (the next startup embeds them)"""
+        try:
+            return self.embedding_service.embed_chunks(chunks)
+        except Exception as e:
+            logger.warning(f"Could not embed {len(chunks)} chunks, they are embedded at the next startup: {e}")
+            return None
+
+    def document_added(self, document: Document, vector_batches: Iterable[Tuple[str, List[int], np.ndarray]]):
+        """Append the committed chunks' vectors, as (model id, chunk ids, vectors) batches from
+        embed_chunks, to the delta segment"""
+        appended = 0
+        try:
+            for model_id, chunk_ids, vectors in vector_batches:
+                appended += self.embedding_service.add_vectors(document, chunk_ids, vectors, model_id)
+        except Exception as e:
+            logger.warning(f"Could not store the vectors of document {document.id}, it is embedded at the next startup: {e}")
+        if not appended:
+            # The full-text index still changed
+            self.embedding_service.vector_store.bump_version()
+        self._wake.set()
+
+    def remove_document(self, db: Session, document_id: int):
+        """Drop a document from full-text search in the caller's transaction"""
+        self.search_index.remove_document(db, document_id)
+
+    def document_removed(self, document_id: int):
+        """Tombstone the vectors of a committed deactivation"""
+        if not self.embedding_service.remove_document(document_id):
+            self.embedding_service.vector_store.bump_version()
+        self._wake.set()
+
+    def needs_merge(self) -> bool:
+        stats = self.embedding_service.vector_store.get_stats()
+        return stats["delta_rows"] >= self.merge_delta_rows or self.embedding_service.vector_store.needs_compaction()
+
+    def merge(self) -> Optional[Dict]:
+        """Merge delta and tombstones into a new snapshot generation and build its ANN lists"""
+        started = time.monotonic()
+        store = self.embedding_service.vector_store
+        ann_index = self.embedding_service.ann_index
+        result = store.compact(generation=store.snapshot()[0], prepare=ann_index.prepare_generation)
+        if result is None:
+            # Another worker merged first
+            return None
+        ann_index.refresh()
+        self.merges += 1
+        self.last_merge_seconds = round(time.monotonic() - started, 3)
+        logger.debug(f"Merged vector store into generation {result['generation']}: "
+              f"{result['rows_before']} -> {result['rows_after']} rows in {self.last_merge_seconds}s")
+        return result
+
+    def start(self):
+        """Run merges on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name="index-merge", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.merge_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                if self.needs_merge():
+                    self.merge()
+                else:
+                    # Load or build the lists of generations merged by other workers; searches
+                    # scan exactly until they are ready
+                    self.embedding_service.ann_index.refresh()
+                self.last_merge_error = None
+            except Exception as e:
+                self.last_merge_error = str(e)
+                logger.warning(f"Index merge failed: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "merge_interval_seconds": self.merge_interval,
+            "merge_delta_rows": self.merge_delta_rows,
+            "merges": self.merges,
+            "last_merge_seconds": self.last_merge_seconds,
+            "last_merge_error": self.last_merge_error,
+            "running": self._thread is not None and self._thread.is_alive()
+        }
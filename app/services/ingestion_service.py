@@ -0,0 +1,421 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, defer
+
+from ..models import Document, DocumentChunk, Employee, IngestionJob, IngestionStatus, DocumentVisibility
+
+logger = logging.getLogger(__name__)
+
+# Attempts per job before it is marked failed
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+
+# Seconds before the first retry of a failed attempt, doubled for every further retry
+INGESTION_RETRY_DELAY_SECONDS = float(os.getenv("INGESTION_RETRY_DELAY_SECONDS", "5"))
+
+# Seconds between checks of the job table when no upload signalled the worker
+INGESTION_POLL_SECONDS = float(os.getenv("INGESTION_POLL_SECONDS", "2"))
+
+# A processing job without a heartbeat for this long belonged to a worker that died; it is
+# queued again, or marked failed once it has used all its attempts
+INGESTION_STALE_SECONDS = float(os.getenv("INGESTION_STALE_SECONDS", "300"))
+
+# Seconds between heartbeats of the job being processed
+INGESTION_HEARTBEAT_SECONDS = float(os.getenv("INGESTION_HEARTBEAT_SECONDS", "30"))
+
+# Chunks saved, embedded and committed together while a file is streamed in
+INGESTION_BATCH_CHUNKS = int(os.getenv("INGESTION_BATCH_CHUNKS", "256"))
+
+PROCESSING_STATUSES = (IngestionStatus.EXTRACTING, IngestionStatus.CHUNKING, IngestionStatus.INDEXING)
+
+
+class IngestionError(Exception):
+    """A job failure that retrying cannot fix, such as a file without extractable text"""
+
+
+class IngestionService:
+    """Turns uploaded files into searchable documents on a background thread.
+
+    Uploads are spooled to disk and recorded as IngestionJob rows, so queued work survives
+    restarts. Each worker process runs one thread that claims queued jobs with a
+    conditional UPDATE (only one process wins a job), then streams the file's text through
+    the chunker into an inactive document, a batch of chunks at a time, and activates it with
+    its content and full-text rows in one final transaction. Failed
+    attempts are retried with exponential backoff, and each stage's duration is recorded.
+    A running job sends heartbeats; one whose worker went silent is queued again.
+    """
+
+    def __init__(self, ai_service, doc_processor):
+        self.ai_service = ai_service
+        self.doc_processor = doc_processor
+        self.session_factory = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.retries = 0
+
+    def attach(self, session_factory):
+        """Start processing jobs with sessions made by the factory"""
+        self.session_factory = session_factory
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name="ingestion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def enqueue(self, db: Session, spooled: Dict, filename: str, title: str, document_type: str,
+                department: Optional[str], visibility: DocumentVisibility, employee: Employee) -> IngestionJob:
+        """Record a job for a spooled upload (flushed, committed by the caller)"""
+        job = IngestionJob(
+            status=IngestionStatus.QUEUED,
+            file_path=spooled["path"],
+            filename=filename,
+            file_size=spooled["size"],
+            file_sha256=spooled["sha256"],
+            title=title,
+            document_type=document_type,
+            department=department,
+            visibility=visibility,
+            uploaded_by=employee.id
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    def wake(self):
+        """Look for queued jobs now instead of at the next poll"""
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self.requeue_stale_jobs()
+                job_id = self.claim_next_job()
+                while job_id is not None and not self._stopping.is_set():
+                    self.process(job_id)
+                    job_id = self.claim_next_job()
+            except Exception as e:
+                logger.warning(f"Ingestion worker error: {e}")
+            self._wake.wait(INGESTION_POLL_SECONDS)
+            self._wake.clear()
+
+    def requeue_stale_jobs(self) -> int:
+        """Queue jobs whose worker stopped sending heartbeats again; jobs out of attempts fail"""
+        db = self.session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=INGESTION_STALE_SECONDS)
+            stale = db.query(IngestionJob).filter(
+                IngestionJob.status.in_(PROCESSING_STATUSES),
+                func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at) < cutoff
+            )
+            for job in stale.filter(IngestionJob.attempts >= INGESTION_MAX_ATTEMPTS).all():
+                logger.warning(f"Ingestion job {job.id} failed after {job.attempts} attempts: worker stopped")
+                job.error = "Worker stopped while processing the job"
+                self.finish(db, job, IngestionStatus.FAILED, json.loads(job.stage_timings or "{}"))
+                self.jobs_failed += 1
+            requeued = stale.update({IngestionJob.status: IngestionStatus.QUEUED}, synchronize_session=False)
+            db.commit()
+            if requeued:
+                logger.warning(f"Requeued {requeued} ingestion jobs left unfinished by a stopped worker")
+            return requeued
+        finally:
+            db.close()
+
+    def claim_next_job(self) -> Optional[int]:
+        """Move the oldest due job from queued to extracting; None when there is none"""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            candidates = db.query(IngestionJob.id).filter(
+                IngestionJob.status == IngestionStatus.QUEUED, IngestionJob.next_attempt_at <= now
+            ).order_by(IngestionJob.id).limit(5).all()
+            for (job_id,) in candidates:
+                claimed = db.query(IngestionJob).filter(
+                    IngestionJob.id == job_id, IngestionJob.status == IngestionStatus.QUEUED
+                ).update({
+                    IngestionJob.status: IngestionStatus.EXTRACTING,
+                    IngestionJob.started_at: now,
+                    IngestionJob.heartbeat_at: now,
+                    IngestionJob.attempts: IngestionJob.attempts + 1
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def process(self, job_id: int):
+        """Run the stages of a claimed job; failures are retried or mark the job failed"""
+        db = self.session_factory()
+        timings = {}
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            if job.document_id is not None:
+                if job.status == IngestionStatus.DONE:
+                    # The document was completed by an earlier attempt; never insert it twice
+                    self.finish(db, job, IngestionStatus.DONE, json.loads(job.stage_timings or "{}"))
+                    return
+                # The worker of an earlier attempt stopped while saving chunks
+                self.discard_document(db, job)
+            timings["queued"] = round((job.started_at - job.created_at).total_seconds(), 3)
+
+            # The document is saved inactive first, so its chunks can be committed in batches
+            # while pages are extracted, cleaned and chunked in one streamed pass. Only the
+            # current page and batch are held: the cleaned text goes to a temporary file and
+            # the batch's vectors to another until the document is complete. The job is
+            # extracting until the first page is read and chunking for the rest of the pass
+            started = time.monotonic()
+            document = Document(
+                title=job.title,
+                filename=job.filename,
+                file_size=job.file_size,
+                file_sha256=job.file_sha256,
+                content="",
+                document_type=job.document_type,
+                department=job.department,
+                visibility=job.visibility,
+                uploaded_by=job.uploaded_by,
+                is_active=False
+            )
+            db.add(document)
+            db.flush()
+            job.document_id = document.id
+            db.commit()
+
+            timings["indexing"] = 0.0
+            with tempfile.TemporaryFile("w+", encoding="utf-8") as text_spool, \
+                    tempfile.TemporaryFile() as vector_spool:
+                indexed_chunks = self.doc_processor.iter_indexed_chunks(
+                    self.extracted_segments(db, job, text_spool, timings)
+                )
+                chunks_created = 0
+                vector_batches = []
+                while True:
+                    batch = list(islice(indexed_chunks, INGESTION_BATCH_CHUNKS))
+                    if not batch:
+                        break
+                    batch_started = time.monotonic()
+                    chunks = self.save_chunks(db, document, batch, first_index=chunks_created)
+                    vector_batches += self.spool_vectors(vector_spool, chunks)
+                    chunks_created += len(chunks)
+                    job.heartbeat_at = datetime.utcnow()
+                    db.commit()
+                    timings["indexing"] += time.monotonic() - batch_started
+                if not text_spool.tell():
+                    raise IngestionError("Could not extract text from file")
+                timings["chunking"] = round(time.monotonic() - started - timings["extracting"] - timings["indexing"], 3)
+                timings["extracting"] = round(timings["extracting"], 3)
+                self.set_stage(db, job, IngestionStatus.INDEXING, timings)
+
+                # Content, full-text rows, activation and the job's completion are committed
+                # together: an attempt that fails before the commit leaves an inactive document
+                # that is deleted, and once it is committed the job is done and never retried
+                started = time.monotonic()
+                text_spool.seek(0)
+                document.content = text_spool.read()
+                document.is_active = True
+                self.ai_service.index_manager.add_document(db, document)
+                job.chunks_created = chunks_created
+                job.error = None
+                job.status = IngestionStatus.DONE
+                job.finished_at = datetime.utcnow()
+                db.commit()
+
+                # Vectors are only stored for committed chunks; the content is not read again
+                document = db.query(Document).options(defer(Document.content)).filter(
+                    Document.id == document.id
+                ).one()
+                self.ai_service.index_manager.document_added(
+                    document, self.spooled_vectors(vector_spool, vector_batches)
+                )
+            self.ai_service.on_document_added(document)
+            timings["indexing"] = round(timings["indexing"] + time.monotonic() - started, 3)
+            self.finish(db, job, IngestionStatus.DONE, timings)
+            self.jobs_done += 1
+            logger.debug(f"Ingestion job {job_id} created document {document.id} with {chunks_created} chunks {timings}")
+        except Exception as e:
+            db.rollback()
+            self.record_failure(db, job_id, e, timings)
+        finally:
+            db.close()
+
+    def extracted_segments(self, db: Session, job: IngestionJob, spool: TextIO, timings: Dict) -> Iterator[str]:
+        """Cleaned text of the job's file a page at a time, also written to spool.
+
+        Time spent reading the file is added to timings["extracting"]; extraction errors
+        fail the job without retries. The job moves to the chunking stage once the first page
+        is read, and its heartbeat is kept current between pages.
+        """
+        pages = self.doc_processor.iter_text_from_path(job.file_path, job.filename)
+        timings["extracting"] = 0.0
+        first = True
+        while True:
+            started = time.monotonic()
+            try:
+                segment = next(pages, None)
+            except Exception as e:
+                raise IngestionError(f"Could not extract text from file: {e}")
+            finally:
+                timings["extracting"] += time.monotonic() - started
+            if segment is None:
+                return
+            if first:
+                self.set_stage(db, job, IngestionStatus.CHUNKING, timings)
+                first = False
+            else:
+                self.heartbeat(db, job)
+            spool.write(segment)
+            yield segment
+
+    def spool_vectors(self, spool: BinaryIO, chunks: List[DocumentChunk]) -> List[Tuple[str, np.dtype, int]]:
+        """Write the vectors of saved chunks to spool as (chunk id, vector) records; returns the
+        batch written as (model id, record type, rows), none when the chunks were not embedded"""
+        embedded = self.ai_service.index_manager.embed_chunks(chunks)
+        if embedded is None:
+            return []
+        model_id, vectors = embedded
+        records = np.empty(len(chunks), dtype=[("chunk_id", "<i8"), ("vector", "<f4", (vectors.shape[1],))])
+        records["chunk_id"] = [chunk.id for chunk in chunks]
+        records["vector"] = vectors
+        spool.write(records.tobytes())
+        return [(model_id, records.dtype, len(records))]
+
+    def spooled_vectors(self, spool: BinaryIO,
+                        batches: List[Tuple[str, np.dtype, int]]) -> Iterator[Tuple[str, List[int], np.ndarray]]:
+        """The batches written by spool_vectors as (model id, chunk ids, vectors), one at a time"""
+        spool.seek(0)
+        for model_id, record, rows in batches:
+            records = np.frombuffer(spool.read(record.itemsize * rows), dtype=record)
+            yield model_id, records["chunk_id"].tolist(), records["vector"]
+
+    def heartbeat(self, db: Session, job: IngestionJob):
+        """Show other workers that the job is still running (at most every heartbeat interval)"""
+        now = datetime.utcnow()
+        if job.heartbeat_at is None or (now - job.heartbeat_at).total_seconds() >= INGESTION_HEARTBEAT_SECONDS:
+            job.heartbeat_at = now
+            db.commit()
+
+    def set_stage(self, db: Session, job: IngestionJob, status: IngestionStatus, timings: Dict):
+        job.status = status
+        job.stage_timings = json.dumps(timings)
+        job.heartbeat_at = datetime.utcnow()
+        db.commit()
+
+    def finish(self, db: Session, job: IngestionJob, status: IngestionStatus, timings: Dict):
+        job.status = status
+        job.stage_timings = json.dumps(timings)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+
+    def record_failure(self, db: Session, job_id: int, error: Exception, timings: Dict):
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        if job is None:
+            return
+        job.error = str(error)
+        timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+        if job.status == IngestionStatus.DONE:
+            # The document is committed, only a step after the commit failed
+            logger.warning(f"Ingestion job {job_id} created document {job.document_id} but did not complete: {error}")
+            self.finish(db, job, IngestionStatus.DONE, timings)
+            self.jobs_done += 1
+            return
+        if job.document_id is not None:
+            self.discard_document(db, job)
+        if isinstance(error, IngestionError) or job.attempts >= INGESTION_MAX_ATTEMPTS:
+            logger.warning(f"Ingestion job {job_id} failed after {job.attempts} attempts: {error}")
+            self.finish(db, job, IngestionStatus.FAILED, timings)
+            self.jobs_failed += 1
+            return
+        delay = INGESTION_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+        logger.warning(f"Ingestion job {job_id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+        job.status = IngestionStatus.QUEUED
+        job.stage_timings = json.dumps(timings)
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.commit()
+        self.retries += 1
+
+    def discard_document(self, db: Session, job: IngestionJob):
+        """Delete the inactive document and chunks of an attempt that did not complete (committed).
+        It has no full-text rows or vectors yet, and nothing else refers to it."""
+        db.query(DocumentChunk).filter(DocumentChunk.document_id == job.document_id).delete(synchronize_session=False)
+        db.query(Document).filter(Document.id == job.document_id).delete(synchronize_session=False)
+        job.document_id = None
+        db.commit()
+
+    def create_document_chunks(self, db: Session, document: Document, text: str) -> List[DocumentChunk]:
+        """Split a document into chunks and save them (flushed so they have ids)"""
+        return self.save_chunks(db, document, self.doc_processor.create_indexed_chunks(text))
+
+    def save_chunks(self, db: Session, document: Document, indexed_chunks: List[Dict],
+                    first_index: int = 0) -> List[DocumentChunk]:
+        chunks = []
+        for i, indexed in enumerate(indexed_chunks, first_index):
+            chunk = DocumentChunk(
+                document_id=document.id,
+                chunk_text=indexed['text'],
+                chunk_index=i,
+                start_offset=indexed['start'],
+                end_offset=indexed['end'],
+                sentence_spans=json.dumps(indexed['sentence_spans']),
+                sentence_tokens=json.dumps(indexed['sentence_tokens'])
+            )
+            db.add(chunk)
+            chunks.append(chunk)
+        db.flush()
+        return chunks
+
+    def describe(self, job: IngestionJob) -> Dict:
+        """Status of a job as returned by the API"""
+        return {
+            "job_id": job.id,
+            "status": job.status.value,
+            "title": job.title,
+            "filename": job.filename,
+            "file_size": job.file_size,
+            "sha256": job.file_sha256,
+            # Set while the document is saved, but only readable once the job is done
+            "document_id": job.document_id if job.status == IngestionStatus.DONE else None,
+            "chunks_created": job.chunks_created,
+            "attempts": job.attempts,
+            "error": job.error,
+            "created_at": job.created_at.isoformat(),
+            "next_attempt_at": job.next_attempt_at.isoformat() if job.status == IngestionStatus.QUEUED else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "timings": json.loads(job.stage_timings) if job.stage_timings else {}
+        }
+
+    def get_stats(self, db: Session) -> Dict:
+        counts = {status.value: 0 for status in IngestionStatus}
+        for status, count in db.query(IngestionJob.status, func.count(IngestionJob.id)).group_by(IngestionJob.status):
+            counts[status.value] = count
+        return {
+            "jobs": counts,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "retries": self.retries,
+            "running": self._thread is not None and self._thread.is_alive()
+        }
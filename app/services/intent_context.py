@@ -0,0 +1,69 @@
+import time
+from typing import Dict, List, Optional
+
+# Coarse routes handled by the leave management service besides the leave_* family
+LEAVE_ROUTES = {'emergency_leave', 'manager_query'}
+
+# Paths that can serve a chat turn's answer, reported in responses and analytics
+SERVED_BY_LLM = 'llm'
+SERVED_BY_LLM_HEDGE = 'llm_hedge'
+SERVED_BY_DEADLINE_FALLBACK = 'fallback_deadline'
+SERVED_BY_ERROR_FALLBACK = 'fallback_error'
+SERVED_BY_LEAVE_SERVICE = 'leave_service'
+SERVED_BY_CACHE = 'cache'
+SERVED_BY_SEMANTIC_CACHE = 'semantic_cache'
+
+
+def is_leave_route(intent: Optional[str]) -> bool:
+    """Whether a coarse intent is handled by the leave management service"""
+    return bool(intent) and (intent.startswith('leave_') or intent in LEAVE_ROUTES)
+
+
+class IntentContext:
+    """Per-turn intent state created once by the chat endpoint and passed down the AI pipeline"""
+
+    def __init__(self, query: str, employee_context: Dict = None, conversation_history: List = None,
+                 deadline_seconds: float = None):
+        self.query = query
+        self.employee_context = employee_context or {}
+        self.conversation_history = conversation_history or []
+        self.intent: Optional[str] = None
+        self.leave_classification: Optional[Dict] = None
+        self.classification_count = 0
+
+        # Latency budget for the whole turn and the path that produced the answer
+        self.started_at = time.monotonic()
+        self.deadline_seconds = deadline_seconds
+        self.served_by: Optional[str] = None
+
+    @property
+    def is_classified(self) -> bool:
+        return self.intent is not None
+
+    @property
+    def is_leave_intent(self) -> bool:
+        """Whether the turn should be handled by the leave management service"""
+        return is_leave_route(self.intent)
+
+    def remaining_budget(self) -> Optional[float]:
+        """Seconds left before the turn deadline, or None when the turn has no deadline"""
+        if not self.deadline_seconds:
+            return None
+        return max(self.deadline_seconds - (time.monotonic() - self.started_at), 0.0)
+
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def record_classification(self, intent: str, leave_classification: Dict = None):
+        """Store the classification result and count the classifier call for this turn"""
+        self.intent = intent
+        self.leave_classification = leave_classification
+        self.classification_count += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "intent": self.intent,
+            "leave_intent": self.leave_classification.get("primary_intent") if self.leave_classification else None,
+            "classification_count": self.classification_count,
+            "served_by": self.served_by
+        }
@@ -1,28 +1,27 @@
+import logging
 import os
 import json
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from groq import Groq
 import re
 from dateutil import parser
 from decimal import Decimal
 
 from app.models import UserRole
+from .llm_gateway import get_llm_gateway, TASK_ENTITY_EXTRACTION
+
+logger = logging.getLogger(__name__)
+
 
 class LeaveIntentAgent:
     """Agentic AI system for sophisticated leave management intent classification"""
     
     def __init__(self):
-        self.groq_client = None
-        try:
-            api_key = os.getenv("GROQ_API_KEY")
-            if api_key and api_key != "your_groq_api_key_here":
-                self.groq_client = Groq(api_key=api_key)
-        except Exception as e:
-            print(f"Groq client initialization failed: {e}")
+        # Shared Groq gateway (connection pool, retries, per-task models)
+        self.llm_gateway = get_llm_gateway()
     
-    def classify_leave_intent(self, message: str, employee_context: Dict, conversation_history: List = None) -> Dict:
+    async def classify_leave_intent(self, message: str, employee_context: Dict, conversation_history: List = None) -> Dict:
         """
         Advanced agentic intent classification for leave management - FIXED VERSION
         """
@@ -30,9 +29,10 @@ class LeaveIntentAgent:
         # Build context-aware prompt
         prompt = self.build_intent_classification_prompt(message, employee_context, conversation_history)
         
-        if self.groq_client:
+        if self.llm_gateway.is_available:
             try:
-                response = self.groq_client.chat.completions.create(
+                ai_response = await self.llm_gateway.complete(
+                    TASK_ENTITY_EXTRACTION,
                     messages=[
                         {
                             "role": "system",
@@ -42,69 +42,32 @@ class LeaveIntentAgent:
                             "role": "user",
                             "content": prompt
                         }
-                    ],
-                    model="llama-3.3-70b-versatile",
-                    temperature=0.1,  # Low temperature for consistent classification
-                    max_tokens=800
+                    ]
                 )
                 
                 # Parse AI response - FIXED NULL CHECK
-                if response and response.choices and len(response.choices) > 0:
-                    ai_response = response.choices[0].message.content
-                    if ai_response:
-                        return self.parse_intent_response(ai_response)
-                    else:
-                        print("WARNING: Groq returned empty response content")
-                        return self.fallback_intent_classification(message, employee_context)
+                if ai_response:
+                    return self.parse_intent_response(ai_response)
                 else:
-                    print("WARNING: Groq returned invalid response structure")
+                    logger.warning("Groq returned empty response content")
                     return self.fallback_intent_classification(message, employee_context)
                 
             except Exception as e:
-                print(f"Groq API error in intent classification: {e}")
+                logger.error(f"Groq API error in intent classification: {e}")
                 return self.fallback_intent_classification(message, employee_context)
         else:
-            print("WARNING: Groq client not available, using fallback")
+            logger.warning("Groq client not available, using fallback")
             return self.fallback_intent_classification(message, employee_context)
     
     def build_intent_classification_prompt(self, message: str, employee_context: Dict, conversation_history: List = None) -> str:
         """Build sophisticated context-aware prompt for intent classification"""
         
-        history_context = ""
-        if conversation_history and len(conversation_history) > 1:
-            history_context = "RECENT CONVERSATION CONTEXT:\n"
-            for msg in conversation_history[-5:]:  # Last 5 messages for context
-                history_context += f"- {msg['type'].upper()}: {msg['message']}\n"
-            history_context += "\n"
-            
-            # Analyze conversation flow
-            user_messages = [msg['message'] for msg in conversation_history if msg['type'] == 'user']
-            assistant_messages = [msg['message'] for msg in conversation_history if msg['type'] == 'assistant']
-            
-            # Check if we're in a multi-turn leave application flow
-            if len(assistant_messages) > 0:
-                last_assistant_msg = assistant_messages[-1].lower()
-                if any(phrase in last_assistant_msg for phrase in [
-                    "need a bit more information", 
-                    "please provide", 
-                    "what type of leave",
-                    "when would you like",
-                    "how many days"
-                ]):
-                    history_context += "IMPORTANT: The assistant just requested additional information from the user. "
-                    history_context += "This current message is likely providing that requested information. "
-                    history_context += "Treat this as a CONTINUATION of an existing leave application process.\n\n"
+        history_context = self.build_history_context(conversation_history)
         
         prompt = f"""
 ROLE: You are an expert HR AI agent specializing in leave management intent classification with perfect conversation memory.
 
-EMPLOYEE PROFILE:
-- Name: {employee_context.get('name', 'Unknown')}
-- Department: {employee_context.get('department', 'Unknown')}
-- Role: {employee_context.get('role', 'Unknown')}
-- Employee ID: {employee_context.get('employee_id', 'Unknown')}
-- User Role: {employee_context.get('user_role', 'employee')}
-- Current Leave Balances: {json.dumps(employee_context.get('leave_balances', {}), indent=2)}
+{self.build_employee_profile(employee_context)}
 
 {history_context}
 
@@ -113,7 +76,18 @@ CURRENT USER MESSAGE: "{message}"
 ENHANCED INTENT CLASSIFICATION:
 Based on conversation history, user role, and current message, determine the primary intent:
 
-1. CHECK_BALANCE - Employee wants to know remaining leave days
+{self.LEAVE_INTENT_GUIDE}
+
+OUTPUT FORMAT (JSON):
+{self.build_leave_output_format(employee_context)}
+
+CRITICAL: Pay special attention to user role when classifying manager queries!
+"""
+        
+        return prompt
+    
+    # Leave intents and rules shared by the leave-only and the unified classification prompts
+    LEAVE_INTENT_GUIDE = """1. CHECK_BALANCE - Employee wants to know remaining leave days
 2. APPLY_LEAVE - Employee wants to submit a leave application 
 3. CHECK_STATUS - Employee wants status of existing application  
 4. MODIFY_LEAVE - Employee wants to change existing application
@@ -130,10 +104,38 @@ CRITICAL CLASSIFICATION RULES:
 - If asking about "balance", "remaining", "how many days" → CHECK_BALANCE
 - If requesting leave with dates/duration → APPLY_LEAVE
 - If asking "where is my", "status of", "approved" → CHECK_STATUS
-- If contains "emergency", "urgent", "asap" → EMERGENCY_LEAVE
-
-OUTPUT FORMAT (JSON):
-{{
+- If contains "emergency", "urgent", "asap" → EMERGENCY_LEAVE"""
+    
+    def build_employee_profile(self, employee_context: Dict) -> str:
+        """Employee profile block for classification prompts (balances only when the context has them)"""
+        profile = f"""EMPLOYEE PROFILE:
+- Name: {employee_context.get('name', 'Unknown')}
+- Department: {employee_context.get('department', 'Unknown')}
+- Role: {employee_context.get('role', 'Unknown')}
+- Employee ID: {employee_context.get('employee_id', 'Unknown')}
+- User Role: {employee_context.get('user_role', 'employee')}"""
+        if 'leave_balances' in employee_context:
+            profile += f"\n- Current Leave Balances: {json.dumps(employee_context['leave_balances'], indent=2)}"
+        return profile
+    
+    def build_leave_entities_format(self) -> str:
+        """Compact JSON schema with only the leave fields the chat handlers read"""
+        return """{
+        "primary_intent": "intent_name",
+        "confidence": 0.95,
+        "urgency_level": "normal|urgent|emergency",
+        "conversation_context": {"is_continuation": true/false},
+        "extracted_entities": {
+            "dates": {"start_date": "2024-06-15", "end_date": "2024-06-15", "raw_date_text": "15th June"},
+            "duration": {"total_days": 1, "half_days": false},
+            "leave_type": "annual|sick|personal|emergency",
+            "reason": "brief reason if mentioned"
+        }
+    }"""
+    
+    def build_leave_output_format(self, employee_context: Dict) -> str:
+        """JSON schema of the structured leave classification"""
+        return f"""{{
     "primary_intent": "intent_name",
     "confidence": 0.95,
     "urgency_level": "normal|urgent|emergency",
@@ -171,19 +173,44 @@ OUTPUT FORMAT (JSON):
     ],
     "confidence_reasoning": "User with {employee_context.get('user_role', 'employee')} role asking about pending approvals - clearly a manager query.",
     "suggested_ai_response": "I'll help you review pending leave applications for your team."
-}}
-
-CRITICAL: Pay special attention to user role when classifying manager queries!
-"""
+}}"""
+    
+    def build_history_context(self, conversation_history: List = None) -> str:
+        """Summarize recent conversation turns for classification prompts"""
         
-        return prompt
+        history_context = ""
+        if conversation_history and len(conversation_history) > 1:
+            history_context = "RECENT CONVERSATION CONTEXT:\n"
+            for msg in conversation_history[-5:]:  # Last 5 messages for context
+                history_context += f"- {msg['type'].upper()}: {msg['message']}\n"
+            history_context += "\n"
+            
+            # Analyze conversation flow
+            user_messages = [msg['message'] for msg in conversation_history if msg['type'] == 'user']
+            assistant_messages = [msg['message'] for msg in conversation_history if msg['type'] == 'assistant']
+            
+            # Check if we're in a multi-turn leave application flow
+            if len(assistant_messages) > 0:
+                last_assistant_msg = assistant_messages[-1].lower()
+                if any(phrase in last_assistant_msg for phrase in [
+                    "need a bit more information", 
+                    "please provide", 
+                    "what type of leave",
+                    "when would you like",
+                    "how many days"
+                ]):
+                    history_context += "IMPORTANT: The assistant just requested additional information from the user. "
+                    history_context += "This current message is likely providing that requested information. "
+                    history_context += "Treat this as a CONTINUATION of an existing leave application process.\n\n"
+        
+        return history_context
     
     def parse_intent_response(self, ai_response: str) -> Dict:
         """Parse and validate AI intent classification response - FIXED VERSION"""
         try:
             # Check if ai_response is None or empty
             if not ai_response:
-                print("WARNING: AI response is None or empty")
+                logger.warning("AI response is None or empty")
                 return self.create_default_intent_response()
             
             # Extract JSON from response (handle cases where AI adds explanation)
@@ -197,16 +224,16 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
                 # Validate and normalize response
                 return self.validate_intent_response(intent_data)
             else:
-                print(f"WARNING: No valid JSON found in AI response: {ai_response}")
+                logger.warning(f"No valid JSON found in AI response: {ai_response}")
                 return self.create_default_intent_response()
                 
         except json.JSONDecodeError as e:
-            print(f"JSON decode error in intent response: {e}")
-            print(f"Raw response: {ai_response}")
+            logger.warning(f"JSON decode error in intent response: {e}")
+            logger.debug(f"Raw response: {ai_response}")
             return self.create_default_intent_response()
         except Exception as e:
-            print(f"Error parsing intent response: {e}")
-            print(f"Raw response: {ai_response}")
+            logger.warning(f"Error parsing intent response: {e}")
+            logger.debug(f"Raw response: {ai_response}")
             return self.create_default_intent_response()
     
     def validate_intent_response(self, intent_data: Dict) -> Dict:
@@ -217,7 +244,8 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
             "primary_intent": intent_data.get("primary_intent", "GENERAL_HR"),
             "confidence": min(max(intent_data.get("confidence", 0.5), 0.0), 1.0),
             "urgency_level": intent_data.get("urgency_level", "normal"),
-            "extracted_entities": intent_data.get("extracted_entities", {}),
+            "conversation_context": intent_data.get("conversation_context") or {},
+            "extracted_entities": intent_data.get("extracted_entities") or {},
             "business_context": intent_data.get("business_context", {}),
             "suggested_next_steps": intent_data.get("suggested_next_steps", []),
             "confidence_reasoning": intent_data.get("confidence_reasoning", ""),
@@ -257,7 +285,7 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
                 validated_dates["end_date"] = validated_dates["start_date"]
                 
         except Exception as e:
-            print(f"Date parsing error: {e}")
+            logger.debug(f"Date parsing error: {e}")
             validated_dates["parsing_confidence"] = "failed"
         
         return validated_dates
@@ -268,7 +296,7 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
         message_lower = message.lower()
         user_role = employee_context.get('user_role', 'employee')
         
-        print(f"DEBUG: Fallback classification - Message: '{message}', User Role: {user_role}")
+        logger.debug(f"Fallback classification - Message: '{message}', User Role: {user_role}")
         
         # Enhanced keyword detection for manager queries - CHECK USER ROLE FIRST
         manager_keywords = [
@@ -279,7 +307,7 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
         # If user is manager/HR and asking about management topics
         if user_role in ['manager', 'hr_manager', 'hr_admin']:
             if any(word in message_lower for word in manager_keywords):
-                print(f"DEBUG: Manager/HR user asking about management topics → MANAGER_QUERY")
+                logger.debug(f"Manager/HR user asking about management topics → MANAGER_QUERY")
                 return {
                     "primary_intent": "MANAGER_QUERY",
                     "confidence": 0.9,
@@ -307,7 +335,7 @@ CRITICAL: Pay special attention to user role when classifying manager queries!
         else:
             intent = "GENERAL_HR"
         
-        print(f"DEBUG: Classified as: {intent}")
+        logger.debug(f"Classified as: {intent}")
         
         return {
             "primary_intent": intent,
@@ -347,25 +375,25 @@ class LeaveService:
         if year is None:
             year = datetime.now().year
         
-        print(f"Looking for leave balances for employee_id: {employee_id}, year: {year}")
+        logger.debug(f"Looking for leave balances for employee_id: {employee_id}, year: {year}")
         
         balances = db.query(LeaveBalance).filter(
             LeaveBalance.employee_id == employee_id,
             LeaveBalance.year == year
         ).all()
         
-        print(f"Found {len(balances)} leave balance records")
+        logger.debug(f"Found {len(balances)} leave balance records")
         
         # If no balances found, create them
         if not balances:
-            print(f"No leave balances found, creating default balances...")
+            logger.debug(f"No leave balances found, creating default balances...")
             self.create_default_leave_balances(db, employee_id, year)
             # Query again after creation
             balances = db.query(LeaveBalance).filter(
                 LeaveBalance.employee_id == employee_id,
                 LeaveBalance.year == year
             ).all()
-            print(f"After creation, found {len(balances)} leave balance records")
+            logger.debug(f"After creation, found {len(balances)} leave balance records")
         
         # Convert to dict format
         balance_dict = {}
@@ -406,20 +434,18 @@ class LeaveService:
                 carried_forward=Decimal('0.0')
             )
             db.add(balance)
-            print(f"Created balance: {leave_type.value} = {allocated_days} days")
+            logger.debug(f"Created balance: {leave_type.value} = {allocated_days} days")
         
         try:
             db.commit()
-            print("Successfully created default leave balances")
+            logger.debug("Successfully created default leave balances")
         except Exception as e:
-            print(f"Error creating default balances: {e}")
+            logger.error(f"Error creating default balances: {e}")
             db.rollback()
     
-    def process_leave_chat_message(self, db: Session, message: str, employee, conversation_history: List = None) -> Dict:
-        """Process employee chat message with agentic intent classification"""
-        
-        # Get employee context for AI agent
-        employee_context = {
+    def build_employee_context(self, db: Session, employee) -> Dict:
+        """Employee profile and leave balances used by intent classification"""
+        return {
             "name": employee.name,
             "employee_id": employee.employee_id,
             "department": employee.department,
@@ -427,11 +453,21 @@ class LeaveService:
             "user_role": employee.user_role.value,
             "leave_balances": self.get_employee_leave_balances(db, employee.id)
         }
+    
+    async def process_leave_chat_message(self, db: Session, message: str, employee, conversation_history: List = None, intent_context=None) -> Dict:
+        """Process employee chat message with agentic intent classification"""
         
-        # Classify intent using agentic AI
-        intent_result = self.intent_agent.classify_leave_intent(
-            message, employee_context, conversation_history
-        )
+        if intent_context is not None and intent_context.leave_classification:
+            # The unified turn classifier already extracted the leave intent and entities
+            intent_result = intent_context.leave_classification
+        else:
+            # Get employee context for AI agent
+            employee_context = self.build_employee_context(db, employee)
+            
+            # Classify intent using agentic AI
+            intent_result = await self.intent_agent.classify_leave_intent(
+                message, employee_context, conversation_history
+            )
         
         # Route to appropriate handler based on intent
         response = self.route_intent_to_handler(db, intent_result, employee, message)
@@ -468,9 +504,7 @@ class LeaveService:
         try:
             return handler(db, intent_result, employee, original_message)
         except Exception as e:
-            print(f"Error in leave handler {intent}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error in leave handler {intent}: {e}")
             # Fallback response
             return {
                 "response": f"Hi {employee.name}! I'm having trouble processing your request right now. Could you please try rephrasing your question or contact HR directly for assistance?",
@@ -611,7 +645,7 @@ class LeaveService:
         
         # Check if employee already has a manager_id set
         if hasattr(employee, 'manager_id') and employee.manager_id:
-            print(f"DEBUG: Employee {employee.name} already has manager_id: {employee.manager_id}")
+            logger.debug(f"Employee {employee.name} already has manager_id: {employee.manager_id}")
             return employee.manager_id
         
         # Auto-assign manager based on department and role hierarchy
@@ -633,10 +667,10 @@ class LeaveService:
             # Priority: Department manager > HR manager
             if dept_manager:
                 manager_id = dept_manager.id
-                print(f"DEBUG: Assigning department manager {dept_manager.name} (ID: {manager_id}) to {employee.name}")
+                logger.debug(f"Assigning department manager {dept_manager.name} (ID: {manager_id}) to {employee.name}")
             elif hr_manager:
                 manager_id = hr_manager.id
-                print(f"DEBUG: Assigning HR manager {hr_manager.name} (ID: {manager_id}) to {employee.name}")
+                logger.debug(f"Assigning HR manager {hr_manager.name} (ID: {manager_id}) to {employee.name}")
             else:
                 # No managers found, use HR Admin as fallback
                 hr_admin = db.query(Employee).filter(
@@ -646,9 +680,9 @@ class LeaveService:
                 
                 if hr_admin:
                     manager_id = hr_admin.id
-                    print(f"DEBUG: Assigning HR admin {hr_admin.name} (ID: {manager_id}) as fallback manager to {employee.name}")
+                    logger.debug(f"Assigning HR admin {hr_admin.name} (ID: {manager_id}) as fallback manager to {employee.name}")
                 else:
-                    print(f"DEBUG: No manager found for {employee.name}")
+                    logger.debug(f"No manager found for {employee.name}")
                     return None
             
             # Update employee record with manager assignment
@@ -658,7 +692,7 @@ class LeaveService:
             return manager_id
             
         except Exception as e:
-            print(f"ERROR: Failed to assign manager to {employee.name}: {e}")
+            logger.error(f"Failed to assign manager to {employee.name}: {e}")
             return None
     
     def create_leave_application(self, db: Session, intent_result: Dict, employee) -> Dict:
@@ -704,7 +738,7 @@ class LeaveService:
             # Get manager ID - THIS IS THE CRUCIAL FIX
             manager_id = self.get_employee_manager(db, employee)
             
-            print(f"DEBUG: Creating application for employee {employee.id} ({employee.name}), manager_id: {manager_id}")
+            logger.debug(f"Creating application for employee {employee.id} ({employee.name}), manager_id: {manager_id}")
             
             # Create application
             application = LeaveApplication(
@@ -722,14 +756,14 @@ class LeaveService:
             db.add(application)
             db.flush()  # Get the ID
             
-            print(f"DEBUG: Created application with ID {application.id}")
+            logger.debug(f"Created application with ID {application.id}")
             
             # Update leave balance (mark as pending)
             self.update_leave_balance_pending(db, employee.id, leave_type, total_days)
             
             db.commit()
             
-            print(f"DEBUG: Successfully committed application {app_number}")
+            logger.debug(f"Successfully committed application {app_number}")
             
             # Generate confirmation response
             response = f"✅ **Leave Application Submitted Successfully!**\n\n"
@@ -763,9 +797,7 @@ class LeaveService:
             
         except Exception as e:
             db.rollback()
-            print(f"ERROR: Exception in create_leave_application: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Exception in create_leave_application: {e}")
             return {
                 "response": f"I encountered an error while processing your leave application: {str(e)}. Please try again or contact HR for assistance.",
                 "confidence": 0.3,
@@ -781,7 +813,7 @@ class LeaveService:
             LeaveApplication.employee_id == employee.id
         ).order_by(LeaveApplication.applied_date.desc()).limit(10).all()
         
-        print(f"DEBUG: Found {len(applications)} applications for employee {employee.id} ({employee.name})")
+        logger.debug(f"Found {len(applications)} applications for employee {employee.id} ({employee.name})")
         
         if not applications:
             response = f"Hi {employee.name}! I don't see any leave applications in our system yet. "
@@ -856,16 +888,16 @@ class LeaveService:
         
         message_lower = message.lower()
         
-        print(f"DEBUG: Manager query from {employee.name} (Role: {employee.user_role.value}): '{message}'")
+        logger.debug(f"Manager query from {employee.name} (Role: {employee.user_role.value}): '{message}'")
         
         # FORCE DIRECT CALL TO PENDING APPROVALS - this is the key fix
         if any(word in message_lower for word in ['pending', 'approval', 'approve', 'waiting', 'applications', 'requests']):
-            print(f"DEBUG: Detected pending approval request, calling get_pending_approvals_for_manager directly")
+            logger.debug(f"Detected pending approval request, calling get_pending_approvals_for_manager directly")
             return self.get_pending_approvals_for_manager(db, employee)
         
         # If the message contains "show me" or similar, also route to pending approvals
         if any(phrase in message_lower for phrase in ['show me', 'show pending', 'list pending', 'pending leave']):
-            print(f"DEBUG: Detected 'show me' request, calling get_pending_approvals_for_manager directly")
+            logger.debug(f"Detected 'show me' request, calling get_pending_approvals_for_manager directly")
             return self.get_pending_approvals_for_manager(db, employee)
         
         # Check if asking for team leave overview
@@ -874,7 +906,7 @@ class LeaveService:
         
         # DEFAULT: For any manager query that we're not sure about, show pending approvals
         else:
-            print(f"DEBUG: Generic manager query, defaulting to pending approvals")
+            logger.debug(f"Generic manager query, defaulting to pending approvals")
             return self.get_pending_approvals_for_manager(db, employee)
 
 # ALSO ADD this debugging method to help troubleshoot:
@@ -882,24 +914,24 @@ class LeaveService:
         """Debug method to check what applications exist for a manager"""
         from ..models import LeaveApplication, Employee
         
-        print(f"=== DEBUGGING MANAGER APPLICATIONS FOR {employee.name} (ID: {employee.id}) ===")
+        logger.debug(f"=== DEBUGGING MANAGER APPLICATIONS FOR {employee.name} (ID: {employee.id}) ===")
         
         # Get ALL applications in the system
         all_apps = db.query(LeaveApplication).all()
-        print(f"Total applications in system: {len(all_apps)}")
+        logger.debug(f"Total applications in system: {len(all_apps)}")
         
         for app in all_apps:
-            print(f"App {app.application_number}:")
-            print(f"  - Employee: {app.employee.name} (ID: {app.employee_id})")
-            print(f"  - Manager: {app.manager_id}")
-            print(f"  - Status: {app.status.value}")
-            print(f"  - Dates: {app.start_date} to {app.end_date}")
+            logger.debug(f"App {app.application_number}:")
+            logger.debug(f"  - Employee: {app.employee.name} (ID: {app.employee_id})")
+            logger.debug(f"  - Manager: {app.manager_id}")
+            logger.debug(f"  - Status: {app.status.value}")
+            logger.debug(f"  - Dates: {app.start_date} to {app.end_date}")
         
         # Check manager assignments
         team_members = db.query(Employee).filter(Employee.manager_id == employee.id).all()
-        print(f"Team members reporting to {employee.name}: {len(team_members)}")
+        logger.debug(f"Team members reporting to {employee.name}: {len(team_members)}")
         for member in team_members:
-            print(f"  - {member.name} (ID: {member.id})")
+            logger.debug(f"  - {member.name} (ID: {member.id})")
         
         return {
             "total_apps": len(all_apps),
@@ -912,10 +944,11 @@ class LeaveService:
         from ..models import LeaveApplication, LeaveStatus, UserRole, Employee
         
         try:
-            print(f"DEBUG: Getting pending approvals for {employee.name} (Role: {employee.user_role.value}, ID: {employee.id})")
+            logger.debug(f"Getting pending approvals for {employee.name} (Role: {employee.user_role.value}, ID: {employee.id})")
             
             # Call debug method to see what's in the database
-            self.debug_manager_applications(db, employee)
+            if logger.isEnabledFor(logging.DEBUG):
+                self.debug_manager_applications(db, employee)
             
             # SIMPLIFIED QUERY - Get applications based on user role
             if employee.user_role in [UserRole.HR_MANAGER, UserRole.HR_ADMIN]:
@@ -939,7 +972,7 @@ class LeaveService:
                     "confidence": 0.9
                 }
             
-            print(f"DEBUG: Found {len(applications)} applications for {user_type}")
+            logger.debug(f"Found {len(applications)} applications for {user_type}")
             
             # If no applications found
             if not applications:
@@ -1008,9 +1041,7 @@ class LeaveService:
             }
             
         except Exception as e:
-            print(f"ERROR in get_pending_approvals_for_manager: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error in get_pending_approvals_for_manager: {e}")
             
             return {
                 "response": f"I encountered an error retrieving pending approvals: {str(e)}. Please try refreshing or contact IT support.",
@@ -1023,7 +1054,7 @@ class LeaveService:
         from ..models import LeaveApplication, LeaveStatus, UserRole, Employee
         
         try:
-            print(f"DEBUG: Getting pending approvals for {employee.name} (Role: {employee.user_role.value}, ID: {employee.id})")
+            logger.debug(f"Getting pending approvals for {employee.name} (Role: {employee.user_role.value}, ID: {employee.id})")
             
             # Get applications pending approval based on user role
             if employee.user_role == UserRole.HR_MANAGER or employee.user_role == UserRole.HR_ADMIN:
@@ -1032,7 +1063,7 @@ class LeaveService:
                     LeaveApplication.status.in_([LeaveStatus.PENDING, LeaveStatus.MANAGER_APPROVED])
                 ).order_by(LeaveApplication.applied_date.asc()).all()
                 
-                print(f"DEBUG: HR user - found {len(applications)} total pending applications")
+                logger.debug(f"HR user - found {len(applications)} total pending applications")
                 
             elif employee.user_role == UserRole.MANAGER:
                 # Managers see applications where they are assigned as manager
@@ -1041,13 +1072,14 @@ class LeaveService:
                     LeaveApplication.status == LeaveStatus.PENDING
                 ).order_by(LeaveApplication.applied_date.asc()).all()
                 
-                print(f"DEBUG: Manager user - found {len(applications)} applications for manager_id {employee.id}")
+                logger.debug(f"Manager user - found {len(applications)} applications for manager_id {employee.id}")
                 
                 # Debug: Show what applications exist in the system
-                all_apps = db.query(LeaveApplication).all()
-                print(f"DEBUG: Total applications in system: {len(all_apps)}")
-                for app in all_apps:
-                    print(f"  - App {app.application_number}: Employee {app.employee_id} ({app.employee.name}), Manager {app.manager_id}, Status {app.status.value}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    all_apps = db.query(LeaveApplication).all()
+                    logger.debug(f"Total applications in system: {len(all_apps)}")
+                    for app in all_apps:
+                        logger.debug(f"  - App {app.application_number}: Employee {app.employee_id} ({app.employee.name}), Manager {app.manager_id}, Status {app.status.value}")
                 
             else:
                 return {
@@ -1058,7 +1090,7 @@ class LeaveService:
             if not applications:
                 # Enhanced empty state response
                 total_apps = db.query(LeaveApplication).count()
-                print(f"DEBUG: Total applications in system: {total_apps}")
+                logger.debug(f"Total applications in system: {total_apps}")
                 
                 response = f"✅ **No Pending Approvals, {employee.name}!**\n\n"
                 
@@ -1187,9 +1219,7 @@ class LeaveService:
             }
             
         except Exception as e:
-            print(f"ERROR in get_pending_approvals_for_manager: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error in get_pending_approvals_for_manager: {e}")
             return {
                 "response": f"I encountered an error retrieving pending approvals: {str(e)}. Please try again or check the management panel directly.",
                 "confidence": 0.3,
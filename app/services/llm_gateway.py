@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from groq import AsyncGroq, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Per-call timeout and the number of Groq requests allowed in flight per worker
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "32"))
+
+# Retry policy for transient provider failures (exponential backoff with full jitter)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+
+# Keep-alive connection pool shared by all Groq requests of this worker
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(LLM_MAX_CONCURRENT_REQUESTS)))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+# Circuit breaker: consecutive failed attempts before opening, seconds before a probe is allowed
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RECOVERY_SECONDS = float(os.getenv("LLM_BREAKER_RECOVERY_SECONDS", "30"))
+
+# Hedged requests: send a duplicate once a call runs longer than this latency percentile
+# of recent successful calls for the same task (0 disables hedging)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = 200
+
+# Task types routed to their own model and token budget
+TASK_INTENT = "intent"
+TASK_ENTITY_EXTRACTION = "entity_extraction"
+TASK_ANSWER_GENERATION = "answer_generation"
+
+DEFAULT_TASK_PROFILES = {
+    TASK_INTENT: {"model": "llama-3.1-8b-instant", "max_tokens": 200, "temperature": 0.1},
+    TASK_ENTITY_EXTRACTION: {"model": "llama-3.3-70b-versatile", "max_tokens": 800, "temperature": 0.1},
+    TASK_ANSWER_GENERATION: {"model": "llama-3.3-70b-versatile", "max_tokens": 500, "temperature": 0.3},
+}
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no LLM provider is configured for this worker"""
+    pass
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    """Raised without contacting the provider while the circuit breaker is open"""
+    pass
+
+
+class LLMTruncatedError(Exception):
+    """Raised by complete(require_complete=True) when the answer was cut off at max_tokens"""
+    pass
+
+
+class LLMGateway:
+    """Single entry point for Groq traffic: pooled client, retries, timeouts and per-task model routing"""
+
+    def __init__(self):
+        api_key = os.getenv("GROQ_API_KEY")
+        self.client = None
+        self.http_client = None
+
+        if not api_key or api_key == "your_groq_api_key_here":
+            logger.warning("GROQ_API_KEY not found in environment variables, set your Groq API key in the .env file")
+        else:
+            try:
+                self.http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                    ),
+                    timeout=LLM_TIMEOUT_SECONDS
+                )
+                # Retries are handled here so that jitter and timeouts apply uniformly
+                self.client = AsyncGroq(
+                    api_key=api_key,
+                    http_client=self.http_client,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    max_retries=0
+                )
+            except Exception as e:
+                logger.error(f"Error initializing Groq client: {e}")
+                self.client = None
+
+        self.task_profiles = self.load_task_profiles()
+        self.slots = asyncio.Semaphore(LLM_MAX_CONCURRENT_REQUESTS)
+        self.circuit_breaker = CircuitBreaker(
+            "groq",
+            failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=LLM_BREAKER_RECOVERY_SECONDS
+        )
+
+        # Recent successful call latencies per task, used to pick the hedge delay
+        self.latencies = {task: deque(maxlen=LLM_LATENCY_WINDOW) for task in self.task_profiles}
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        # Completions cut off at max_tokens per task
+        self.truncated = {task: 0 for task in self.task_profiles}
+
+    @property
+    def is_available(self) -> bool:
+        return self.client is not None
+
+    def load_task_profiles(self) -> Dict[str, Dict]:
+        """Default task profiles with LLM_MODEL_<TASK> / LLM_MAX_TOKENS_<TASK> overrides"""
+        profiles = {}
+        for task, defaults in DEFAULT_TASK_PROFILES.items():
+            suffix = task.upper()
+            profiles[task] = {
+                "model": os.getenv(f"LLM_MODEL_{suffix}", defaults["model"]),
+                "max_tokens": int(os.getenv(f"LLM_MAX_TOKENS_{suffix}", defaults["max_tokens"])),
+                "temperature": defaults["temperature"],
+            }
+        return profiles
+
+    def get_task_profile(self, task: str) -> Dict:
+        return self.task_profiles.get(task, self.task_profiles[TASK_ANSWER_GENERATION])
+
+    async def complete(self, task: str, messages: List[Dict], timeout: float = None,
+                       require_complete: bool = False, **overrides) -> Optional[str]:
+        """Run a chat completion for a task type and return the message content.
+
+        Transient failures are retried with jittered backoff; the last error is raised
+        once retries are exhausted. Requests beyond LLM_MAX_CONCURRENT_REQUESTS wait
+        for a free slot. While the circuit breaker is open LLMCircuitOpenError is raised
+        immediately so callers can use their fallbacks without waiting on the provider.
+        Answers cut off at max_tokens are counted, and raise LLMTruncatedError instead of
+        being returned when require_complete is set (e.g. for JSON).
+        """
+        if not self.is_available:
+            raise LLMUnavailableError("Groq client is not configured")
+
+        params = dict(self.get_task_profile(task))
+        params.update(overrides)
+
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise LLMCircuitOpenError(f"LLM circuit is open, skipping {task} request")
+            try:
+                async with self.slots:
+                    started = time.monotonic()
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(messages=messages, **params),
+                        timeout=timeout or LLM_TIMEOUT_SECONDS
+                    )
+                    self.record_latency(task, time.monotonic() - started)
+                self.circuit_breaker.record_success()
+                if not response or not response.choices:
+                    return None
+                choice = response.choices[0]
+                if choice.finish_reason == "length":
+                    self.truncated[task] = self.truncated.get(task, 0) + 1
+                    logger.warning(f"LLM {task} answer reached max_tokens ({params['max_tokens']})")
+                    if require_complete:
+                        raise LLMTruncatedError(f"{task} answer reached max_tokens ({params['max_tokens']})")
+                return choice.message.content
+            except RETRYABLE_ERRORS as e:
+                self.circuit_breaker.record_failure()
+                if attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** attempt))
+                logger.warning(f"LLM {task} request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.circuit_breaker.record_cancelled()
+                raise
+            except Exception:
+                # The provider answered (e.g. a 4xx), so it is reachable
+                self.circuit_breaker.record_success()
+                raise
+
+    async def stream(self, task: str, messages: List[Dict], timeout: float = None, **overrides) -> AsyncIterator[str]:
+        """Stream a chat completion for a task type, yielding content deltas as they arrive.
+
+        Failures before the first token are retried like complete(); once tokens have been
+        delivered the error is raised instead of restarting the answer. Every chunk must
+        arrive within the timeout. The concurrency slot is held until the stream ends.
+        """
+        if not self.is_available:
+            raise LLMUnavailableError("Groq client is not configured")
+
+        params = dict(self.get_task_profile(task))
+        params.update(overrides)
+        timeout = timeout or LLM_TIMEOUT_SECONDS
+
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise LLMCircuitOpenError(f"LLM circuit is open, skipping {task} stream")
+            delivered = False
+            try:
+                async with self.slots:
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(messages=messages, stream=True, **params),
+                        timeout=timeout
+                    )
+                    try:
+                        chunks = response.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                            except StopAsyncIteration:
+                                break
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                delivered = True
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await response.close()
+                self.circuit_breaker.record_success()
+                return
+            except RETRYABLE_ERRORS as e:
+                self.circuit_breaker.record_failure()
+                if delivered or attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** attempt))
+                logger.warning(f"LLM {task} stream failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+            except (asyncio.CancelledError, GeneratorExit):
+                self.circuit_breaker.record_cancelled()
+                raise
+            except Exception:
+                self.circuit_breaker.record_success()
+                raise
+
+    async def complete_hedged(self, task: str, messages: List[Dict], **overrides) -> Tuple[Optional[str], bool]:
+        """Like complete(), but sends a duplicate request when the first one is slow.
+
+        The duplicate goes out once the call has run longer than LLM_HEDGE_PERCENTILE of
+        recent latencies for the task; whichever request answers first wins and the other
+        is cancelled. Returns (content, served_by_hedge).
+        """
+        hedge_delay = self.get_hedge_delay(task)
+        primary = asyncio.ensure_future(self.complete(task, messages, **overrides))
+        if hedge_delay is None:
+            return await primary, False
+
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedges_sent += 1
+                tasks.append(asyncio.ensure_future(self.complete(task, messages, **overrides)))
+
+            # Return the first successful answer; only raise once every request has failed
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        hedged = finished is not primary
+                        if hedged:
+                            self.hedges_won += 1
+                        return finished.result(), hedged
+                    error = finished.exception()
+            raise error
+        finally:
+            for pending_task in tasks:
+                if not pending_task.done():
+                    pending_task.cancel()
+
+    def record_latency(self, task: str, seconds: float):
+        self.latencies.setdefault(task, deque(maxlen=LLM_LATENCY_WINDOW)).append(seconds)
+
+    def get_hedge_delay(self, task: str) -> Optional[float]:
+        """Latency percentile after which a hedged duplicate is sent, or None if hedging is off"""
+        samples = self.latencies.get(task)
+        if LLM_HEDGE_PERCENTILE <= 0 or not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(np.fromiter(samples, dtype=float), LLM_HEDGE_PERCENTILE))
+
+    def get_stats(self) -> Dict:
+        """Provider availability, breaker state and task routing for monitoring"""
+        latency = {}
+        for task, samples in self.latencies.items():
+            if samples:
+                values = np.fromiter(samples, dtype=float)
+                latency[task] = {
+                    "samples": len(values),
+                    "p50": round(float(np.percentile(values, 50)), 3),
+                    "p95": round(float(np.percentile(values, 95)), 3),
+                    "hedge_delay": self.get_hedge_delay(task)
+                }
+        return {
+            "available": self.is_available,
+            "circuit_breaker": self.circuit_breaker.get_stats(),
+            "task_profiles": self.task_profiles,
+            "latency": latency,
+            "truncated": self.truncated,
+            "hedging": {
+                "percentile": LLM_HEDGE_PERCENTILE,
+                "hedges_sent": self.hedges_sent,
+                "hedges_won": self.hedges_won
+            }
+        }
+
+    async def aclose(self):
+        """Close pooled connections on shutdown"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+
+_llm_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Return the worker-wide gateway, creating it on first use"""
+    global _llm_gateway
+    if _llm_gateway is None:
+        _llm_gateway = LLMGateway()
+    return _llm_gateway
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+logger = logging.getLogger(__name__)
+
+# Most frequent terms kept in the vocabulary; the term matrix is terms x dimensions float32
+LSA_MAX_TERMS = int(os.getenv("LSA_MAX_TERMS", "20000"))
+
+WORD = re.compile(r"\w+")
+
+
+def content_words(text: str) -> List[str]:
+    """Lowercase words of a text without stop words, with plural endings folded ("days" -> "day")"""
+    words = []
+    for word in WORD.findall(text.lower()):
+        if len(word) < 2 or word in ENGLISH_STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class LSAModel:
+    """Latent semantic analysis fitted on the document chunks.
+
+    Texts are weighted with sublinear TF-IDF over their content words and projected onto the
+    top singular vectors of the corpus term matrix (TruncatedSVD). Words that occur in the
+    same passages get nearby directions, so "sick days" and "sick leave allowance" land close
+    together although they share only one word. Words the corpus never used are ignored.
+    Output rows are zero-padded to the store's dimensions and L2-normalised. The model is
+    saved next to the vector store as lsa-<model_id>.json (terms, idf) and lsa-<model_id>.npy
+    (the terms x components matrix, memory-mapped when loaded).
+    """
+
+    def __init__(self, terms: List[str], idf: np.ndarray, term_vectors: np.ndarray, dimensions: int,
+                 documents: int):
+        self.terms = terms
+        self.vocabulary: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.term_vectors = term_vectors
+        self.dimensions = dimensions
+        self.documents = documents
+        self.model_id = "%08x" % zlib.crc32(
+            "\n".join(terms).encode("utf-8") + np.ascontiguousarray(term_vectors, dtype="<f4").tobytes()
+        )
+
+    @classmethod
+    def fit(cls, texts: List[str], dimensions: int) -> Optional["LSAModel"]:
+        """Fit on chunk texts; None when the corpus is too small to span two dimensions"""
+        frequencies = {}
+        for text in texts:
+            for word in set(content_words(text)):
+                frequencies[word] = frequencies.get(word, 0) + 1
+        terms = sorted(frequencies, key=lambda term: (-frequencies[term], term))[:LSA_MAX_TERMS]
+        terms.sort()
+        if len(texts) < 3 or len(terms) < 3:
+            return None
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        document_frequency = np.array([frequencies[term] for term in terms], dtype=np.float64)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        matrix = cls.weigh(texts, vocabulary, idf)
+        components = min(dimensions, len(texts) - 1, len(terms) - 1)
+        svd = TruncatedSVD(n_components=components, n_iter=7, random_state=0).fit(matrix)
+        term_vectors = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+        return cls(terms, idf, term_vectors, dimensions, len(texts))
+
+    @staticmethod
+    def weigh(texts: List[str], vocabulary: Dict[str, int], idf: np.ndarray) -> sparse.csr_matrix:
+        """L2-normalised sublinear TF-IDF rows over the vocabulary"""
+        indptr, indices, values = [0], [], []
+        for text in texts:
+            counts = {}
+            for word in content_words(text):
+                column = vocabulary.get(word)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            indices.extend(counts)
+            values.extend(counts.values())
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((np.asarray(values, dtype=np.float32), indices, indptr),
+                                   shape=(len(texts), len(vocabulary)), dtype=np.float32)
+        matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimensions) float32 unit rows (all-zero for texts without known words)"""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if texts:
+            vectors[:, :self.term_vectors.shape[1]] = self.weigh(texts, self.vocabulary, self.idf) @ self.term_vectors
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def paths(self, directory: str):
+        return (os.path.join(directory, f"lsa-{self.model_id}.json"),
+                os.path.join(directory, f"lsa-{self.model_id}.npy"))
+
+    def save(self, directory: str):
+        """Write the model files (the matrix first, so a readable header implies a complete model)"""
+        header_path, matrix_path = self.paths(directory)
+        for path, write in ((matrix_path, lambda f: np.save(f, self.term_vectors)),
+                            (header_path, lambda f: f.write(json.dumps({
+                                "model_id": self.model_id, "dimensions": self.dimensions,
+                                "documents": self.documents, "terms": self.terms, "idf": self.idf.tolist()
+                            }).encode("utf-8")))):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str, model_id: str) -> Optional["LSAModel"]:
+        """The saved model with this id, None when its files are missing or do not match"""
+        header_path = os.path.join(directory, f"lsa-{model_id}.json")
+        try:
+            with open(header_path) as f:
+                header = json.load(f)
+            term_vectors = np.load(os.path.join(directory, f"lsa-{model_id}.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        model = cls(header["terms"], np.asarray(header["idf"], dtype=np.float32), term_vectors,
+                    header["dimensions"], header["documents"])
+        if model.model_id != model_id:
+            logger.warning(f"LSA model {header_path} does not match its id, refitting")
+            return None
+        return model
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from fastapi import WebSocket
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from ..models import Employee, LeaveApplication, LeaveStatus, UserRole
+
+logger = logging.getLogger(__name__)
+
+# Roles that see every application waiting for approval
+HR_ROLES = {UserRole.HR_MANAGER, UserRole.HR_ADMIN}
+
+
+class NotificationService:
+    """Pushes approval-queue changes to connected WebSocket clients.
+
+    LeaveApplication inserts and status transitions are picked up from ORM flushes, so
+    every code path that commits an application (chat, REST endpoints) is covered without
+    explicit publish calls. Events are only sent once the transaction commits. Role changes
+    and deactivations of connected employees are picked up the same way, so recipients
+    follow the committed roles and a deactivated employee's sockets are closed.
+    """
+
+    def __init__(self):
+        self.connections: Dict[int, Set[WebSocket]] = {}
+        self.roles: Dict[int, UserRole] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.events_published = 0
+
+    def attach(self, session_factory, loop: asyncio.AbstractEventLoop):
+        """Listen to flushes of sessions made by the factory; events are delivered on the loop"""
+        self.loop = loop
+        if event.contains(session_factory, "after_flush", self.collect_approval_events):
+            return
+        event.listen(session_factory, "after_flush", self.collect_approval_events)
+        event.listen(session_factory, "after_commit", self.publish_pending_events)
+        event.listen(session_factory, "after_rollback", self.discard_pending_events)
+
+    def connect(self, websocket: WebSocket, employee: Employee):
+        self.connections.setdefault(employee.id, set()).add(websocket)
+        self.roles[employee.id] = employee.user_role
+
+    def update_role(self, employee_id: int, role: UserRole):
+        """Route events by a connected employee's current role (e.g. re-read for a chat turn)"""
+        if employee_id in self.connections:
+            self.roles[employee_id] = role
+
+    def disconnect(self, websocket: WebSocket, employee_id: int):
+        sockets = self.connections.get(employee_id)
+        if sockets:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.connections[employee_id]
+                self.roles.pop(employee_id, None)
+
+    def collect_approval_events(self, session: Session, flush_context):
+        """Record new applications and status changes of this flush (ORM after_flush hook)"""
+        pending = session.info.setdefault("approval_events", [])
+
+        for obj in session.new:
+            if isinstance(obj, LeaveApplication):
+                pending.append(self.build_event("application_created", obj, session))
+
+        for obj in session.dirty:
+            if isinstance(obj, LeaveApplication):
+                history = attributes.get_history(obj, "status")
+                if history.has_changes():
+                    previous = history.deleted[0] if history.deleted else None
+                    pending.append(self.build_event("status_changed", obj, session, previous))
+            elif isinstance(obj, Employee) and obj.id in self.connections:
+                if (attributes.get_history(obj, "user_role").has_changes()
+                        or attributes.get_history(obj, "is_active").has_changes()):
+                    session.info.setdefault("access_changes", {})[obj.id] = (obj.user_role, obj.is_active)
+
+    def build_event(self, kind: str, application: LeaveApplication, session: Session,
+                    previous_status: LeaveStatus = None) -> Dict:
+        employee = session.get(Employee, application.employee_id)
+        status = application.status or LeaveStatus.PENDING
+        return {
+            "type": "approval_queue",
+            "event": kind,
+            "application": {
+                "id": application.id,
+                "application_number": application.application_number,
+                "employee_id": application.employee_id,
+                "employee_name": employee.name if employee else None,
+                "leave_type": application.leave_type.value if application.leave_type else None,
+                "start_date": application.start_date.isoformat() if application.start_date else None,
+                "end_date": application.end_date.isoformat() if application.end_date else None,
+                "total_days": float(application.total_days) if application.total_days is not None else None,
+                "status": status.value,
+                "previous_status": previous_status.value if previous_status else None,
+                "manager_id": application.manager_id
+            }
+        }
+
+    def publish_pending_events(self, session: Session):
+        """Hand committed events and access changes to the event loop (ORM after_commit hook)"""
+        events = session.info.pop("approval_events", [])
+        access_changes = session.info.pop("access_changes", {})
+        if self.loop is None or self.loop.is_closed():
+            return
+        for employee_id, (role, is_active) in access_changes.items():
+            asyncio.run_coroutine_threadsafe(self.apply_access_change(employee_id, role, is_active), self.loop)
+        for approval_event in events:
+            asyncio.run_coroutine_threadsafe(self.broadcast(approval_event), self.loop)
+
+    def discard_pending_events(self, session: Session):
+        session.info.pop("approval_events", None)
+        session.info.pop("access_changes", None)
+
+    async def apply_access_change(self, employee_id: int, role: UserRole, is_active: bool):
+        """Follow a committed role change, or close the sockets of a deactivated employee"""
+        if is_active:
+            self.update_role(employee_id, role)
+            return
+        for websocket in list(self.connections.get(employee_id, ())):
+            self.disconnect(websocket, employee_id)
+            try:
+                await websocket.close(code=4401, reason="Employee deactivated")
+            except Exception:
+                pass
+
+    def get_recipients(self, approval_event: Dict) -> List[int]:
+        """Approvers of the application (its manager and HR) plus the applicant for status changes"""
+        application = approval_event["application"]
+        recipients = {
+            employee_id for employee_id, role in self.roles.items()
+            if role in HR_ROLES or employee_id == application["manager_id"]
+        }
+        if approval_event["event"] == "status_changed":
+            recipients.add(application["employee_id"])
+        return [employee_id for employee_id in recipients if employee_id in self.connections]
+
+    async def broadcast(self, approval_event: Dict):
+        for employee_id in self.get_recipients(approval_event):
+            await self.send_to_employee(employee_id, approval_event)
+        self.events_published += 1
+
+    async def send_to_employee(self, employee_id: int, message: Dict):
+        for websocket in list(self.connections.get(employee_id, ())):
+            try:
+                await websocket.send_json(message)
+            except Exception as e:
+                logger.warning(f"Dropping WebSocket for employee {employee_id}: {e}")
+                self.disconnect(websocket, employee_id)
+
+    def get_stats(self) -> Dict:
+        return {
+            "connected_employees": len(self.connections),
+            "open_connections": sum(len(sockets) for sockets in self.connections.values()),
+            "events_published": self.events_published
+        }
@@ -0,0 +1,119 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from ..models import Document, UserRole
+from .auth import AuthService
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key"""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def access_scope(employee) -> Tuple[str, str, str]:
+    """ACL scope of an employee: access role and department decide document access, and
+    together with the job title they are everything the answer prompt knows about the caller"""
+    return (employee.user_role.value, employee.department or "", employee.role or "")
+
+
+def scope_fingerprint(scope: Tuple[str, str, str]) -> str:
+    return hashlib.sha1("|".join(scope).encode("utf-8")).hexdigest()[:16]
+
+
+def scope_can_access(scope: Tuple[str, str, str], document: Document) -> bool:
+    """Apply AuthService.can_access_document to an ACL scope instead of a concrete employee"""
+    user_role, department, _ = scope
+    scoped_employee = SimpleNamespace(user_role=UserRole(user_role), department=department)
+    return AuthService.can_access_document(scoped_employee, document)
+
+
+class ResponseCache:
+    """LRU cache with a TTL for generated HR answers.
+
+    Keys combine the normalized query, the caller's ACL scope fingerprint and the document
+    index version, so answers are only shared between employees who see the same documents.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def build_key(self, query: str, employee, index_version: int) -> Tuple:
+        return (normalize_query(query), scope_fingerprint(access_scope(employee)), index_version)
+
+    def get(self, query: str, employee, index_version: int) -> Optional[Dict]:
+        key = self.build_key(query, employee, index_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["value"])
+
+    def put(self, query: str, employee, index_version: int, value: Dict):
+        if self.max_entries <= 0:
+            return
+        key = self.build_key(query, employee, index_version)
+        with self._lock:
+            self._entries[key] = {
+                "value": dict(value),
+                "scope": access_scope(employee),
+                "stored_at": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_document(self, document: Document) -> int:
+        """Drop answers for every ACL scope that can see the document; returns the number removed"""
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if scope_can_access(entry["scope"], document)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "miss_rate": round(self.misses / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,135 @@
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models import Document
+from .access_filter import AccessFilter, document_access
+
+logger = logging.getLogger(__name__)
+
+# BM25 weight of a title match relative to a match in the chunk text
+SEARCH_TITLE_WEIGHT = float(os.getenv("SEARCH_TITLE_WEIGHT", "3.0"))
+
+# FTS5 clamps the IDF of terms found in most rows to ~0; such matches carry no signal
+MIN_CHUNK_SCORE = 1e-3
+
+FTS_TABLE = "document_search"
+
+FTS_COLUMNS = ["title", "chunk_text", "document_id", "visibility", "department_code"]
+
+
+class SearchIndex:
+    """SQLite FTS5 index over document chunks and titles.
+
+    Each row is one DocumentChunk (the FTS rowid is the chunk id) together with its
+    document's title, so BM25 ranks chunks with a configurable title boost and a search
+    only reads the rows that match the query terms. Rows also carry their document's access
+    codes, so permissions are checked inside the query instead of by listing documents.
+    """
+
+    def __init__(self):
+        self.available = False
+
+    def ensure_schema(self, engine):
+        """Create the FTS5 table; retrieval falls back to scanning documents if FTS5 is missing"""
+        try:
+            with engine.begin() as connection:
+                columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({FTS_TABLE})"))]
+                if columns and columns != FTS_COLUMNS:
+                    # Built by an older version; sync() refills the new table
+                    connection.execute(text(f"DROP TABLE {FTS_TABLE}"))
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "title, chunk_text, document_id UNINDEXED, visibility UNINDEXED, department_code UNINDEXED, "
+                    "tokenize='porter unicode61')"
+                ))
+            self.available = True
+        except Exception as e:
+            logger.warning(f"Full-text search index unavailable, using document scan: {e}")
+            self.available = False
+
+    def index_document(self, db: Session, document: Document):
+        """(Re)index a document's saved chunks; runs in the caller's transaction"""
+        if not self.available:
+            return
+        self.remove_document(db, document.id)
+        visibility, department = document_access(document.visibility, document.department)
+        # Copied inside SQLite, so a large document's chunks are never loaded here
+        db.execute(
+            text(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, chunk_text, document_id, visibility, department_code) "
+                "SELECT id, :title, chunk_text, document_id, :visibility, :department "
+                "FROM document_chunks WHERE document_id = :doc ORDER BY chunk_index"
+            ),
+            {"title": document.title, "doc": document.id, "visibility": visibility, "department": department}
+        )
+
+    def remove_document(self, db: Session, document_id: int):
+        if not self.available:
+            return
+        db.execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM document_chunks WHERE document_id = :doc)"),
+            {"doc": document_id}
+        )
+
+    def sync(self, db: Session) -> Dict:
+        """Index active documents missing from the index and drop rows of inactive ones"""
+        if not self.available:
+            return {"indexed": 0, "removed": 0}
+
+        indexed_ids = {doc_id for (doc_id,) in db.execute(text(f"SELECT DISTINCT document_id FROM {FTS_TABLE}"))}
+        active_ids = {doc_id for (doc_id,) in db.query(Document.id).filter(Document.is_active == True)}
+
+        removed = indexed_ids - active_ids
+        for document_id in removed:
+            db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE document_id = :doc"), {"doc": document_id})
+
+        missing = active_ids - indexed_ids
+        for document in db.query(Document).filter(Document.id.in_(missing)):
+            self.index_document(db, document)
+
+        db.commit()
+        return {"indexed": len(missing), "removed": len(removed)}
+
+    def build_match_query(self, query: str) -> Optional[str]:
+        """FTS5 MATCH expression: any of the query's content words"""
+        terms = []
+        for term in re.findall(r"\w+", query.lower()):
+            if len(term) > 2 and term not in ENGLISH_STOP_WORDS and term not in terms:
+                terms.append(term)
+        if not terms:
+            return None
+        return " OR ".join(f'"{term}"' for term in terms)
+
+    def search_chunks(self, db: Session, query: str, access: AccessFilter, limit: int) -> List[Dict]:
+        """Best matching chunks the caller may read as dicts with chunk_id, document_id and
+        score (negated BM25, higher is better)"""
+        match_query = self.build_match_query(query)
+        if not match_query:
+            return []
+
+        allowed, params = access.sql_condition("visibility", "department_code")
+        rows = db.execute(
+            text(
+                f"SELECT rowid, document_id, bm25({FTS_TABLE}, :title_weight, 1.0) AS rank "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND {allowed} "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            dict(params, title_weight=SEARCH_TITLE_WEIGHT, match=match_query, limit=limit)
+        )
+        return [
+            {"chunk_id": chunk_id, "document_id": document_id, "score": -rank}
+            for chunk_id, document_id, rank in rows
+            if -rank >= MIN_CHUNK_SCORE
+        ]
+
+    def get_stats(self, db: Session) -> Dict:
+        if not self.available:
+            return {"available": False}
+        rows, documents = db.execute(text(f"SELECT COUNT(*), COUNT(DISTINCT document_id) FROM {FTS_TABLE}")).one()
+        return {"available": True, "indexed_chunks": rows, "indexed_documents": documents}
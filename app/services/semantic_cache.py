@@ -0,0 +1,172 @@
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from ..models import Document
+from .lsa_model import content_words
+from .response_cache import access_scope, scope_can_access
+
+
+def answer_evidence(query: str, relevant_docs: List[Dict], with_words: bool = False) -> Hashable:
+    """Key of the sentence an answer to the query rests on: the highlighted sentence of the top
+    passage sharing the most content words with the query, as (document id, sentence text).
+    Queries that retrieved nothing highlightable are keyed by their own content words, and
+    with_words adds them to every key."""
+    words = set(content_words(query))
+    if with_words:
+        return answer_evidence(query, relevant_docs), frozenset(words)
+    if relevant_docs and relevant_docs[0].get('highlights'):
+        passage = relevant_docs[0]
+        sentences = [passage['relevant_content'][highlight['start']:highlight['end']].strip()
+                     for highlight in passage['highlights']]
+        # Highlights are scored on raw tokens; folded content words also match "sick day" to "days"
+        best = max(sentences, key=lambda sentence: len(words.intersection(content_words(sentence))))
+        return passage['document'].id, best
+    return "words", frozenset(words)
+
+
+class SemanticCache:
+    """Answer cache that matches paraphrased queries within one ACL scope.
+
+    Queries are compared as LSA embeddings (the retriever's query vectors, unit length), so
+    "sick leave allowance?" and "how many sick days do I get" are close although they share
+    one word. Each scope keeps its cached query vectors in one matrix, and a lookup is a
+    single matrix-vector product over it. Topic vectors also place sibling questions such as
+    maternity vs paternity leave close together, so an entry is only served when the new
+    query's answer rests on the same evidence: the caller passes a key for the sentence
+    retrieval found for the query (answer_evidence), and both keys must be equal. Queries
+    without any word the model knows (all-zero vectors) match on the evidence key alone,
+    which then also holds their content words.
+
+    Only the current index version is kept; scopes built on an older version (bumped here,
+    by another worker or by a new embedding model) are dropped on the next lookup or store.
+    """
+
+    def __init__(self, threshold: float = 0.75, max_entries_per_scope: int = 500, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries_per_scope = max_entries_per_scope
+        self.ttl_seconds = ttl_seconds
+        # (scope, index_version) -> {"vectors": ndarray, "stored_at": ndarray, "evidence": list, "values": list}
+        self._scopes: Dict[Tuple, Dict] = {}
+        self._index_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evidence_misses = 0
+        self.invalidations = 0
+        self.hit_similarity_total = 0.0
+
+    def drop_old_versions(self, index_version: int):
+        """Free every scope built on an index version other than the current one (lock held)"""
+        if index_version == self._index_version:
+            return
+        self._index_version = index_version
+        stale = [key for key in self._scopes if key[1] != index_version]
+        self.invalidations += sum(len(self._scopes.pop(key)["values"]) for key in stale)
+
+    def best_match(self, entries: Dict, query_vector: np.ndarray, evidence: Hashable) -> Tuple[int, float, float]:
+        """Row and cosine similarity of the closest live entry with the same evidence (-1 and -1.0
+        when there is none), and the similarity of the closest live entry regardless of evidence"""
+        if query_vector.any():
+            similarities = entries["vectors"] @ query_vector
+        else:
+            # Queries without a word the model knows only match each other, by evidence alone
+            similarities = np.where(entries["vectors"].any(axis=1), -1.0, 1.0)
+        expired = time.monotonic() - entries["stored_at"] > self.ttl_seconds
+        similarities[expired] = -1.0
+        closest = float(similarities.max())
+        same_evidence = np.array([key == evidence for key in entries["evidence"]])
+        similarities[~same_evidence] = -1.0
+        row = int(np.argmax(similarities))
+        if similarities[row] < 0:
+            return -1, -1.0, closest
+        return row, float(similarities[row]), closest
+
+    def get(self, query_vector: np.ndarray, evidence: Hashable, employee, index_version: int) -> Optional[Dict]:
+        """Cached answer for the most similar earlier query resting on the same evidence, with
+        its similarity, or None"""
+        if self.max_entries_per_scope <= 0:
+            return None
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        with self._lock:
+            self.drop_old_versions(index_version)
+            entries = self._scopes.get((access_scope(employee), index_version))
+            if entries is None:
+                self.misses += 1
+                return None
+            row, similarity, closest = self.best_match(entries, query_vector, evidence)
+            if similarity < self.threshold:
+                self.misses += 1
+                if closest >= self.threshold and query_vector.any():
+                    # A similar question about another sentence, e.g. a sibling leave type
+                    self.evidence_misses += 1
+                return None
+            self.hits += 1
+            self.hit_similarity_total += similarity
+            return dict(entries["values"][row], similarity=round(similarity, 3))
+
+    def put(self, query_vector: np.ndarray, evidence: Hashable, employee, index_version: int, value: Dict):
+        if self.max_entries_per_scope <= 0:
+            return
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        key = (access_scope(employee), index_version)
+        with self._lock:
+            self.drop_old_versions(index_version)
+            entries = self._scopes.get(key)
+            if entries is None:
+                self._scopes[key] = {
+                    "vectors": query_vector[np.newaxis, :].copy(),
+                    "stored_at": np.array([time.monotonic()]),
+                    "evidence": [evidence],
+                    "values": [dict(value)]
+                }
+                return
+
+            row, similarity, _ = self.best_match(entries, query_vector, evidence)
+            if similarity >= 0.999:
+                # Same query again: refresh the existing row instead of growing the matrix
+                entries["values"][row] = dict(value)
+                entries["stored_at"][row] = time.monotonic()
+                return
+
+            # Expired rows are deleted, then the oldest rows once the scope is full
+            live = np.flatnonzero(time.monotonic() - entries["stored_at"] <= self.ttl_seconds)
+            live = live[max(len(live) + 1 - self.max_entries_per_scope, 0):]
+            entries["vectors"] = np.vstack([entries["vectors"][live], query_vector])
+            entries["stored_at"] = np.append(entries["stored_at"][live], time.monotonic())
+            entries["evidence"] = [entries["evidence"][i] for i in live] + [evidence]
+            entries["values"] = [entries["values"][i] for i in live] + [dict(value)]
+
+    def invalidate_document(self, document: Document) -> int:
+        """Drop every scope that can see the document; returns the number of answers removed"""
+        with self._lock:
+            stale = [key for key in self._scopes if scope_can_access(key[0], document)]
+            removed = sum(len(self._scopes.pop(key)["values"]) for key in stale)
+            self.invalidations += removed
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += sum(len(entries["values"]) for entries in self._scopes.values())
+            self._scopes.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": sum(len(entries["values"]) for entries in self._scopes.values()),
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "max_entries_per_scope": self.max_entries_per_scope,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evidence_misses": self.evidence_misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "miss_rate": round(self.misses / lookups, 3) if lookups else 0.0,
+                "average_hit_similarity": round(self.hit_similarity_total / self.hits, 3) if self.hits else None,
+                "invalidations": self.invalidations
+            }
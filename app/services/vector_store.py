@@ -0,0 +1,396 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Compact once this share of the stored rows belongs to removed chunks
+VECTOR_STORE_COMPACT_RATIO = float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.25"))
+
+# Rows copied at a time while compacting, so compaction does not load the whole matrix
+COMPACT_BLOCK_ROWS = 4096
+
+# Sidecar row layout: chunk id (-1 once removed), document id, visibility code, department code
+ROW_FIELDS = 4
+REMOVED = -1
+CHUNK, DOCUMENT, VISIBILITY, DEPARTMENT = range(ROW_FIELDS)
+
+
+class VectorStore:
+    """Chunk embeddings in one contiguous float32 matrix file, memory-mapped read-only.
+
+    Row i of vectors-<generation>.f32 belongs to row i of the int64 sidecar
+    rows-<generation>.i64, which holds the chunk id, its document id and the document's
+    access codes (see AccessFilter), so searches check permissions without the database.
+    The first base_rows rows of a generation are its immutable snapshot; new vectors are
+    appended after them as the delta segment. Removed chunks are tombstoned in the sidecar.
+    Compaction merges the delta and drops tombstoned rows by writing the next generation,
+    which becomes the new snapshot when meta.json is atomically replaced. Every change to
+    the stored content bumps the version in meta.json, which also names the embedding model
+    the vectors come from.
+    Processes notice appends and new generations from file metadata and remap, so one
+    process can write while every worker searches its own read-only mapping.
+    """
+
+    def __init__(self, directory: str, dimensions: int):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock_path = os.path.join(directory, "store.lock")
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._mapped: Optional[Tuple] = None
+        self.compactions = 0
+
+    def open(self) -> "VectorStore":
+        """Create the store, or start a new empty one if it was written with another layout"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta is None or (meta["dimensions"], meta.get("row_fields")) != (self.dimensions, ROW_FIELDS):
+                if meta is not None:
+                    logger.warning(f"Vector store layout changed ({meta['dimensions']} dimensions, "
+                          f"{meta.get('row_fields', 2)} row fields), starting an empty store")
+                generation = meta["generation"] + 1 if meta else 0
+                open(self._vectors_path(generation), "wb").close()
+                open(self._rows_path(generation), "wb").close()
+                self._write_meta(generation, 0, meta.get("version", 0) + 1 if meta else 0, None)
+                if meta is not None:
+                    self._remove_generation(meta["generation"])
+            else:
+                self._truncate_partial_rows(meta["generation"])
+                if "base_rows" not in meta:
+                    # Written before stores had a delta segment: all stored rows form the snapshot
+                    self._write_meta(meta["generation"], self._row_count(meta["generation"]), 0, meta.get("model"))
+        return self
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"vectors-{generation}.f32")
+
+    def _rows_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"rows-{generation}.i64")
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, generation: int, base_rows: int, version: int, model: Optional[str]):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dimensions": self.dimensions, "row_fields": ROW_FIELDS, "generation": generation,
+                       "base_rows": base_rows, "version": version, "model": model}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def _remove_generation(self, generation: int):
+        # Processes still mapping the old files keep reading them until they remap
+        for path in (self._vectors_path(generation), self._rows_path(generation)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers across threads and, where supported, across processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _row_count(self, generation: int) -> int:
+        """Rows present in both files (a writer may be between the two appends)"""
+        vector_rows = os.path.getsize(self._vectors_path(generation)) // (4 * self.dimensions)
+        sidecar_rows = os.path.getsize(self._rows_path(generation)) // (8 * ROW_FIELDS)
+        return min(vector_rows, sidecar_rows)
+
+    def _truncate_partial_rows(self, generation: int):
+        """Drop rows an interrupted append wrote to only one of the files"""
+        rows = self._row_count(generation)
+        for path, row_bytes in ((self._vectors_path(generation), 4 * self.dimensions),
+                                (self._rows_path(generation), 8 * ROW_FIELDS)):
+            if os.path.getsize(path) != rows * row_bytes:
+                os.truncate(path, rows * row_bytes)
+
+    def version(self) -> int:
+        """Content version, bumped by every append and removal (not by compaction)"""
+        return (self._read_meta() or {}).get("version", 0)
+
+    def bump_version(self):
+        """Mark the indexed content as changed, e.g. when only the full-text index was updated"""
+        with self._write_lock():
+            meta = self._read_meta()
+            self._write_meta(meta["generation"], meta["base_rows"], meta["version"] + 1, meta.get("model"))
+
+    def model_id(self) -> Optional[str]:
+        """Id of the embedding model the stored vectors come from (None for a new store)"""
+        return (self._read_meta() or {}).get("model")
+
+    def set_model(self, model_id: str) -> bool:
+        """Switch to vectors of another embedding model: the store starts an empty generation
+        that has to be filled again. False when it already holds vectors of this model."""
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta.get("model") == model_id:
+                return False
+            generation = meta["generation"] + 1
+            open(self._vectors_path(generation), "wb").close()
+            open(self._rows_path(generation), "wb").close()
+            self._write_meta(generation, 0, meta["version"] + 1, model_id)
+            self._mapped = None
+            self._remove_generation(meta["generation"])
+            return True
+
+    def snapshot(self) -> Tuple[int, int, np.ndarray, np.ndarray]:
+        """Generation, its snapshot row count (base_rows) and read-only (vectors, rows) views of
+        snapshot plus delta, remapped when the store changed"""
+        meta = self._read_meta()
+        if meta is None:
+            return (-1, 0, np.zeros((0, self.dimensions), dtype=np.float32),
+                    np.zeros((0, ROW_FIELDS), dtype=np.int64))
+        generation, base_rows = meta["generation"], meta.get("base_rows", 0)
+        try:
+            rows = self._row_count(generation)
+        except FileNotFoundError:
+            # Another process compacted between reading meta.json and the files
+            return self.snapshot()
+        signature = (generation, rows)
+        mapped = self._mapped
+        if mapped is not None and mapped[0] == signature:
+            return generation, base_rows, mapped[1], mapped[2]
+
+        if rows == 0:
+            vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            sidecar = np.zeros((0, ROW_FIELDS), dtype=np.int64)
+        else:
+            vectors = np.memmap(self._vectors_path(generation), dtype=np.float32, mode="r",
+                                shape=(rows, self.dimensions))
+            sidecar = np.memmap(self._rows_path(generation), dtype=np.int64, mode="r",
+                                shape=(rows, ROW_FIELDS))
+        self._mapped = (signature, vectors, sidecar)
+        return generation, base_rows, vectors, sidecar
+
+    def views(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Read-only (vectors, rows) views of the current generation"""
+        _, _, vectors, sidecar = self.snapshot()
+        return vectors, sidecar
+
+    def chunk_ids(self) -> Set[int]:
+        _, sidecar = self.views()
+        ids = sidecar[:, CHUNK]
+        return set(ids[ids != REMOVED].tolist())
+
+    def append(self, chunk_ids: List[int], document_ids: List[int], access: List[Tuple[int, int]],
+               vectors: np.ndarray):
+        """Add vectors with their chunks' (visibility, department) access codes; chunks that
+        already have a vector get the new one"""
+        if not chunk_ids:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="<f4").reshape(len(chunk_ids), self.dimensions)
+        access = np.asarray(access, dtype="<i8").reshape(len(chunk_ids), 2)
+        sidecar = np.column_stack([chunk_ids, document_ids, access[:, 0], access[:, 1]]).astype("<i8")
+        with self._write_lock():
+            meta = self._read_meta()
+            generation = meta["generation"]
+            self._tombstone(self._rows_path(generation), np.isin(self.views()[1][:, CHUNK], chunk_ids))
+            # Vectors first: readers only use rows that are present in both files
+            with open(self._vectors_path(generation), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._rows_path(generation), "ab") as f:
+                f.write(sidecar.tobytes())
+            self._write_meta(generation, meta["base_rows"], meta["version"] + 1, meta.get("model"))
+
+    def remove_chunks(self, chunk_ids: Iterable[int]) -> int:
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return 0
+        with self._write_lock():
+            return self._remove(np.isin(self.views()[1][:, CHUNK], chunk_ids))
+
+    def remove_document(self, document_id: int) -> int:
+        with self._write_lock():
+            sidecar = self.views()[1]
+            return self._remove((sidecar[:, DOCUMENT] == document_id) & (sidecar[:, CHUNK] != REMOVED))
+
+    def _remove(self, mask: np.ndarray) -> int:
+        """Tombstone rows and bump the version; the rows stay until the next compaction"""
+        meta = self._read_meta()
+        removed = self._tombstone(self._rows_path(meta["generation"]), mask)
+        if removed:
+            self._write_meta(meta["generation"], meta["base_rows"], meta["version"] + 1, meta.get("model"))
+        return removed
+
+    def _tombstone(self, rows_path: str, mask: np.ndarray) -> int:
+        """Mark rows removed in place; shared mappings of other processes see it immediately"""
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return 0
+        writable = np.memmap(rows_path, dtype=np.int64, mode="r+", shape=(len(mask), ROW_FIELDS))
+        writable[rows, CHUNK] = REMOVED
+        writable.flush()
+        del writable
+        return len(rows)
+
+    def needs_compaction(self) -> bool:
+        _, sidecar = self.views()
+        return bool(len(sidecar)) and np.count_nonzero(sidecar[:, CHUNK] == REMOVED) / len(sidecar) >= VECTOR_STORE_COMPACT_RATIO
+
+    def compact(self, generation: Optional[int] = None,
+                prepare: Callable[[int, int, np.ndarray, np.ndarray], None] = None) -> Optional[Dict]:
+        """Rewrite the live rows of snapshot and delta into a new generation and switch to it.
+
+        The new files are written, and prepare(generation, rows, vectors, sidecar) builds
+        structures derived from them, without the write lock, so appends and removals go on
+        meanwhile. The lock is only taken to carry those over (rows appended since become the
+        new generation's delta, rows removed since are tombstoned) and to switch meta.json.
+        None is returned, and nothing changes, when the store is not at the given generation,
+        another compaction is running or the generation changed while this one ran.
+        """
+        with self._compaction_lock() as acquired:
+            if not acquired:
+                return None
+            meta = self._read_meta()
+            if generation is not None and meta["generation"] != generation:
+                return None
+            generation = meta["generation"]
+            vectors, sidecar = self.views()
+            copied_rows = len(sidecar)
+            live = np.flatnonzero(sidecar[:, CHUNK] != REMOVED)
+            new_generation = generation + 1
+            # Private names until the switch: nothing else may see a half-written generation
+            vectors_path = f"{self._vectors_path(new_generation)}.{os.getpid()}.tmp"
+            rows_path = f"{self._rows_path(new_generation)}.{os.getpid()}.tmp"
+            try:
+                self._copy_rows(vectors_path, rows_path, vectors, sidecar, live, "wb")
+                if prepare is not None and len(live):
+                    prepare(new_generation, len(live),
+                            np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(len(live), self.dimensions)),
+                            np.memmap(rows_path, dtype=np.int64, mode="r", shape=(len(live), ROW_FIELDS)))
+
+                with self._write_lock():
+                    meta = self._read_meta()
+                    if meta["generation"] != generation:
+                        return None
+                    vectors, sidecar = self.views()
+                    self._tombstone(rows_path, sidecar[live, CHUNK] == REMOVED)
+                    appended = copied_rows + np.flatnonzero(sidecar[copied_rows:, CHUNK] != REMOVED)
+                    self._copy_rows(vectors_path, rows_path, vectors, sidecar, appended, "ab")
+                    os.replace(vectors_path, self._vectors_path(new_generation))
+                    os.replace(rows_path, self._rows_path(new_generation))
+                    self._write_meta(new_generation, len(live), meta["version"], meta.get("model"))
+                    self._mapped = None
+                    self._remove_generation(generation)
+            finally:
+                for path in (vectors_path, rows_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.compactions += 1
+            return {"rows_before": len(sidecar), "rows_after": len(live) + len(appended),
+                    "generation": new_generation}
+
+    def _copy_rows(self, vectors_path: str, rows_path: str, vectors: np.ndarray, sidecar: np.ndarray,
+                   rows: np.ndarray, mode: str):
+        """Write or append the given rows to a generation's files in blocks, then sync them"""
+        with open(vectors_path, mode) as vector_file, open(rows_path, mode) as row_file:
+            for start in range(0, len(rows), COMPACT_BLOCK_ROWS):
+                block = rows[start:start + COMPACT_BLOCK_ROWS]
+                vector_file.write(np.ascontiguousarray(vectors[block], dtype="<f4").tobytes())
+                row_file.write(np.ascontiguousarray(sidecar[block], dtype="<i8").tobytes())
+            for f in (vector_file, row_file):
+                f.flush()
+                os.fsync(f.fileno())
+
+    @contextmanager
+    def _compaction_lock(self):
+        """Yield whether this caller may compact: one compaction at a time across threads and,
+        where supported, processes; the others skip instead of waiting"""
+        if not self._compacting.acquire(blocking=False):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            with open(os.path.join(self.directory, "compact.lock"), "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self._compacting.release()
+
+    def search(self, query_vector: np.ndarray, access, limit: int, min_score: float = -1.0,
+               candidate_rows: np.ndarray = None, snapshot: Tuple = None) -> List[Dict]:
+        """Most similar live chunks the AccessFilter allows, as dicts with chunk_id, document_id
+        and score (dot product, i.e. cosine for unit vectors).
+
+        Without candidate_rows every row is scored; otherwise only those rows are. Row numbers
+        refer to the given snapshot() result, or to the current one.
+        """
+        _, _, vectors, sidecar = snapshot or self.snapshot()
+        if len(vectors) == 0 or limit <= 0:
+            return []
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if candidate_rows is None:
+            # One pass over the mapped matrix; rows the caller may not read are masked afterwards
+            rows = sidecar
+            scores = vectors @ query_vector
+        else:
+            candidate_rows = candidate_rows[candidate_rows < len(vectors)]
+            rows = sidecar[candidate_rows]
+            scores = vectors[candidate_rows] @ query_vector
+        if len(rows) == 0:
+            return []
+        allowed = (rows[:, CHUNK] != REMOVED) & access.mask(rows[:, VISIBILITY], rows[:, DEPARTMENT])
+        scores = np.where(allowed, scores, -np.inf)
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"chunk_id": int(rows[i, CHUNK]), "document_id": int(rows[i, DOCUMENT]), "score": float(scores[i])}
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+    def get_stats(self) -> Dict:
+        generation, base_rows, vectors, sidecar = self.snapshot()
+        removed = int(np.count_nonzero(sidecar[:, CHUNK] == REMOVED))
+        return {
+            "dimensions": self.dimensions,
+            "generation": generation,
+            "version": self.version(),
+            "rows": len(sidecar),
+            "snapshot_rows": base_rows,
+            "delta_rows": len(sidecar) - base_rows,
+            "live_rows": len(sidecar) - removed,
+            "removed_rows": removed,
+            "matrix_bytes": int(vectors.nbytes),
+            "compactions": self.compactions
+        }
@@ -1,11 +1,91 @@
 import PyPDF2
 import docx
 import io
-from typing import List, Optional
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import re
 
+logger = logging.getLogger(__name__)
+
+# Processes extracting the pages of one large PDF in parallel (1 extracts serially)
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+
+# PDFs with fewer pages are extracted serially; starting the pool costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+
+# Page ranges handed out per worker, so a range of slow pages does not leave the others idle
+PDF_RANGES_PER_WORKER = 4
+
+# Most pages per range, which bounds the text a finished range holds until it is consumed
+PDF_MAX_PAGES_PER_RANGE = 25
+
+# Characters read per step from plain-text files
+TEXT_READ_BLOCK_CHARS = 64 * 1024
+
+# Largest chunk, in approximate tokens (what an LLM prompt pays for)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+
+# Approximate tokens each chunk repeats from the end of the previous one
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "16"))
+
+# Approximate tokens: words in pieces of up to six characters, each other symbol on its own
+TOKEN_PIECES = re.compile(r'\w{1,6}|[^\w\s]')
+WORD_CHARACTER = re.compile(r'\w')
+
+# Chunk sentences end after terminal punctuation followed by whitespace (not inside "1.75") or at a line break
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+(?=\s|$)|\n')
+
+SPECIAL_CHARACTERS = re.compile(r'[^\w\s\.\,\;\:\!\?\-\(\)]')
+SPACE_RUNS = re.compile(r'[^\S\n]+')
+NEWLINE_RUNS = re.compile(r' ?\n\s*')
+SENTENCE_ENDS = re.compile(r'[.!?]+')
+
+
+def _read_page_range(pdf_reader: PyPDF2.PdfReader, start: int, end: int) -> List[str]:
+    """Text of pages [start, end), each followed by a newline"""
+    return [pdf_reader.pages[i].extract_text() + "\n" for i in range(start, end)]
+
+
+# Pool workers keep the memory-mapped PDF they last read, as (key, file, map, reader), so
+# further ranges of the same file skip parsing its cross-reference table and page tree again
+_worker_pdf = None
+
+
+def _worker_reader(source: Union[str, bytes]) -> PyPDF2.PdfReader:
+    global _worker_pdf
+    if not isinstance(source, str):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    stat = os.stat(source)
+    key = (source, stat.st_size, stat.st_mtime_ns)
+    if _worker_pdf is None or _worker_pdf[0] != key:
+        if _worker_pdf is not None:
+            _worker_pdf[2].close()
+            _worker_pdf[1].close()
+        f = open(source, 'rb')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _worker_pdf = (key, f, mapped, PyPDF2.PdfReader(mapped))
+    return _worker_pdf[3]
+
+
+def _extract_page_range(source: Union[str, bytes], start: int, end: int) -> List[str]:
+    """Pool task: read a page range of the PDF at a path (memory-mapped) or in bytes"""
+    return _read_page_range(_worker_reader(source), start, end)
+
+
 class DocumentProcessor:
     
+    def __init__(self, pdf_workers: int = PDF_EXTRACTION_WORKERS, parallel_min_pages: int = PDF_PARALLEL_MIN_PAGES):
+        self.pdf_workers = max(1, pdf_workers)
+        self.parallel_min_pages = parallel_min_pages
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None
+    
     def extract_text_from_file(self, file_content: bytes, filename: str) -> Optional[str]:
         """Extract text from uploaded file based on file type"""
         try:
@@ -25,114 +105,338 @@ class DocumentProcessor:
                     return None
                     
         except Exception as e:
-            print(f"Error extracting text from {filename}: {e}")
+            logger.error(f"Error extracting text from {filename}: {e}")
+            return None
+    
+    def extract_text_from_path(self, path: str, filename: str) -> Optional[str]:
+        """Extract text from a file on disk without loading it as one bytes object"""
+        try:
+            return "".join(self.iter_text_from_path(path, filename))
+        except UnicodeDecodeError:
+            return None
+        except Exception as e:
+            logger.error(f"Error extracting text from {filename}: {e}")
             return None
     
+    def iter_text_from_path(self, path: str, filename: str) -> Iterator[str]:
+        """Cleaned text of a file on disk, a page or paragraph at a time.
+        
+        Joined, the segments equal extract_text_from_path; read one by one, only the current
+        page or paragraph is held. Plain text is passed through in blocks, uncleaned as before.
+        Raises UnicodeDecodeError for files that are not text.
+        """
+        file_extension = filename.lower().split('.')[-1]
+        
+        if file_extension == 'pdf':
+            # PdfReader copies a path's bytes into memory; a memory map is read in place
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from self.clean_segments(self.iter_pdf_pages(mapped, source=path))
+        elif file_extension in ['docx', 'doc']:
+            yield from self.clean_segments(self.iter_docx_paragraphs(path))
+        else:
+            # Plain text, or anything else that decodes as text
+            with open(path, encoding='utf-8') as f:
+                yield from iter(lambda: f.read(TEXT_READ_BLOCK_CHARS), '')
+    
     def extract_text_from_pdf(self, file_content: bytes) -> str:
         """Extract text from PDF file"""
+        return self.read_pdf(io.BytesIO(file_content), source=file_content)
+    
+    def read_pdf(self, pdf_file, source: Union[str, bytes, None] = None) -> str:
+        """Extract text from a seekable binary PDF stream"""
         try:
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return self.clean_text(text)
+            return "".join(self.clean_segments(self.iter_pdf_pages(pdf_file, source)))
             
         except Exception as e:
-            print(f"Error reading PDF: {e}")
+            logger.error(f"Error reading PDF: {e}")
             return ""
     
+    def iter_pdf_pages(self, pdf_file, source: Union[str, bytes, None] = None) -> Iterator[str]:
+        """Raw text of each page of a PDF stream followed by a newline, in page order.
+        
+        Large PDFs are split into page ranges read on a process pool when source (the
+        file's path or bytes, which workers reopen it from) is given, and the pages come out
+        in the same order, so the text is identical to a serial read. If the pool fails, the
+        remaining pages are read serially.
+        """
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        page_count = len(pdf_reader.pages)
+        
+        next_page = 0
+        if source is not None and self.pdf_workers > 1 and page_count >= self.parallel_min_pages:
+            try:
+                for page_text in self.iter_pages_parallel(source, page_count):
+                    yield page_text
+                    next_page += 1
+            except Exception as e:
+                logger.warning(f"Parallel PDF extraction failed, reading pages serially: {e}")
+                self.close()
+        
+        for i in range(next_page, page_count):
+            yield pdf_reader.pages[i].extract_text() + "\n"
+    
+    def iter_pages_parallel(self, source: Union[str, bytes], page_count: int) -> Iterator[str]:
+        """Page texts of a PDF read in contiguous ranges on the pool, in page order"""
+        range_size = max(1, math.ceil(page_count / (self.pdf_workers * PDF_RANGES_PER_WORKER)))
+        range_size = min(range_size, PDF_MAX_PAGES_PER_RANGE)
+        ranges = ((start, min(start + range_size, page_count)) for start in range(0, page_count, range_size))
+        pool = self.get_pdf_pool()
+        
+        # Keep a bounded number of ranges in flight so the text held does not grow with the page count
+        in_flight = [pool.submit(_extract_page_range, source, start, end)
+                     for _, (start, end) in zip(range(self.pdf_workers * 2), ranges)]
+        try:
+            while in_flight:
+                pages = in_flight.pop(0).result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    in_flight.append(pool.submit(_extract_page_range, source, *next_range))
+                yield from pages
+        finally:
+            for future in in_flight:
+                future.cancel()
+    
+    def get_pdf_pool(self) -> ProcessPoolExecutor:
+        """Pool started on first use; spawned rather than forked because the server has threads"""
+        if self._pdf_pool is None:
+            self._pdf_pool = ProcessPoolExecutor(max_workers=self.pdf_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._pdf_pool
+    
+    def close(self):
+        """Stop the PDF extraction pool"""
+        if self._pdf_pool is not None:
+            self._pdf_pool.shutdown()
+            self._pdf_pool = None
+    
     def extract_text_from_docx(self, file_content: bytes) -> str:
         """Extract text from DOCX file"""
+        return self.read_docx(io.BytesIO(file_content))
+    
+    def read_docx(self, doc_file) -> str:
+        """Extract text from a DOCX path or binary stream"""
         try:
-            doc_file = io.BytesIO(file_content)
-            doc = docx.Document(doc_file)
-            
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            
-            return self.clean_text(text)
+            return "".join(self.clean_segments(self.iter_docx_paragraphs(doc_file)))
             
         except Exception as e:
-            print(f"Error reading DOCX: {e}")
+            logger.error(f"Error reading DOCX: {e}")
             return ""
     
+    def iter_docx_paragraphs(self, doc_file) -> Iterator[str]:
+        """Raw text of each paragraph of a DOCX path or binary stream followed by a newline"""
+        for paragraph in docx.Document(doc_file).paragraphs:
+            yield paragraph.text + "\n"
+    
     def clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)]', '', text)
-        
-        # Remove multiple consecutive newlines
-        text = re.sub(r'\n+', '\n', text)
+        return "".join(self.clean_segments([text]))
+    
+    def clean_segments(self, segments: Iterable[str]) -> Iterator[str]:
+        """Clean and normalize text given in consecutive segments, such as pages.
         
-        return text.strip()
+        Special characters are removed, then every whitespace run becomes a single newline if
+        it contains one and a single space otherwise, and the text is stripped. Joined, the
+        output equals clean_text of the joined input: a whitespace run crossing a segment
+        boundary is held back until the next segment with text arrives.
+        """
+        started = False
+        pending = ""  # Whitespace run at the end of the text emitted so far: "", " " or "\n"
+        for segment in segments:
+            # Remove special characters but keep basic punctuation
+            segment = SPECIAL_CHARACTERS.sub('', segment)
+            
+            # Collapse whitespace, keeping line breaks
+            segment = SPACE_RUNS.sub(' ', segment)
+            segment = NEWLINE_RUNS.sub('\n', segment)
+            
+            text = segment.strip()
+            if not text:
+                if segment:
+                    pending = '\n' if '\n' in pending + segment else ' '
+                continue
+            
+            gap = pending + segment[:len(segment) - len(segment.lstrip())]
+            if started and gap:
+                yield '\n' if '\n' in gap else ' '
+            yield text
+            started = True
+            
+            trailing = segment[len(segment.rstrip()):]
+            pending = ('\n' if '\n' in trailing else ' ') if trailing else ""
     
-    def create_document_chunks(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    def create_document_chunks(self, text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                               overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
         """Split document into overlapping chunks for better search"""
+        return [chunk['text'] for chunk in self.create_indexed_chunks(text, max_tokens, overlap_tokens)]
+    
+    def create_indexed_chunks(self, text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                              overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Dict]:
+        """Chunks as dicts with their text, its [start, end) offsets in the document text,
+        the [start, end] offsets of each sentence in the chunk and each sentence's normalized
+        tokens, so snippets never re-split the text"""
         if not text:
             return []
         
-        # Split into sentences first
-        sentences = self.split_into_sentences(text)
+        return list(self.iter_indexed_chunks([text], max_tokens, overlap_tokens))
+    
+    def iter_indexed_chunks(self, segments: Iterable[str], max_tokens: int = CHUNK_MAX_TOKENS,
+                            overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Dict]:
+        """Indexed chunks of text given in consecutive segments, offsets counting from the
+        start of the joined text; each chunk is produced as soon as its last sentence is read.
         
-        chunks = []
-        current_chunk = ""
-        current_size = 0
+        A chunk is a run of whole sentences of at most max_tokens approximate tokens (longer
+        sentences are split at word boundaries). The next chunk starts with the trailing
+        sentences that fit in overlap_tokens, or else the last words of the final sentence.
+        The window only tracks sentence offsets and reuses the overlapping sentences as they
+        are; text is joined once per chunk.
+        """
+        window = deque()  # (start, end, text, tokens); text includes the whitespace before the sentence
+        window_tokens = 0
         
-        for sentence in sentences:
-            sentence_length = len(sentence)
-            
-            # If adding this sentence would exceed chunk size, save current chunk
-            if current_size + sentence_length > chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                
-                # Start new chunk with overlap
-                overlap_text = self.get_overlap_text(current_chunk, overlap)
-                current_chunk = overlap_text + sentence
-                current_size = len(current_chunk)
-            else:
-                current_chunk += " " + sentence
-                current_size += sentence_length + 1
+        for sentence in self.iter_sentence_spans(segments, max_tokens):
+            # If adding this sentence would exceed the token budget, save the current chunk
+            if window and window_tokens + sentence[3] > max_tokens:
+                yield self.index_chunk(window)
+                window, window_tokens = self.overlap_window(window, overlap_tokens)
+                if window_tokens + sentence[3] > max_tokens:
+                    window, window_tokens = deque(), 0
+            window.append(sentence)
+            window_tokens += sentence[3]
         
         # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if window:
+            yield self.index_chunk(window)
+    
+    def iter_sentence_spans(self, segments: Iterable[str], max_tokens: int) -> Iterator[Tuple[int, int, str, int]]:
+        """(start, end, text, tokens) of each sentence of text given in consecutive segments.
         
-        return chunks
+        Sentences end after terminal punctuation or at a line break. start and end are offsets
+        in the joined text, text also holds the whitespace between the previous sentence and
+        this one, so consecutive texts join to the original. Sentences over max_tokens are
+        split. Only the unfinished sentence is carried to the next segment.
+        """
+        pending = []
+        offset = 0  # Offset of the pending text in the joined text
+        lead = ""  # Whitespace-only pieces carried to the next sentence
+        held = False  # Whether pending ends with punctuation that may go on in the next segment
+        for segment in segments:
+            if not held and not SENTENCE_BOUNDARY.search(segment):
+                pending.append(segment)
+                continue
+            text = "".join(pending) + segment
+            consumed = 0
+            held = False
+            for match in SENTENCE_BOUNDARY.finditer(text):
+                if match.end() == len(text) and match.group() != '\n':
+                    held = True
+                    break
+                piece = text[consumed:match.end()]
+                if piece.strip():
+                    yield from self.split_sentence(offset + consumed - len(lead), lead + piece, max_tokens)
+                    lead = ""
+                else:
+                    lead += piece
+                consumed = match.end()
+            pending = [text[consumed:]]
+            offset += consumed
+        
+        piece = "".join(pending)
+        if piece.strip():
+            yield from self.split_sentence(offset - len(lead), lead + piece, max_tokens)
+    
+    def split_sentence(self, offset: int, text: str, max_tokens: int) -> Iterator[Tuple[int, int, str, int]]:
+        """A sentence at offset as (start, end, text, tokens), split into parts of at most
+        max_tokens at word boundaries when it is longer"""
+        starts = [match.start() for match in TOKEN_PIECES.finditer(text)]
+        cuts = [0]  # Index of the first token of each part
+        while len(starts) - cuts[-1] > max_tokens:
+            cut = cuts[-1] + max_tokens
+            # Back up to the start of a word unless a single word fills the whole part
+            word_start = cut
+            while word_start > cuts[-1] and self.inside_word(text, starts[word_start]):
+                word_start -= 1
+            cuts.append(word_start if word_start > cuts[-1] else cut)
+        
+        bounds = [0] + [starts[cut] for cut in cuts[1:]] + [len(text)]
+        for i, (part_start, part_end) in enumerate(zip(bounds, bounds[1:])):
+            part = text[part_start:part_end]
+            tokens = (cuts[i + 1] if i + 1 < len(cuts) else len(starts)) - cuts[i]
+            yield (offset + part_start + len(part) - len(part.lstrip()), offset + part_end, part, tokens)
+    
+    def inside_word(self, text: str, position: int) -> bool:
+        """Whether a word character precedes position, so a cut there would split a word"""
+        return position > 0 and WORD_CHARACTER.match(text, position - 1) is not None
+    
+    def overlap_window(self, window: deque, overlap_tokens: int) -> Tuple[deque, int]:
+        """Trailing sentences of a chunk that fit in overlap_tokens, or else the last words of its
+        final sentence as a fragment, with their token count"""
+        kept = deque()
+        tokens = 0
+        for sentence in reversed(window):
+            if tokens + sentence[3] > overlap_tokens:
+                break
+            kept.appendleft(sentence)
+            tokens += sentence[3]
+        
+        if not kept and overlap_tokens > 0:
+            start, end, text, _ = window[-1]
+            pieces = [match.start() for match in TOKEN_PIECES.finditer(text)]
+            first = max(0, len(pieces) - overlap_tokens)
+            # Start the fragment at a word boundary
+            while first < len(pieces) and self.inside_word(text, pieces[first]):
+                first += 1
+            if first < len(pieces):
+                kept.append((end - len(text) + pieces[first], end, text[pieces[first]:], len(pieces) - first))
+                tokens = len(pieces) - first
+        
+        return kept, tokens
+    
+    def index_chunk(self, window: deque) -> Dict:
+        """Chunk dict for a window of sentences"""
+        start = window[0][0]
+        first_text = window[0][2]
+        text = first_text[len(first_text) - (window[0][1] - start):] + "".join(sentence[2] for sentence in islice(window, 1, None))
+        text = text.rstrip()
+        spans = []
+        for sentence_start, sentence_end, sentence_text, _ in window:
+            trailing = len(sentence_text) - len(sentence_text.rstrip())
+            spans.append([sentence_start - start, min(sentence_end - trailing - start, len(text))])
+        return {
+            'text': text,
+            'start': start,
+            'end': start + len(text),
+            'sentence_spans': spans,
+            'sentence_tokens': [self.normalize_tokens(text[span_start:span_end]) for span_start, span_end in spans]
+        }
+    
+    def normalize_tokens(self, text: str) -> List[str]:
+        """Sorted distinct lowercase words longer than two characters"""
+        return sorted({word for word in re.findall(r'\w+', text.lower()) if len(word) > 2})
     
     def split_into_sentences(self, text: str) -> List[str]:
         """Split text into sentences"""
+        return list(self.iter_sentences([text]))
+    
+    def iter_sentences(self, segments: Iterable[str]) -> Iterator[str]:
+        """Sentences of text given in consecutive segments, as split_into_sentences of the
+        joined text; only the text after the last sentence end is carried to the next segment"""
         # Simple sentence splitting (could be improved with NLTK)
-        sentences = re.split(r'[.!?]+', text)
-        
-        # Clean and filter sentences
-        cleaned_sentences = []
+        pending = []
+        for segment in segments:
+            if not SENTENCE_ENDS.search(segment):
+                pending.append(segment)
+                continue
+            sentences = SENTENCE_ENDS.split("".join(pending) + segment)
+            pending = [sentences.pop()]
+            yield from self.filter_sentences(sentences)
+        yield from self.filter_sentences(["".join(pending)])
+    
+    def filter_sentences(self, sentences: List[str]) -> Iterator[str]:
+        """Strip sentences and drop very short fragments"""
         for sentence in sentences:
             sentence = sentence.strip()
-            if len(sentence) > 10:  # Filter out very short fragments
-                cleaned_sentences.append(sentence)
-        
-        return cleaned_sentences
-    
-    def get_overlap_text(self, text: str, overlap_chars: int) -> str:
-        """Get the last N characters for overlap"""
-        if len(text) <= overlap_chars:
-            return text
-        
-        # Try to break at word boundary
-        overlap_text = text[-overlap_chars:]
-        first_space = overlap_text.find(' ')
-        
-        if first_space > 0:
-            return overlap_text[first_space:].strip()
-        else:
-            return overlap_text.strip()
+            if len(sentence) > 10:
+                yield sentence
     
     def extract_metadata(self, text: str) -> dict:
         """Extract metadata from document text"""
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Largest accepted document upload
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_SIZE_MB", "100")) * 1024 * 1024)
+
+# Allowance for form fields and multipart boundaries when checking a request's Content-Length
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Directory for spooled uploads; they stay there until their ingestion job finishes
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "./uploads")
+
+
+class UploadTooLargeError(Exception):
+    """An upload passed its size limit while it was being spooled"""
+
+
+class UploadFormError(Exception):
+    """The request body is not a multipart form with one file part"""
+
+
+class UploadFormSpooler:
+    """Parses a multipart upload form as its body arrives, streaming the file part to disk.
+
+    The file part is written to a temporary file and hashed chunk by chunk; the small text
+    fields are kept in memory. Nothing else is buffered, so a request is refused at the first
+    body chunk past the limits whether or not it declared a Content-Length (chunked uploads
+    do not), and the file is stored once instead of being spooled by the form parser first.
+    """
+
+    def __init__(self, file_field: str, max_bytes: int, max_field_bytes: int, directory: str):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.max_field_bytes = max_field_bytes
+        self.directory = directory
+
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.path: Optional[str] = None
+        self.size = 0
+        self.field_bytes = 0
+        self.digest = hashlib.sha256()
+        self._file = None
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part_name: Optional[str] = None
+        self._part_data = b""
+        self._in_file = False
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._part_name = None
+        self._part_data = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise UploadFormError('Form part without a "name" in its Content-Disposition')
+        self._part_name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+        if self._part_name != self.file_field or self.path is not None:
+            raise UploadFormError(f'Only one file is accepted, in the "{self.file_field}" field')
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="upload-", suffix=os.path.splitext(self.filename)[1],
+                                         dir=self.directory)
+        self._file = os.fdopen(fd, "wb")
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                raise UploadTooLargeError(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit")
+            self.digest.update(data[start:end])
+            self._file.write(data[start:end])
+            return
+        self.field_bytes += end - start
+        if self.field_bytes > self.max_field_bytes:
+            raise UploadTooLargeError("Form fields exceed their size limit")
+        self._part_data += data[start:end]
+
+    def on_part_end(self):
+        if self._in_file:
+            self._file.close()
+            self._file = None
+        else:
+            self.fields[self._part_name] = self._part_data.decode("utf-8", errors="replace")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Remove the spooled file of a failed upload"""
+        self.close()
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+
+async def spool_upload_form(content_type: str, body: AsyncIterator[bytes], file_field: str = "file",
+                            max_bytes: int = MAX_UPLOAD_BYTES, max_field_bytes: int = UPLOAD_FORM_OVERHEAD_BYTES,
+                            directory: str = UPLOAD_SPOOL_DIR) -> Tuple[Dict[str, str], Dict]:
+    """Spool the file of a multipart form body (e.g. request.stream()) to a temporary file.
+
+    Returns the text fields and {"path", "filename", "size", "sha256"} of the file; the caller
+    removes the file. Raises UploadTooLargeError at the first chunk past max_bytes of file or
+    max_field_bytes of fields, and UploadFormError for bodies without one file in file_field.
+    """
+    media_type, options = parse_options_header(content_type)
+    if media_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadFormError("Expected a multipart/form-data body")
+
+    spooler = UploadFormSpooler(file_field, max_bytes, max_field_bytes, directory)
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": spooler.on_part_begin,
+        "on_part_data": spooler.on_part_data,
+        "on_part_end": spooler.on_part_end,
+        "on_header_field": spooler.on_header_field,
+        "on_header_value": spooler.on_header_value,
+        "on_header_end": spooler.on_header_end,
+        "on_headers_finished": spooler.on_headers_finished
+    })
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+        parser.finalize()
+        spooler.close()
+        if spooler.path is None:
+            raise UploadFormError(f'No file in the "{file_field}" field')
+    except MultipartParseError as e:
+        spooler.discard()
+        raise UploadFormError(f"Malformed multipart body: {e}")
+    except BaseException:
+        spooler.discard()
+        raise
+    return spooler.fields, {"path": spooler.path, "filename": spooler.filename, "size": spooler.size,
+                            "sha256": spooler.digest.hexdigest()}
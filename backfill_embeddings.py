@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+HR AI Assistant - Embedding Backfill
+Embeds stored document chunks that are missing from the vector store
+"""
+
+import argparse
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.database import SessionLocal, create_tables
+from app.services.embedding_service import backfill_embeddings, EMBEDDING_DIMENSIONS, VECTOR_STORE_DIR
+from app.services.vector_store import VectorStore
+
+
+def report_progress(done: int, total: int, elapsed: float):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"  {done}/{total} chunks ({done / total:.0%}) - {rate:.0f} chunks/s", flush=True)
+
+
+def main():
+    """Embed chunks in batches on a process pool"""
+    parser = argparse.ArgumentParser(description="Add vectors for existing chunks to the vector store")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per worker task (default: 256)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--all", action="store_true", help="re-embed every chunk")
+    parser.add_argument("--refit", action="store_true",
+                        help="fit a new LSA model on the current chunks first and re-embed everything with it")
+    parser.add_argument("--compact", action="store_true",
+                        help="merge the new vectors into a snapshot and drop removed ones afterwards "
+                             "(otherwise a running server merges them in the background)")
+    args = parser.parse_args()
+
+    # Bring databases created by older versions up to the current schema
+    create_tables()
+
+    print("=" * 50)
+    print("🧮 Backfilling chunk embeddings...")
+    print("=" * 50)
+
+    # A store with other dimensions is replaced by an empty one and refilled here
+    store = VectorStore(VECTOR_STORE_DIR, EMBEDDING_DIMENSIONS).open()
+    result = backfill_embeddings(
+        SessionLocal,
+        store,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        reembed=args.all,
+        refit=args.refit,
+        progress=report_progress
+    )
+
+    if result['refitted']:
+        print("🧠 Fitted a new LSA model, the vector store was refilled")
+    print(f"✅ Embedded {result['embedded']} chunks in {result['batches']} batches ({result['seconds']}s)")
+
+    if args.compact:
+        compacted = store.compact()
+        print(f"🗜️ Compacted vector store: {compacted['rows_before']} -> {compacted['rows_after']} rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+HR AI Assistant - ANN Benchmark
+Reports recall@k and query latency of the IVF index against exact search
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.models import DocumentVisibility, UserRole
+from app.services.access_filter import AccessFilter, document_access
+from app.services.ann_index import IVFIndex
+from app.services.embedding_service import EMBEDDING_DIMENSIONS, VECTOR_STORE_DIR
+from app.services.vector_store import VectorStore
+
+
+def synthetic_corpus(rows: int, dimensions: int, topics: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around random topic directions, like chunks of many policies"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, rows)] + 0.9 * rng.standard_normal((rows, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def time_queries(search, queries: np.ndarray, k: int):
+    started = time.perf_counter()
+    results = [[hit["chunk_id"] for hit in search(query, k)] for query in queries]
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    """Build or open a vector store, train the index and compare it with exact search"""
+    parser = argparse.ArgumentParser(description="Measure IVF recall@k against exact search")
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic vectors (default: 100000)")
+    parser.add_argument("--topics", type=int, default=500, help="synthetic topic clusters (default: 500)")
+    parser.add_argument("--queries", type=int, default=200, help="queries to run (default: 200)")
+    parser.add_argument("--k", type=int, default=10, help="neighbours per query (default: 10)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="nprobe values to test")
+    parser.add_argument("--nlist", type=int, default=0, help="k-means lists (default: about sqrt(rows))")
+    parser.add_argument("--store", action="store_true",
+                        help=f"use a copy of the existing store in {VECTOR_STORE_DIR} (the store itself is not modified)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("📐 ANN benchmark: IVF vs exact search")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.store:
+            # Train on a copy so the benchmark's lists never replace the live store's ivf-*.idx
+            copy = os.path.join(directory, "store")
+            shutil.copytree(VECTOR_STORE_DIR, copy, ignore=shutil.ignore_patterns("ivf-*.idx", "*.tmp"))
+            store = VectorStore(copy, EMBEDDING_DIMENSIONS).open()
+        else:
+            store = VectorStore(directory, EMBEDDING_DIMENSIONS).open()
+            vectors = synthetic_corpus(args.rows, EMBEDDING_DIMENSIONS, args.topics)
+            ids = list(range(len(vectors)))
+            store.append(ids, ids, [document_access(DocumentVisibility.PUBLIC, None)] * len(ids), vectors)
+            # The index covers snapshot rows; merge the appended delta into one
+            store.compact()
+
+        stored, _ = store.views()
+        # An admin may read every row, so recall is measured over the whole store
+        access = AccessFilter(SimpleNamespace(user_role=UserRole.HR_ADMIN, department=None))
+        rng = np.random.default_rng(1)
+        queries = np.asarray(stored[rng.integers(0, len(stored), args.queries)])
+        queries += 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(EMBEDDING_DIMENSIONS)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        index = IVFIndex(store, nlist=args.nlist, min_rows=0)
+        started = time.perf_counter()
+        index.refresh()
+        print(f"Rows: {len(stored)}, lists: {index.get_stats()['nlist']}, training + assignment: {time.perf_counter() - started:.2f}s")
+
+        exact, exact_ms = time_queries(lambda q, k: store.search(q, access, k), queries, args.k)
+        print(f"exact        {exact_ms:8.2f} ms/query")
+
+        for nprobe in args.nprobe:
+            approximate, ann_ms = time_queries(
+                lambda q, k: index.search(q, access, k, nprobe=nprobe), queries, args.k
+            )
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact) if e])
+            print(f"nprobe={nprobe:<5} {ann_ms:8.2f} ms/query  recall@{args.k}={recall:.3f}  speedup={exact_ms / ann_ms:5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+HR AI Assistant - PDF Extraction Benchmark
+Compares serial and parallel per-page PDF text extraction on a synthetic document
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.utils.document_processor import DocumentProcessor
+
+
+def synthetic_pdf(pages: int, lines_per_page: int) -> bytes:
+    """An uncompressed PDF with a page of numbered policy text per page"""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+    kids = []
+    for page in range(pages):
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        lines = [f"Section {page + 1}.{line + 1}: Employees accrue leave monthly and may carry over unused days."
+                 for line in range(lines_per_page)]
+        body = b"BT /F1 10 Tf 50 760 Td 13 TL " + b" ".join(b"(" + line.encode() + b") '" for line in lines) + b" ET"
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(body), body)
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    out += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in range(1, size))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+def time_extraction(processor: DocumentProcessor, path: str, repeat: int):
+    """Best of repeat runs, so pool start-up only counts once"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = processor.extract_text_from_path(path, "benchmark.pdf")
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return text, best
+
+
+def main():
+    """Extract a synthetic PDF serially and with growing worker counts"""
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Measure parallel PDF extraction against the serial path")
+    parser.add_argument("--pages", type=int, default=500, help="synthetic pages (default: 500)")
+    parser.add_argument("--lines", type=int, default=40, help="text lines per page (default: 40)")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))),
+                        help="worker counts to test (default: powers of two up to the CPU count)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per setting, best is reported (default: 3)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("📄 PDF extraction benchmark: serial vs process pool")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.pdf")
+        with open(path, "wb") as f:
+            f.write(synthetic_pdf(args.pages, args.lines))
+        print(f"Pages: {args.pages}, file size: {os.path.getsize(path) / 1024:.0f} KB, CPU cores: {cores}")
+
+        serial_text, serial_seconds = time_extraction(DocumentProcessor(pdf_workers=1), path, args.repeat)
+        print(f"serial       {serial_seconds:8.2f} s  ({len(serial_text)} characters)")
+
+        for workers in args.workers:
+            if workers <= 1:
+                continue
+            processor = DocumentProcessor(pdf_workers=workers, parallel_min_pages=0)
+            try:
+                # Start every worker first so the timings compare extraction only
+                list(processor.get_pdf_pool().map(time.sleep, [0.2] * workers))
+                text, seconds = time_extraction(processor, path, args.repeat)
+            finally:
+                processor.close()
+            identical = "identical" if text == serial_text else "DIFFERS from serial"
+            print(f"workers={workers:<4} {seconds:8.2f} s  speedup={serial_seconds / seconds:5.2f}x  output {identical}")
+
+
+if __name__ == "__main__":
+    main()
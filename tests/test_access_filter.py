@@ -0,0 +1,44 @@
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.models import DocumentVisibility, UserRole
+from app.services.access_filter import AccessFilter, document_access
+from app.services.auth import AuthService
+
+DEPARTMENTS = ["Engineering", "Sales", None]
+
+DOCUMENTS = [
+    SimpleNamespace(visibility=visibility, department=department)
+    for visibility in DocumentVisibility for department in DEPARTMENTS
+]
+
+
+def access_columns():
+    codes = np.array([document_access(doc.visibility, doc.department) for doc in DOCUMENTS], dtype=np.int64)
+    return codes[:, 0], codes[:, 1]
+
+
+@pytest.mark.parametrize("user_role", list(UserRole))
+@pytest.mark.parametrize("department", DEPARTMENTS)
+def test_mask_matches_can_access_document(user_role, department):
+    employee = SimpleNamespace(user_role=user_role, department=department)
+    visibility, department_codes = access_columns()
+    mask = AccessFilter(employee).mask(visibility, department_codes)
+    assert mask.tolist() == [AuthService.can_access_document(employee, doc) for doc in DOCUMENTS]
+
+
+@pytest.mark.parametrize("user_role", list(UserRole))
+@pytest.mark.parametrize("department", DEPARTMENTS)
+def test_sql_condition_matches_mask(user_role, department):
+    access = AccessFilter(SimpleNamespace(user_role=user_role, department=department))
+    visibility, department_codes = access_columns()
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE chunks (id INTEGER, visibility INTEGER, department INTEGER)")
+    connection.executemany("INSERT INTO chunks VALUES (?, ?, ?)",
+                           [(i, int(v), int(d)) for i, (v, d) in enumerate(zip(visibility, department_codes))])
+    condition, parameters = access.sql_condition("visibility", "department")
+    rows = {row[0] for row in connection.execute(f"SELECT id FROM chunks WHERE {condition}", parameters)}
+    assert rows == set(np.flatnonzero(access.mask(visibility, department_codes)).tolist())
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex
+from app.services.vector_store import VectorStore
+
+DIMENSIONS = 16
+ROWS = 600
+
+
+class AllowAll:
+    def mask(self, visibility, department):
+        return np.ones(len(visibility), dtype=bool)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VectorStore(str(tmp_path), DIMENSIONS).open()
+    store.set_model("test")
+    vectors = np.random.default_rng(0).standard_normal((ROWS, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store.append(list(range(ROWS)), [chunk_id // 10 for chunk_id in range(ROWS)], [(0, 0)] * ROWS, vectors)
+    # Merge the delta into a snapshot and save its lists, as the index manager does
+    store.compact(prepare=IVFIndex(store, nlist=8, min_rows=100).prepare_generation)
+    return store
+
+
+def test_worker_loads_saved_lists_without_training(store):
+    index = IVFIndex(store, nprobe=8, nlist=8, min_rows=100)
+    assert index.refresh()
+    assert (index.snapshot_loads, index.trainings) == (1, 0)
+    query = store.views()[0][42]
+    # Probing every list scans all rows, so the result is the exact one
+    assert index.search(query, AllowAll(), 5, 0.0) == store.search(query, AllowAll(), 5, 0.0)
+    assert index.get_stats()["indexed_rows"] == ROWS
+
+
+def test_corrupt_snapshot_is_rebuilt(store):
+    index = IVFIndex(store, nlist=8, min_rows=100)
+    path = index.snapshot_path(store.snapshot()[0])
+    with open(path, "r+b") as f:
+        f.seek(-8, 2)
+        f.write(b"\xff" * 8)
+    assert index.refresh()
+    assert (index.snapshot_loads, index.trainings) == (0, 1)
+    # The rebuilt lists were saved again and load cleanly
+    reloaded = IVFIndex(store, nlist=8, min_rows=100)
+    assert reloaded.refresh()
+    assert (reloaded.snapshot_loads, reloaded.trainings) == (1, 0)
+
+
+def test_snapshot_of_another_embedding_model_is_not_loaded(store):
+    index = IVFIndex(store, nlist=8, min_rows=100)
+    generation = store.snapshot()[0]
+    _, _, _, sidecar = store.snapshot()
+    assert index.load(generation, ROWS, sidecar) is not None
+    # Same generation and rows, different model recorded in meta.json
+    meta = store._read_meta()
+    store._write_meta(meta["generation"], meta["base_rows"], meta["version"], "other")
+    assert index.load(generation, ROWS, sidecar) is None
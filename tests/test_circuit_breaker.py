@@ -0,0 +1,71 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("groq", failure_threshold=3, recovery_timeout=30.0)
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures_only(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_success()
+    trip(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.get_stats()["rejected_calls"] == 1
+    assert breaker.trip_count == 1
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_for_another_recovery_timeout(breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.get_stats()["retry_in_seconds"] == 30.0
+    clock.now += 29.0
+    assert not breaker.allow_request()
+
+
+def test_cancelled_probe_frees_its_slot(breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow_request()
+    breaker.record_cancelled()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
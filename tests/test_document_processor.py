@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from app.utils.document_processor import TOKEN_PIECES, DocumentProcessor
+
+POLICY_TEXT = (
+    "Employees accrue 1.5 days of annual leave per month. Unused days carry over until March!\n"
+    "Sick leave requires a certificate after 3 consecutive days. Is remote work allowed? "
+    "Yes, up to two days a week with manager approval.\n\n"
+    "Reimbursements are paid within 30 days of an approved claim. "
+    + "Travel expenses include flights, hotels and meals for business trips " * 12
+    + "\nThe relocation allowance covers moving costs. Questions go to hr@company.com."
+)
+
+
+@pytest.fixture
+def processor():
+    return DocumentProcessor(pdf_workers=1)
+
+
+def test_chunk_offsets_point_into_the_text(processor):
+    chunks = processor.create_indexed_chunks(POLICY_TEXT, max_tokens=32, overlap_tokens=8)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert POLICY_TEXT[chunk['start']:chunk['end']] == chunk['text']
+        for span_start, span_end in chunk['sentence_spans']:
+            assert 0 <= span_start < span_end <= len(chunk['text'])
+
+
+def test_chunks_stay_within_the_token_budget(processor):
+    for max_tokens, overlap_tokens in [(8, 2), (32, 8), (128, 16)]:
+        chunks = processor.create_indexed_chunks(POLICY_TEXT, max_tokens, overlap_tokens)
+        assert chunks[0]['start'] == 0
+        assert chunks[-1]['end'] == len(POLICY_TEXT)
+        for chunk in chunks:
+            assert len(TOKEN_PIECES.findall(chunk['text'])) <= max_tokens
+
+
+def test_chunks_cover_the_text_in_order(processor):
+    chunks = processor.create_indexed_chunks(POLICY_TEXT, max_tokens=32, overlap_tokens=8)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous['start'] < chunk['start']
+        # Chunks overlap or are separated by whitespace only
+        assert not POLICY_TEXT[previous['end']:chunk['start']].strip()
+
+
+def test_streamed_chunks_equal_whole_text_chunks(processor):
+    expected = processor.create_indexed_chunks(POLICY_TEXT, max_tokens=24, overlap_tokens=6)
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(POLICY_TEXT)), rng.randint(1, 12)))
+        segments = [POLICY_TEXT[start:end] for start, end in zip([0] + cuts, cuts + [len(POLICY_TEXT)])]
+        assert list(processor.iter_indexed_chunks(segments, max_tokens=24, overlap_tokens=6)) == expected
+
+
+def test_cleaned_segments_equal_cleaned_text(processor):
+    raw = "  Leave   policy™ \n\n  applies\tto all staff.  \n Page 2 text  "
+    expected = processor.clean_text(raw)
+    rng = random.Random(1)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(raw)), rng.randint(1, 6)))
+        segments = [raw[start:end] for start, end in zip([0] + cuts, cuts + [len(raw)])]
+        assert "".join(processor.clean_segments(segments)) == expected
+
+
+def test_parallel_pdf_extraction_equals_serial(tmp_path):
+    from benchmark_pdf import synthetic_pdf
+
+    # Enough pages for several ranges per worker, read concurrently and joined in page order
+    path = tmp_path / "handbook.pdf"
+    path.write_bytes(synthetic_pdf(pages=60, lines_per_page=5))
+    serial = DocumentProcessor(pdf_workers=1).extract_text_from_path(str(path), "handbook.pdf")
+    parallel = DocumentProcessor(pdf_workers=2, parallel_min_pages=10)
+    try:
+        assert "Section 60.5" in serial
+        assert parallel.extract_text_from_path(str(path), "handbook.pdf") == serial
+        assert parallel.extract_text_from_file(path.read_bytes(), "handbook.pdf") == serial
+        # The pool really read the pages instead of the serial fallback
+        assert parallel._pdf_pool is not None
+    finally:
+        parallel.close()
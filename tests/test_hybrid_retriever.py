@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.hybrid_retriever import RRF_K, HybridRetriever
+
+
+def hit(chunk_id, score, document_id=1):
+    return {"chunk_id": chunk_id, "document_id": document_id, "score": score}
+
+
+def retriever(lexical_hits=(), vector_search=None):
+    search_index = SimpleNamespace(available=True, search_chunks=lambda db, query, access, limit: list(lexical_hits))
+    embedding_service = SimpleNamespace(search_chunks=vector_search or (lambda query, access, limit: []))
+    return HybridRetriever(search_index, embedding_service)
+
+
+def test_fused_score_sums_reciprocal_ranks():
+    fused = retriever().fuse({"lexical": [hit(1, 9.0), hit(2, 4.0)], "vector": [hit(2, 0.8)]}, limit=5)
+    scores = {result["chunk_id"]: result["score"] for result in fused}
+    assert scores[1] == pytest.approx(1 / (RRF_K + 1))
+    assert scores[2] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+
+
+def test_chunk_found_by_both_sources_ranks_first():
+    fused = retriever().fuse({
+        "lexical": [hit(1, 9.0), hit(2, 4.0), hit(3, 1.0)],
+        "vector": [hit(4, 0.9), hit(2, 0.7)]
+    }, limit=3)
+    assert [result["chunk_id"] for result in fused] == [2, 1, 4]
+    assert fused[0]["sources"] == {"lexical": {"rank": 2, "score": 4.0}, "vector": {"rank": 2, "score": 0.7}}
+    assert fused[1]["sources"] == {"lexical": {"rank": 1, "score": 9.0}}
+
+
+def test_fuse_keeps_document_ids_and_handles_empty_rankings():
+    assert retriever().fuse({"lexical": [], "vector": []}, limit=3) == []
+    fused = retriever().fuse({"vector": [hit(7, 0.5, document_id=3)]}, limit=3)
+    assert [(result["chunk_id"], result["document_id"]) for result in fused] == [(7, 3)]
+
+
+def test_failed_vector_search_falls_back_to_lexical_results():
+    def fail(query, access, limit):
+        raise RuntimeError("vector store unavailable")
+
+    results = retriever([hit(1, 3.0), hit(2, 1.0)], fail).search(None, "sick leave", access=None, limit=2)
+    assert [result["chunk_id"] for result in results] == [1, 2]
+    assert all(set(result["sources"]) == {"lexical"} for result in results)
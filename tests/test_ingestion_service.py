@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, Document, DocumentChunk, DocumentVisibility, IngestionJob, IngestionStatus
+from app.services import ingestion_service
+from app.services.ingestion_service import INGESTION_MAX_ATTEMPTS, IngestionService
+from app.utils.document_processor import DocumentProcessor
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def ai_service():
+    index_manager = SimpleNamespace(add_document=lambda db, document: None,
+                                    embed_chunks=lambda chunks: None,
+                                    document_added=lambda document, vector_batches: None)
+    return SimpleNamespace(index_manager=index_manager, on_document_added=lambda document: None)
+
+
+@pytest.fixture
+def service(session_factory, ai_service):
+    service = IngestionService(ai_service, DocumentProcessor(pdf_workers=1))
+    # Jobs are run by the tests, not by the worker thread started by attach
+    service.session_factory = session_factory
+    return service
+
+
+POLICY_TEXT = "Employees accrue leave monthly. Unused days carry over until March."
+
+
+def queue_job(session_factory, tmp_path, text: str = POLICY_TEXT, **fields) -> int:
+    path = tmp_path / "policy.txt"
+    path.write_text(text)
+    db = session_factory()
+    job = IngestionJob(status=IngestionStatus.QUEUED, file_path=str(path), filename="policy.txt",
+                       title="Leave", document_type="policy", visibility=DocumentVisibility.PUBLIC, **fields)
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def load_job(session_factory, job_id: int):
+    db = session_factory()
+    job = db.get(IngestionJob, job_id)
+    documents = db.query(Document).count()
+    chunks = db.query(DocumentChunk).count()
+    db.close()
+    return job, documents, chunks
+
+
+def test_failure_after_commit_does_not_duplicate_the_document(service, ai_service, session_factory, tmp_path):
+    def crash(document):
+        raise RuntimeError("worker crashed after the commit")
+    ai_service.on_document_added = crash
+
+    job_id = queue_job(session_factory, tmp_path)
+    assert service.claim_next_job() == job_id
+    service.process(job_id)
+    job, documents, chunks = load_job(session_factory, job_id)
+    assert job.status == IngestionStatus.DONE
+    assert job.document_id is not None
+    assert (documents, chunks) == (1, 1)
+
+    # A retry of the same job must not insert the document again
+    service.process(job_id)
+    assert load_job(session_factory, job_id)[1:] == (1, 1)
+
+
+def test_chunks_stream_in_batches_and_vectors_follow_the_commit(service, ai_service, session_factory, tmp_path,
+                                                               monkeypatch):
+    monkeypatch.setattr(ingestion_service, "INGESTION_BATCH_CHUNKS", 2)
+    chunker = service.doc_processor.iter_indexed_chunks
+    monkeypatch.setattr(service.doc_processor, "iter_indexed_chunks",
+                        lambda segments: chunker(segments, max_tokens=8, overlap_tokens=2))
+    batches, added = [], []
+
+    def embed_chunks(chunks):
+        # Every batch is saved (has ids) but not yet visible as an active document
+        assert all(chunk.id is not None for chunk in chunks)
+        batches.append([chunk.id for chunk in chunks])
+        return "model", np.array([[chunk.id, 1.0] for chunk in chunks], dtype=np.float32)
+
+    def document_added(document, vector_batches):
+        added.extend((model_id, chunk_ids, vectors.tolist()) for model_id, chunk_ids, vectors in vector_batches)
+    ai_service.index_manager.embed_chunks = embed_chunks
+    ai_service.index_manager.document_added = document_added
+
+    job_id = queue_job(session_factory, tmp_path, text=POLICY_TEXT * 3)
+    text = "".join(service.doc_processor.iter_text_from_path(str(tmp_path / "policy.txt"), "policy.txt"))
+    assert service.claim_next_job() == job_id
+    service.process(job_id)
+
+    db = session_factory()
+    document = db.query(Document).one()
+    chunks = db.query(DocumentChunk).order_by(DocumentChunk.id).all()
+    assert document.is_active and document.content == text
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+    assert db.get(IngestionJob, job_id).chunks_created == len(chunks) > 2
+    db.close()
+    assert all(len(batch) <= 2 for batch in batches)
+    assert [chunk_id for _, chunk_ids, _ in added for chunk_id in chunk_ids] == [chunk.id for chunk in chunks]
+    assert all(model_id == "model" and [row[0] for row in vectors] == chunk_ids
+               for model_id, chunk_ids, vectors in added)
+
+
+def test_failure_while_streaming_leaves_no_document(service, session_factory, tmp_path, monkeypatch):
+    def pages(path, filename):
+        yield POLICY_TEXT
+        raise ValueError("corrupt page")
+    monkeypatch.setattr(service.doc_processor, "iter_text_from_path", pages)
+
+    job_id = queue_job(session_factory, tmp_path)
+    assert service.claim_next_job() == job_id
+    service.process(job_id)
+    job, documents, chunks = load_job(session_factory, job_id)
+    assert job.status == IngestionStatus.FAILED
+    assert job.document_id is None
+    assert (documents, chunks) == (0, 0)
+
+
+def test_stale_jobs_are_requeued_until_out_of_attempts(service, session_factory, tmp_path):
+    silent = datetime.utcnow() - timedelta(hours=1)
+    retried = queue_job(session_factory, tmp_path, attempts=1, started_at=silent, heartbeat_at=silent)
+    exhausted = queue_job(session_factory, tmp_path, attempts=INGESTION_MAX_ATTEMPTS,
+                          started_at=silent, heartbeat_at=silent)
+    # Started long ago but still sending heartbeats
+    running = queue_job(session_factory, tmp_path, attempts=1, started_at=silent, heartbeat_at=datetime.utcnow())
+    db = session_factory()
+    db.query(IngestionJob).update({IngestionJob.status: IngestionStatus.CHUNKING})
+    db.commit()
+    db.close()
+
+    assert service.requeue_stale_jobs() == 1
+    assert load_job(session_factory, retried)[0].status == IngestionStatus.QUEUED
+    assert load_job(session_factory, exhausted)[0].status == IngestionStatus.FAILED
+    assert load_job(session_factory, running)[0].status == IngestionStatus.CHUNKING
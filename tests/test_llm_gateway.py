@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import llm_gateway
+from app.services.llm_gateway import LLM_MAX_RETRIES, TASK_INTENT, LLMGateway, LLMTruncatedError
+
+
+class FakeCompletions:
+    """Chat completions API that plays back scripted outcomes, one per request (the last repeats)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def create(self, messages, **params):
+        self.calls.append(params)
+        return self.settle(self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0])
+
+    @staticmethod
+    def settle(outcome):
+        if isinstance(outcome, BaseException):
+            raise outcome
+        content, finish_reason = outcome if isinstance(outcome, tuple) else (outcome, "stop")
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)])
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_RETRY_BASE_DELAY", 0.0)
+
+
+def gateway_with(*outcomes):
+    gateway = LLMGateway()
+    completions = FakeCompletions(*outcomes)
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return gateway, completions
+
+
+def complete(gateway, **kwargs):
+    return asyncio.run(gateway.complete(TASK_INTENT, [{"role": "user", "content": "hi"}], **kwargs))
+
+
+def test_transient_failures_are_retried():
+    gateway, completions = gateway_with(asyncio.TimeoutError(), asyncio.TimeoutError(), "answer")
+    assert complete(gateway) == "answer"
+    assert len(completions.calls) == 3
+    assert gateway.circuit_breaker.get_stats()["state"] == "closed"
+
+
+def test_retries_give_up_with_the_last_error():
+    gateway, completions = gateway_with(asyncio.TimeoutError())
+    with pytest.raises(asyncio.TimeoutError):
+        complete(gateway)
+    assert len(completions.calls) == 1 + LLM_MAX_RETRIES
+
+
+def test_client_errors_are_not_retried():
+    gateway, completions = gateway_with(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        complete(gateway)
+    assert len(completions.calls) == 1
+
+
+def test_task_profile_and_overrides_reach_the_provider():
+    gateway, completions = gateway_with("{}")
+    complete(gateway, max_tokens=999, response_format={"type": "json_object"})
+    params = completions.calls[0]
+    assert params["model"] == gateway.get_task_profile(TASK_INTENT)["model"]
+    assert params["max_tokens"] == 999
+    assert params["response_format"] == {"type": "json_object"}
+
+
+def test_truncated_answers_are_counted_and_refused_when_required():
+    gateway, _ = gateway_with(('{"route": "leave_bal', "length"))
+    assert complete(gateway) == '{"route": "leave_bal'
+    with pytest.raises(LLMTruncatedError):
+        complete(gateway, require_complete=True)
+    assert gateway.get_stats()["truncated"][TASK_INTENT] == 2
+
+
+class TimedCompletions(FakeCompletions):
+    """Settles the n-th request started with outcomes[n] after delays[n] seconds"""
+
+    def __init__(self, delays, *outcomes):
+        super().__init__(*outcomes)
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = 0
+
+    async def create(self, messages, **params):
+        n = self.started
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delays[n])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        self.calls.append(params)
+        return self.settle(self.outcomes[n])
+
+
+def hedged_gateway(completions, recent_latency: float):
+    gateway = LLMGateway()
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    for _ in range(llm_gateway.LLM_HEDGE_MIN_SAMPLES):
+        gateway.record_latency(TASK_INTENT, recent_latency)
+    return gateway
+
+
+def complete_hedged(gateway):
+    return asyncio.run(gateway.complete_hedged(TASK_INTENT, [{"role": "user", "content": "hi"}]))
+
+
+def test_slow_request_is_hedged_and_the_loser_cancelled():
+    completions = TimedCompletions([5.0, 0.0], "slow answer", "answer")
+    gateway = hedged_gateway(completions, recent_latency=0.01)
+    assert complete_hedged(gateway) == ("answer", True)
+    assert completions.started == 2
+    assert completions.cancelled == 1
+    assert (gateway.hedges_sent, gateway.hedges_won) == (1, 1)
+
+
+def test_fast_request_is_not_hedged():
+    completions = TimedCompletions([0.0], "answer")
+    gateway = hedged_gateway(completions, recent_latency=1.0)
+    assert complete_hedged(gateway) == ("answer", False)
+    assert completions.started == 1
+    assert gateway.hedges_sent == 0
+
+
+def test_no_hedge_before_enough_latency_samples():
+    gateway, completions = gateway_with("answer")
+    gateway.record_latency(TASK_INTENT, 0.001)
+    assert gateway.get_hedge_delay(TASK_INTENT) is None
+    assert complete_hedged(gateway) == ("answer", False)
+    assert gateway.hedges_sent == 0
+
+
+def test_hedge_answers_after_the_primary_failed():
+    completions = TimedCompletions([0.05, 0.1], ValueError("bad request"), "answer")
+    gateway = hedged_gateway(completions, recent_latency=0.01)
+    assert complete_hedged(gateway) == ("answer", True)
+
+
+def test_error_is_raised_once_every_request_failed():
+    completions = TimedCompletions([0.05, 0.0], ValueError("primary"), ValueError("hedge"))
+    gateway = hedged_gateway(completions, recent_latency=0.01)
+    with pytest.raises(ValueError):
+        complete_hedged(gateway)
+    assert len(completions.calls) == 2
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.services.lsa_model import LSAModel, content_words
+from app.services.vector_store import VectorStore
+
+CORPUS = [
+    "Annual Leave: All employees are entitled to 21 days of annual leave per year.",
+    "Sick Leave: Employees can take up to 10 days of sick leave per year. A medical certificate "
+    "is required for sick leave longer than 3 days.",
+    "Maternity Leave: Female employees are entitled to 6 months of maternity leave.",
+    "Paternity Leave: Male employees are entitled to 15 days of paternity leave.",
+    "Submit a leave application at least 3 days in advance and get approval from your manager.",
+    "Passwords must be at least 12 characters long and changed every 90 days.",
+    "Enable two-factor authentication for VPN access and report phishing emails to IT security.",
+    "Salary bands: junior engineers earn 50-70k, senior engineers 90-120k. Promotions raise pay 10-20%.",
+    "Travel expenses include flights, hotels and meals for business trips; claims are reimbursed monthly.",
+]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LSAModel.fit(CORPUS, dimensions=64)
+
+
+def similarity(model, first, second):
+    vectors = model.transform([first, second])
+    return float(vectors[0] @ vectors[1])
+
+
+def test_content_words_drop_stop_words_and_fold_plurals():
+    assert content_words("How many sick days do I get?") == ["sick", "day"]
+    assert content_words("Policies and passwords") == ["policy", "password"]
+
+
+@pytest.mark.parametrize("paraphrase", [
+    "sick leave allowance?", "what is my sick day allowance", "sick days count", "number of sick days I get",
+])
+def test_paraphrases_are_closer_than_other_topics(model, paraphrase):
+    question = "how many sick days do I get"
+    assert similarity(model, question, paraphrase) > 0.8
+    for other in ["password rules", "travel expense claims", "salary of senior engineers"]:
+        assert similarity(model, question, paraphrase) > similarity(model, question, other) + 0.5
+
+
+def test_vectors_are_padded_unit_rows(model):
+    vectors = model.transform(["sick leave", "words the corpus never used"])
+    assert vectors.shape == (2, 64)
+    assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+    assert not vectors[1].any()
+
+
+def test_fit_is_deterministic_and_saved_models_load(model, tmp_path):
+    assert LSAModel.fit(CORPUS, dimensions=64).model_id == model.model_id
+    model.save(str(tmp_path))
+    loaded = LSAModel.load(str(tmp_path), model.model_id)
+    assert np.allclose(loaded.transform(CORPUS), model.transform(CORPUS))
+    assert LSAModel.load(str(tmp_path), "00000000") is None
+
+
+def test_switching_models_empties_the_store(model, tmp_path):
+    store = VectorStore(str(tmp_path), 64).open()
+    assert store.set_model(model.model_id)
+    store.append([1, 2], [1, 1], [(0, 0), (0, 0)], model.transform(CORPUS[:2]))
+    assert not store.set_model(model.model_id)
+    assert store.chunk_ids() == {1, 2}
+    assert store.set_model("another")
+    assert store.chunk_ids() == set()
+    assert store.model_id() == "another"
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, Employee, UserRole
+from app.services.notification_service import NotificationService
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_json(self, message):
+        pass
+
+    async def close(self, code: int, reason: str = ""):
+        self.closed_with = code
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def drain(loop):
+    """Wait until the loop has run everything scheduled so far"""
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(timeout=5)
+
+
+def test_committed_role_changes_and_deactivation_reach_connections(loop, session_factory):
+    service = NotificationService()
+    service.attach(session_factory, loop)
+    db = session_factory()
+    manager = Employee(employee_id="E1", name="Sarah", email="sarah@company.com", user_role=UserRole.HR_MANAGER)
+    db.add(manager)
+    db.commit()
+    websocket = FakeWebSocket()
+    service.connect(websocket, manager)
+
+    manager.user_role = UserRole.EMPLOYEE
+    db.flush()
+    db.rollback()
+    drain(loop)
+    assert service.roles[manager.id] == UserRole.HR_MANAGER
+
+    manager.user_role = UserRole.EMPLOYEE
+    db.commit()
+    drain(loop)
+    assert service.roles[manager.id] == UserRole.EMPLOYEE
+
+    manager.is_active = False
+    db.commit()
+    drain(loop)
+    assert websocket.closed_with == 4401
+    assert manager.id not in service.connections
+    db.close()
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import DocumentVisibility, UserRole
+from app.services.response_cache import ResponseCache
+
+
+def employee(department="Engineering", user_role=UserRole.EMPLOYEE, role="Developer"):
+    return SimpleNamespace(user_role=user_role, department=department, role=role)
+
+
+@pytest.fixture
+def cache():
+    cache = ResponseCache(max_entries=3, ttl_seconds=3600.0)
+    cache.put("What is the sick leave policy?", employee(), 1, {"response": "sick"})
+    return cache
+
+
+def test_key_ignores_case_punctuation_and_spacing(cache):
+    assert cache.get("  what is the SICK leave policy ", employee(), 1)["response"] == "sick"
+
+
+def test_key_includes_acl_scope_and_index_version(cache):
+    query = "What is the sick leave policy?"
+    assert cache.get(query, employee(department="Sales"), 1) is None
+    assert cache.get(query, employee(user_role=UserRole.HR_ADMIN), 1) is None
+    assert cache.get(query, employee(role="Designer"), 1) is None
+    assert cache.get(query, employee(), 2) is None
+    # Employees with the same scope share the answer
+    assert cache.get(query, employee(), 1)["response"] == "sick"
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put("travel claims", employee(), 1, {"response": "travel"})
+    cache.put("remote work", employee(), 1, {"response": "remote"})
+    cache.get("What is the sick leave policy?", employee(), 1)
+    cache.put("dress code", employee(), 1, {"response": "dress"})
+    assert cache.get("travel claims", employee(), 1) is None
+    assert cache.get("What is the sick leave policy?", employee(), 1) is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_expired_entries_miss(cache):
+    cache.ttl_seconds = 0.0
+    assert cache.get("What is the sick leave policy?", employee(), 1) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_new_document_invalidates_only_scopes_that_can_read_it(cache):
+    cache.put("What is the sick leave policy?", employee(department="Sales"), 1, {"response": "sales"})
+    document = SimpleNamespace(visibility=DocumentVisibility.DEPARTMENT, department="Engineering")
+    assert cache.invalidate_document(document) == 1
+    assert cache.get("What is the sick leave policy?", employee(), 1) is None
+    assert cache.get("What is the sick leave policy?", employee(department="Sales"), 1)["response"] == "sales"
@@ -0,0 +1,100 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import UserRole
+from app.services.lsa_model import LSAModel
+from app.services.semantic_cache import SemanticCache, answer_evidence
+
+LEAVE_POLICY = (
+    "1. Annual Leave: All employees are entitled to 21 days of annual leave per year.\n"
+    "2. Sick Leave: Employees can take up to 10 days of sick leave per year.\n"
+    "3. Personal Leave: Up to 5 days per year for personal matters.\n"
+    "4. Maternity Leave: Female employees are entitled to 6 months of maternity leave.\n"
+    "5. Paternity Leave: Male employees are entitled to 15 days of paternity leave.\n"
+    "6. Emergency Leave: Up to 5 days per year for family emergencies.\n"
+)
+
+CORPUS = [
+    LEAVE_POLICY,
+    "Leave Application Process: Submit leave application at least 3 days in advance. "
+    "Get approval from immediate supervisor. HR will process the application within 2 business days.",
+    "Access Controls: Use strong passwords with at least 12 characters. Enable two-factor authentication. "
+    "Report phishing emails to IT security.",
+    "Salary Bands by Level: Junior engineers earn 50-70k, senior engineers 90-120k. Promotion increases 10-20%.",
+    "Travel expenses include flights, hotels and meals for business trips. Claims are reimbursed monthly.",
+]
+
+QUESTION = "how many sick days do I get"
+
+
+def employee(department="Engineering"):
+    return SimpleNamespace(user_role=UserRole.EMPLOYEE, department=department, role="Developer")
+
+
+def retrieve(query):
+    """The leave policy as the top passage, every sentence highlighted, like AIService.build_passages"""
+    highlights = [{"start": match.start(), "end": match.end(), "score": 1}
+                  for match in re.finditer(r"[^\n]+", LEAVE_POLICY)]
+    return [{"document": SimpleNamespace(id=1), "relevant_content": LEAVE_POLICY, "highlights": highlights}]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LSAModel.fit(CORPUS, dimensions=64)
+
+
+@pytest.fixture
+def cache(model):
+    cache = SemanticCache(threshold=0.75, max_entries_per_scope=10, ttl_seconds=3600.0)
+    cache.put(*embed(model, QUESTION), employee(), 1, {"response": "sick"})
+    return cache
+
+
+def embed(model, query):
+    """Query vector and evidence key, as AIService.semantic_cache_key builds them"""
+    query_vector = model.transform([query])[0]
+    return query_vector, answer_evidence(query, retrieve(query), with_words=not query_vector.any())
+
+
+@pytest.mark.parametrize("paraphrase", [
+    "sick leave allowance?", "what is my sick day allowance", "sick days count", "number of sick days I get",
+])
+def test_paraphrases_are_hits(cache, model, paraphrase):
+    hit = cache.get(*embed(model, paraphrase), employee(), 1)
+    assert hit["response"] == "sick"
+    assert hit["similarity"] >= 0.75
+
+
+def test_sibling_questions_about_another_sentence_are_not_hits(cache, model):
+    cache.put(*embed(model, "how much maternity leave do I get"), employee(), 1, {"response": "maternity"})
+    assert cache.get(*embed(model, "how much paternity leave do I get"), employee(), 1) is None
+    assert cache.get(*embed(model, "how many annual leave days do I get"), employee(), 1) is None
+    assert cache.get(*embed(model, "maternity leave entitlement"), employee(), 1)["response"] == "maternity"
+    assert cache.get_stats()["evidence_misses"] == 2
+
+
+def test_unrelated_question_is_not_a_hit(cache, model):
+    assert cache.get(*embed(model, "password rules"), employee(), 1) is None
+
+
+def test_questions_the_model_cannot_place_need_the_same_content_words(cache, model):
+    cache.put(*embed(model, "how do I enroll in health insurance?"), employee(), 1, {"response": "health"})
+    assert cache.get(*embed(model, "Health insurance - how to enroll"), employee(), 1)["response"] == "health"
+    assert cache.get(*embed(model, "how do I enroll in dental insurance?"), employee(), 1) is None
+
+
+def test_answers_are_not_shared_across_scopes(cache, model):
+    assert cache.get(*embed(model, QUESTION), employee(department="Sales"), 1) is None
+
+
+def test_new_index_version_drops_older_scopes(cache, model):
+    assert cache.get(*embed(model, QUESTION), employee(), 2) is None
+    assert cache.get_stats()["size"] == 0
+
+
+def test_expired_rows_are_deleted_on_put(cache, model):
+    cache.ttl_seconds = 0.0
+    cache.put(*embed(model, "How do I submit a travel expense claim?"), employee(), 1, {"response": "travel"})
+    assert cache.get_stats()["size"] == 1
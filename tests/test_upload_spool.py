@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.utils.upload_spool import UploadFormError, UploadTooLargeError, spool_upload_form
+
+BOUNDARY = "form-boundary-7MA4YWxk"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def form_body(fields, filename, content: bytes) -> bytes:
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    if filename is not None:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+class Body:
+    """Request body delivered in small chunks, like a chunked upload without Content-Length"""
+
+    def __init__(self, data: bytes, chunk_bytes: int = 7):
+        self.chunks = [data[i:i + chunk_bytes] for i in range(0, len(data), chunk_bytes)]
+        self.read = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+def spool(body: Body, content_type: str = CONTENT_TYPE, **limits):
+    return asyncio.run(spool_upload_form(content_type, body.__aiter__(), **limits))
+
+
+def test_file_is_spooled_with_its_hash_and_fields(tmp_path):
+    content = b"Employees accrue leave monthly.\r\n--not-a-boundary\r\n" * 50
+    body = Body(form_body({"title": "Leave", "document_type": "policy"}, "leave.txt", content))
+    fields, spooled = spool(body, directory=str(tmp_path))
+    assert fields == {"title": "Leave", "document_type": "policy"}
+    assert spooled["filename"] == "leave.txt"
+    assert spooled["size"] == len(content)
+    assert spooled["sha256"] == hashlib.sha256(content).hexdigest()
+    with open(spooled["path"], "rb") as f:
+        assert f.read() == content
+
+
+def test_oversized_file_is_refused_before_the_body_is_read(tmp_path):
+    body = Body(form_body({"title": "Big"}, "big.txt", b"x" * 10000))
+    with pytest.raises(UploadTooLargeError):
+        spool(body, max_bytes=1000, directory=str(tmp_path))
+    assert body.read < len(body.chunks) / 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_oversized_fields_are_refused(tmp_path):
+    body = Body(form_body({"title": "t" * 5000}, "leave.txt", b"text"))
+    with pytest.raises(UploadTooLargeError):
+        spool(body, max_field_bytes=1000, directory=str(tmp_path))
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (form_body({"title": "No file"}, None, b""), CONTENT_TYPE),
+    (b"title=Leave", "application/x-www-form-urlencoded"),
+    (form_body({"title": "Leave"}, "leave.txt", b"text"), "multipart/form-data"),
+])
+def test_bodies_without_one_file_part_are_refused(tmp_path, body, content_type):
+    with pytest.raises(UploadFormError):
+        spool(Body(body), content_type=content_type, directory=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.vector_store import REMOVED, VectorStore
+
+DIMENSIONS = 8
+
+
+class AllowAll:
+    def mask(self, visibility, department):
+        return np.ones(len(visibility), dtype=bool)
+
+
+def unit(index):
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VectorStore(str(tmp_path), DIMENSIONS).open()
+    store.append([1, 2, 3], [10, 10, 20], [(0, 0)] * 3, np.stack([unit(0), unit(1), unit(2)]))
+    return store
+
+
+def search(store, vector, limit=3):
+    return [(hit["chunk_id"], hit["document_id"]) for hit in store.search(vector, AllowAll(), limit, min_score=0.5)]
+
+
+def test_appended_vectors_are_searchable(store):
+    assert search(store, unit(1)) == [(2, 10)]
+    assert store.chunk_ids() == {1, 2, 3}
+    stats = store.get_stats()
+    assert (stats["rows"], stats["snapshot_rows"], stats["delta_rows"]) == (3, 0, 3)
+
+
+def test_appending_a_stored_chunk_replaces_its_vector(store):
+    version = store.version()
+    store.append([2], [10], [(0, 0)], unit(4)[np.newaxis, :])
+    assert search(store, unit(1)) == []
+    assert search(store, unit(4)) == [(2, 10)]
+    assert store.get_stats()["removed_rows"] == 1
+    assert store.version() == version + 1
+
+
+def test_removed_documents_are_tombstoned_until_compaction(store):
+    assert store.remove_document(10) == 2
+    assert store.chunk_ids() == {3}
+    assert search(store, unit(0)) == []
+    assert store.views()[1][:2, 0].tolist() == [REMOVED, REMOVED]
+    # Tombstones are written in place, a second removal finds nothing
+    assert store.remove_document(10) == 0
+    assert store.needs_compaction()
+
+
+def test_open_drops_rows_written_to_only_one_file(store, tmp_path):
+    with open(tmp_path / "vectors-0.f32", "ab") as f:
+        f.write(unit(5).tobytes())
+    reopened = VectorStore(str(tmp_path), DIMENSIONS).open()
+    assert reopened.get_stats()["rows"] == 3
+    assert os.path.getsize(tmp_path / "vectors-0.f32") == 3 * 4 * DIMENSIONS
+
+
+def test_store_with_other_dimensions_starts_empty(store, tmp_path):
+    reopened = VectorStore(str(tmp_path), DIMENSIONS * 2).open()
+    assert reopened.chunk_ids() == set()
+    assert not os.path.exists(tmp_path / "vectors-0.f32")
+
+
+def test_compaction_drops_removed_rows(store):
+    store.remove_document(10)
+    version = store.version()
+    result = store.compact()
+    assert result == {"rows_before": 3, "rows_after": 1, "generation": 1}
+    assert search(store, unit(2)) == [(3, 20)]
+    stats = store.get_stats()
+    assert (stats["rows"], stats["snapshot_rows"], stats["removed_rows"]) == (1, 1, 0)
+    assert store.version() == version
+    assert not os.path.exists(store._vectors_path(0))
+
+
+def test_writes_during_compaction_are_not_blocked_and_carried_over(store):
+    def prepare(generation, rows, vectors, sidecar):
+        assert (generation, rows) == (1, 3)
+        # Runs without the write lock: an append or removal here would deadlock otherwise
+        writer = threading.Thread(target=lambda: (store.append([4], [30], [(0, 0)], unit(3)[np.newaxis, :]),
+                                                  store.remove_chunks([1])))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive()
+        # A second merge started meanwhile leaves the work to this one
+        assert store.compact() is None
+
+    result = store.compact(generation=0, prepare=prepare)
+    assert result["generation"] == 1
+    assert store.chunk_ids() == {2, 3, 4}
+    assert search(store, unit(3)) == [(4, 30)]
+    assert search(store, unit(0)) == []
+    stats = store.get_stats()
+    assert (stats["snapshot_rows"], stats["delta_rows"]) == (3, 1)
+
+
+def test_compaction_of_an_outdated_generation_is_skipped(store):
+    store.compact()
+    assert store.compact(generation=0) is None
+    assert store.get_stats()["generation"] == 1